@@ -0,0 +1,194 @@
+import base64
+import hashlib
+import queue
+import threading
+import time
+from collections import deque
+import requests
+
+# 报警消息的后台发送队列：检测线程只负责入队，HTTP请求、重试和限流都在后台线程完成
+# 使用requests.Session复用长连接；图片直接使用内存中的JPEG字节，不再回读磁盘
+# 企业微信机器人限制每分钟20条消息，超限返回errcode 45009，此时按退避重试
+
+
+class AlertDispatcher:
+    """
+    webhook_url: 机器人Webhook地址（测试时可指向本地HTTP桩服务）
+    queue_size: 待发送报警的最大数量，队列满时丢弃最旧的报警
+    max_retries: 单条消息失败后的最大重试次数
+    backoff: 重试退避基数（秒），第n次重试等待 backoff * 2**n
+    rate_limit / rate_period: 每rate_period秒最多发送rate_limit条消息
+    min_interval: 相邻两条消息的最小间隔（秒）
+    """
+    RETRYABLE_ERRCODES = (45009, -1)  # 频率超限、系统繁忙
+
+    def __init__(self, webhook_url, queue_size=32, max_retries=3, backoff=0.5, timeout=5.0,
+                 rate_limit=20, rate_period=60.0, min_interval=0.2, session=None):
+        self.webhook_url = webhook_url
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.rate_limit = rate_limit
+        self.rate_period = rate_period
+        self.min_interval = min_interval
+        self.session = session or requests.Session()
+        self.sent = 0      # 发送成功的消息数
+        self.failed = 0    # 重试耗尽仍失败的消息数
+        self.dropped = 0   # 队列满被丢弃的报警数
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._sent_times = deque()
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    # ---------------- 入队 ----------------
+    def submit(self, messages):
+        """提交一组按顺序发送的消息(json字典列表)，立即返回；队列满时丢弃最旧的一组"""
+        self._put(messages)
+        return True
+
+    def _put(self, item):
+        while True:
+            try:
+                self._queue.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    self._queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def send_text(self, content):
+        return self.submit([self.text_message(content)])
+
+    @staticmethod
+    def text_message(content):
+        return {"msgtype": "text", "text": {"content": content}}
+
+    @staticmethod
+    def image_message(img_bytes):
+        """图片消息：base64与md5直接基于内存中的JPEG字节"""
+        return {
+            "msgtype": "image",
+            "image": {
+                "base64": base64.b64encode(img_bytes).decode('utf-8'),
+                "md5": hashlib.md5(img_bytes).hexdigest()
+            }
+        }
+
+    def pending(self):
+        return self._queue.qsize()
+
+    # ---------------- 后台发送 ----------------
+    # 等待都用 _closed.wait：close之后不再限流等待和退避，尽快发完剩余报警
+    def _wait_rate_limit(self):
+        now = time.monotonic()
+        if self._sent_times and now - self._sent_times[-1] < self.min_interval:
+            self._closed.wait(self.min_interval - (now - self._sent_times[-1]))
+            now = time.monotonic()
+        while self._sent_times and now - self._sent_times[0] >= self.rate_period:
+            self._sent_times.popleft()
+        if len(self._sent_times) >= self.rate_limit:
+            self._closed.wait(self.rate_period - (now - self._sent_times[0]))
+            self._sent_times.popleft()
+        self._sent_times.append(time.monotonic())
+
+    def _post(self, message):
+        """发送单条消息，网络错误、429/5xx和限流错误码按指数退避重试；其他非2xx响应和错误码不重试；close之后不再重试"""
+        for attempt in range(self.max_retries + 1):
+            self._wait_rate_limit()
+            try:
+                resp = self.session.post(self.webhook_url, json=message, timeout=self.timeout)
+            except requests.RequestException as e:
+                error = str(e)
+            else:
+                if resp.status_code >= 500 or resp.status_code == 429:
+                    error = f"HTTP {resp.status_code} {resp.text[:200]}"
+                elif not 200 <= resp.status_code < 300:
+                    print(f"报警消息被拒绝: HTTP {resp.status_code} {resp.text[:200]}")
+                    return False
+                else:
+                    errcode = self._errcode(resp)
+                    if errcode in self.RETRYABLE_ERRCODES:
+                        error = f"errcode={errcode} {resp.text[:200]}"
+                    elif errcode:
+                        print(f"报警消息被拒绝: errcode={errcode} {resp.text[:200]}")
+                        return False
+                    else:
+                        return True
+            if attempt == self.max_retries or self._closed.is_set():
+                break
+            self._closed.wait(self.backoff * (2 ** attempt))
+        print(f"发送报警消息失败: {error}")
+        return False
+
+    @staticmethod
+    def _errcode(resp):
+        """响应体中的errcode；2xx响应没有JSON或没有errcode时视为成功(0)"""
+        try:
+            body = resp.json()
+        except ValueError:
+            return 0
+        return body.get("errcode", 0) if isinstance(body, dict) else 0
+
+    def _run(self):
+        while True:
+            messages = self._queue.get()
+            if messages is None:
+                break
+            for message in messages:
+                # 单条消息的意外异常（如消息无法序列化）不能终止后台线程
+                try:
+                    ok = self._post(message)
+                except Exception as e:
+                    print(f"发送报警消息异常: {e}")
+                    ok = False
+                if ok:
+                    self.sent += 1
+                else:
+                    self.failed += 1
+
+    def close(self, timeout=10.0):
+        """不再等待限流和退避，发送完队列中剩余的报警后停止后台线程；队列满时丢弃最旧的报警以放入结束标记"""
+        self._closed.set()
+        self._put(None)
+        self._thread.join(timeout)
+        self.session.close()
+
+
+if __name__ == "__main__":
+    # 本地HTTP桩服务测试：模拟企业微信接口，偶发返回限流错误码
+    import json
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    received = []
+
+    class StubHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            received.append(body["msgtype"])
+            errcode = 45009 if len(received) % 5 == 0 else 0
+            data = json.dumps({"errcode": errcode, "errmsg": "ok"}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    dispatcher = AlertDispatcher(f"http://127.0.0.1:{server.server_port}/send", backoff=0.05,
+                                 rate_limit=1000, min_interval=0.0)
+    start = time.perf_counter()
+    for i in range(10):
+        dispatcher.submit([dispatcher.text_message(f"报警{i}"), dispatcher.image_message(b"\xff\xd8" * 1000)])
+    print(f"入队耗时: {(time.perf_counter() - start) * 1000:.2f} ms")
+    while dispatcher.sent + dispatcher.failed < 20:  # close之后不再退避重试，先等全部发完
+        time.sleep(0.05)
+    dispatcher.close()
+    print(f"发送成功 {dispatcher.sent}, 失败 {dispatcher.failed}, 丢弃 {dispatcher.dropped}, 服务端收到 {len(received)} 条")
+    server.shutdown()
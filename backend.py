@@ -0,0 +1,138 @@
+import os
+import threading
+import time
+import cv2
+import numpy as np
+
+# 推理后端：统一选择推理设备、配置CPU线程数，并为各模型封装提供可复用的输入缓冲区
+# 设备可通过环境变量 VRP_DEVICE 强制指定（如 cpu、cuda、cuda:1）
+
+_device = None
+_device_lock = threading.Lock()
+
+
+def configure_cpu_threads(torch_module=None):
+    """
+    按CPU核心数设置PyTorch的intra-op/inter-op线程数，返回(intra, inter)
+    设置了VRP_NUM_THREADS时（如多进程批处理中每个进程分到的核心数），inter-op和OpenCV线程数也按该值折算
+    """
+    if torch_module is None:
+        import torch as torch_module
+    cores = max(1, int(os.getenv("VRP_NUM_THREADS", os.cpu_count() or 1)))
+    intra = cores
+    inter = max(1, min(4, cores // 4))
+    torch_module.set_num_threads(intra)
+    try:
+        # inter-op线程数只能在首次并行计算之前设置一次
+        torch_module.set_num_interop_threads(inter)
+    except RuntimeError:
+        inter = torch_module.get_num_interop_threads()
+    cv2.setNumThreads(max(1, cores // 2))
+    return intra, inter
+
+
+def _select_device():
+    forced = os.getenv("VRP_DEVICE")
+    try:
+        import torch
+    except ImportError:
+        return forced or 'cpu'
+    if forced:
+        device = forced
+    elif torch.cuda.is_available():
+        device = 'cuda'
+    else:
+        device = 'cpu'
+    if device == 'cpu':
+        configure_cpu_threads(torch)
+    return device
+
+
+def get_device():
+    """返回全局推理设备（只检测一次）：有CUDA时为'cuda'，否则为'cpu'"""
+    global _device
+    if _device is None:
+        with _device_lock:
+            if _device is None:
+                _device = _select_device()
+    return _device
+
+
+class InputBuffer:
+    """
+    预分配的输入缓冲池，避免每帧都为BGR->RGB转换申请新内存
+    slots: 轮转使用的缓冲区个数，保证上一帧的推理结果在下一次调用前仍然有效
+    """
+    def __init__(self, slots=2):
+        self.slots = max(1, slots)
+        self._buffers = [None] * self.slots
+        self._index = 0
+
+    def resize(self, slots):
+        if slots > self.slots:
+            self._buffers.extend([None] * (slots - self.slots))
+            self.slots = slots
+
+    def to_rgb(self, image_bgr):
+        buf = self._buffers[self._index]
+        if buf is None or buf.shape != image_bgr.shape:
+            buf = np.empty_like(image_bgr)
+            self._buffers[self._index] = buf
+        self._index = (self._index + 1) % self.slots
+        cv2.cvtColor(image_bgr, cv2.COLOR_BGR2RGB, dst=buf)
+        return buf
+
+
+class FPSMeter:
+    """滑动平均的推理耗时/帧率统计，用法: with meter: ..."""
+    def __init__(self, alpha=0.1):
+        self.alpha = alpha
+        self.latency = 0.0  # 秒/次
+        self.frames = 0
+        self._t0 = 0.0
+
+    def __enter__(self):
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.update(time.perf_counter() - self._t0)
+        return False
+
+    def update(self, seconds, n=1):
+        per_frame = seconds / max(1, n)
+        if self.frames == 0:
+            self.latency = per_frame
+        else:
+            self.latency += self.alpha * (per_frame - self.latency)
+        self.frames += n
+
+    @property
+    def fps(self):
+        return 1.0 / self.latency if self.latency > 0 else 0.0
+
+
+class BatchSizer:
+    """
+    按延迟预算自适应批大小：根据单帧耗时的滑动平均，取预算内能完成的最大帧数
+    latency_budget: 每个批次允许的最大耗时（秒）
+    """
+    def __init__(self, latency_budget=0.5, min_size=1, max_size=32, alpha=0.3):
+        self.latency_budget = latency_budget
+        self.min_size = max(1, min_size)
+        self.max_size = max(self.min_size, max_size)
+        self.alpha = alpha
+        self.per_frame = None
+        self.size = self.min_size
+
+    def update(self, seconds, n):
+        per_frame = seconds / max(1, n)
+        if self.per_frame is None:
+            self.per_frame = per_frame
+        else:
+            self.per_frame += self.alpha * (per_frame - self.per_frame)
+        target = int(self.latency_budget / self.per_frame) if self.per_frame > 0 else self.max_size
+        # 每次最多翻倍增长，避免首批耗时偏低时一次跳到上限
+        target = min(target, self.size * 2)
+        self.size = max(self.min_size, min(self.max_size, target))
+        return self.size
@@ -0,0 +1,165 @@
+import hashlib
+import os
+import pickle
+import time
+
+# 长视频追踪的断点续跑：定期把 追踪器状态 + 下一帧帧号 + 轨迹历史等 写入断点文件，重新开始时定位到该帧继续
+# 追踪器状态保存在YOLO模型的predictor.trackers中，必须在推理线程里、刚处理完某帧时取出，才与该帧的输出一致
+# 恢复时在下一次track调用的on_predict_start回调中换入保存的追踪器，不需要额外推理
+# 随帧增长的结果（轨迹行、追踪记录）追加写入PartialFile，断点只记录其偏移，保存断点的开销不随视频长度增长
+
+
+def _basetrack():
+    try:
+        from ultralytics.trackers.basetrack import BaseTrack
+        return BaseTrack
+    except ImportError:
+        return None
+
+
+def tracker_state(model):
+    """YOLO模型当前追踪器状态的序列化bytes；尚未开始追踪或追踪器无法序列化时返回None"""
+    trackers = getattr(getattr(model, "predictor", None), "trackers", None)
+    if trackers is None:
+        return None
+    base = _basetrack()
+    try:
+        # 追踪ID由进程级计数器分配，一并保存，恢复后新目标不会与已有ID冲突
+        return pickle.dumps({"trackers": trackers, "next_id": getattr(base, "_count", None)})
+    except Exception as e:
+        print(f"追踪器状态无法保存，续跑时将重新开始追踪: {e}")
+        return None
+
+
+def restore_tracker(model, state):
+    """让模型的下一次track调用使用保存的追踪器状态；需在reset之后、处理续跑的第一帧之前调用"""
+    if state is None:
+        return
+    saved = pickle.loads(state)
+    base = _basetrack()
+    if base is not None and saved.get("next_id") is not None:
+        base._count = max(getattr(base, "_count", 0), saved["next_id"])
+    pending = [saved["trackers"]]
+
+    # 在Ultralytics注册的追踪回调之前或之后执行均可：先执行时其回调看到已有trackers会直接返回，后执行时覆盖其结果
+    def on_predict_start(predictor):
+        if pending:
+            predictor.trackers = pending.pop()
+
+    model.add_callback("on_predict_start", on_predict_start)
+
+
+def source_key(source):
+    """视频文件的标识（路径、大小、修改时间），用于判断断点是否属于同一个文件"""
+    path = os.path.abspath(source)
+    st = os.stat(path)
+    return (path, st.st_size, int(st.st_mtime))
+
+
+def checkpoint_path(source, directory="checkpoints", tag=""):
+    """按视频绝对路径生成断点文件名"""
+    path = os.path.abspath(source)
+    digest = hashlib.sha1(path.encode("utf-8")).hexdigest()[:10]
+    name = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(directory, f"{name}_{tag + '_' if tag else ''}{digest}.ckpt")
+
+
+class Checkpoint:
+    """
+    path: 断点文件路径
+    source: 对应的视频文件，加载时校验文件未被替换
+    interval: 两次保存之间的最短间隔（秒）
+    保存内容为字典，至少包含 frame（续跑时的起始帧）和 tracker（tracker_state的返回值）
+    """
+    def __init__(self, path, source, interval=60.0):
+        self.path = path
+        self.source = source
+        self.interval = interval
+        self.saves = 0
+        self._last = time.monotonic()
+
+    def due(self):
+        """距上次到期已超过interval时返回True并重新计时；在推理线程中调用，据此取出追踪器状态"""
+        now = time.monotonic()
+        if now - self._last < self.interval:
+            return False
+        self._last = now
+        return True
+
+    def save(self, state):
+        """先写临时文件再改名，写入过程中崩溃不会破坏上一个断点"""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        state = dict(state, source=source_key(self.source), saved_at=time.time())
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self.path)
+        self.saves += 1
+
+    def load(self):
+        """返回保存的状态；文件不存在、损坏或视频已变化时返回None"""
+        try:
+            with open(self.path, "rb") as f:
+                state = pickle.load(f)
+        except Exception:
+            return None
+        if state.get("source") != source_key(self.source):
+            return None
+        return state
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class PartialFile:
+    """
+    与断点配套的追加写文件：逐帧结果只追加写入，断点中只保存flush返回的字节偏移，不再每次重新保存全部历史
+    续跑时open(偏移)截断到该位置，丢弃断点之后写出的数据（与TrajectoryWriter.rollback相同）
+    write写入bytes；append/records按pickle记录逐条写入和读取
+    """
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def open(self, offset=0):
+        """从offset处继续写，0为重新开始；offset为None或文件比offset短（被删除或损坏）时返回False，不打开"""
+        if offset is None or (offset and (not os.path.exists(self.path) or os.path.getsize(self.path) < offset)):
+            return False
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._file = open(self.path, "r+b" if offset else "wb")
+        self._file.truncate(offset)
+        self._file.seek(offset)
+        return True
+
+    def write(self, data):
+        self._file.write(data)
+
+    def append(self, record):
+        pickle.dump(record, self._file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def flush(self):
+        """写出缓冲并返回当前偏移，保存断点前调用"""
+        self._file.flush()
+        return self._file.tell()
+
+    def records(self):
+        """依次读出append写入的记录；写入过程中读取时，末尾尚未写完的记录被忽略"""
+        if self._file is not None:
+            self._file.flush()
+        with open(self.path, "rb") as f:
+            while True:
+                try:
+                    yield pickle.load(f)
+                except (EOFError, pickle.UnpicklingError):
+                    return
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def remove(self):
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
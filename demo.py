@@ -21,13 +21,12 @@ from pos import PoseEstimator
 from handpos import HandPoseEstimator
 from face import FaceLandmarkGaze, draw_face_landmarks_and_gaze
 from image_processing_gui import ImageProcessingWindow
-
-# 将OpenCV的BGR图像转换为Qt可用的QPixmap
-def cvimg2qt(img):
-    rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-    h, w, ch = rgb.shape
-    bytes_per_line = ch * w
-    return QPixmap.fromImage(QImage(rgb.data, w, h, bytes_per_line, QImage.Format_RGB888))
+from backend import get_device, BatchSizer
+from pipeline import FramePipeline
+from video_writer import FrameRecorder
+from renderer import OverlayRenderer
+from display import show_frame
+from model_registry import registry, get_model
 
 # 信号类，用于多线程推理时主线程与子线程通信
 class WorkerSignals(QObject):
@@ -58,8 +57,10 @@ class MainWindow(QMainWindow):
         self.running = False
         self.log_lines = []
         self.last_result_img = None
-        self.save_video_frames = []
+        self.recorder = None  # 视频/摄像头结果录制器，后台编码，内存占用恒定
         self.result_history = []  # 新增：用于保存每次推理的结果信息
+        self.pipeline = None  # 视频/摄像头推理流水线
+        self.renderer = OverlayRenderer(kpt_conf=None)  # 手部关键点等补充绘制
 
         self.signals = WorkerSignals()
         self.signals.result.connect(self.on_infer_result)
@@ -325,6 +326,13 @@ class MainWindow(QMainWindow):
         self.conf_spin.setFixedWidth(60)
         toolbar2.addWidget(self.conf_spin)
 
+        # 录制模式：全程写盘、只保留最近30秒，或不录制（窗口最小化时可跳过结果绘制）
+        toolbar2.addWidget(QLabel("录制："))
+        self.record_combo = QComboBox()
+        self.record_combo.addItems(["全程录制", "最近30秒", "不录制"])
+        self.record_combo.setFixedWidth(90)
+        toolbar2.addWidget(self.record_combo)
+
         self.btn_infer = QPushButton("开始推理")
         self.btn_infer.setFixedWidth(90)
         self.btn_infer.clicked.connect(self.start_infer)
@@ -414,6 +422,8 @@ class MainWindow(QMainWindow):
         self.setStatusBar(self.status)
         self.status_time = QLabel("推理时间: 0 ms")
         self.status.addWidget(self.status_time)
+        self.status_fps = QLabel(f"设备: {get_device()}  FPS: 0.0")
+        self.status.addWidget(self.status_fps)
         self.status_cpu = QLabel("CPU: 0%")
         self.status.addWidget(self.status_cpu)
         self.status_mem = QLabel("内存: 0%")
@@ -436,6 +446,9 @@ class MainWindow(QMainWindow):
         mem = psutil.virtual_memory().percent
         self.status_cpu.setText(f"CPU: {cpu}%")
         self.status_mem.setText(f"内存: {mem}%")
+        fps_meter = getattr(self.model, 'fps_meter', None)
+        fps = fps_meter.fps if fps_meter is not None else 0.0
+        self.status_fps.setText(f"设备: {get_device()}  FPS: {fps:.1f}")
 
     # 刷新时钟显示
     def update_clock(self):
@@ -465,7 +478,7 @@ class MainWindow(QMainWindow):
                 self.input_path = path
                 img = cv2.imread(path)
                 self.input_img = img
-                self.input_label.setPixmap(cvimg2qt(img).scaled(self.input_label.size(), Qt.KeepAspectRatio))
+                show_frame(self.input_label, img)
                 self.log(f"已选择图片: {path}")
         elif self.input_type == "视频":
             path, _ = QFileDialog.getOpenFileName(self, "选择视频", "", "Videos (*.mp4 *.avi *.mov)")
@@ -475,7 +488,7 @@ class MainWindow(QMainWindow):
                 ret, img = cap.read()
                 if ret:
                     self.input_img = img
-                    self.input_label.setPixmap(cvimg2qt(img).scaled(self.input_label.size(), Qt.KeepAspectRatio))
+                    show_frame(self.input_label, img)
                 cap.release()
                 self.log(f"已选择视频: {path}")
         elif self.input_type == "摄像头":
@@ -486,7 +499,7 @@ class MainWindow(QMainWindow):
             ret, img = cap.read()
             if ret:
                 self.input_img = img
-                self.input_label.setPixmap(cvimg2qt(img).scaled(self.input_label.size(), Qt.KeepAspectRatio))
+                show_frame(self.input_label, img)
                 self.input_path = 0
                 self.log("已打开摄像头")
             cap.release()
@@ -499,7 +512,7 @@ class MainWindow(QMainWindow):
         self.info_text.clear()
         self.last_result_img = None
         self.input_path = None
-        self.save_video_frames = []
+        self.discard_recorder()
 
     # 切换模型类型时的处理
     def on_model_type_changed(self, text):
@@ -571,7 +584,7 @@ class MainWindow(QMainWindow):
             try:
                 self.model = ObjectDetector(self.weight_path)
                 self.weight_label.setText(os.path.basename(self.weight_path))
-                self.log("模型加载成功")
+                self.watch_model_load(self.model)
             except Exception as e:
                 self.show_error(f"模型加载失败: {e}")
                 self.model = None
@@ -589,14 +602,28 @@ class MainWindow(QMainWindow):
                     self.model = PoseEstimator(path)
                 else:
                     raise ValueError("未知模型类型")
-                self.log("模型加载成功")
+                self.watch_model_load(self.model)
             except Exception as e:
                 self.show_error(f"模型加载失败: {e}")
                 self.model = None
 
+    # 权重在后台加载预热，界面不等待；加载完成后在日志中提示结果，推理线程会等待加载完成
+    def watch_model_load(self, model):
+        def on_loaded(future):
+            error = future.exception()
+            if error is None:
+                self.signals.log.emit("模型加载成功")
+            else:
+                self.signals.error.emit(f"模型加载失败: {error}")
+
+        self.log("模型加载中...")
+        model.loaded.add_done_callback(on_loaded)
+
     # 启动推理线程
     def start_infer(self):
         self.running = False
+        if self.pipeline is not None:
+            self.pipeline.stop()
         # 检测/分割/姿态模型
         if self.model_group.currentText() == "检测/分割/姿态":
             if self.model is None:
@@ -627,12 +654,14 @@ class MainWindow(QMainWindow):
         self.info_text.clear()
         self.result_label.clear()
         self.last_result_img = None
-        self.save_video_frames = []
+        self.discard_recorder()
         threading.Thread(target=self.infer_thread, daemon=True).start()
 
     # 停止推理
     def stop_infer(self):
         self.running = False
+        if self.pipeline is not None:
+            self.pipeline.stop()
         self.log("停止推理")
 
     # 推理线程，处理图片/视频/摄像头的推理主循环
@@ -640,40 +669,39 @@ class MainWindow(QMainWindow):
         try:
             t0 = time.time()
             conf = self.conf_spin.value()
+            renderer = getattr(self.model, "renderer", None)
+            if renderer is not None:
+                renderer.visible_fn = self.result_view_needed
             if self.input_type == "图片":
                 img = cv2.imread(self.input_path)
                 self.input_img = img
                 self.signals.input_img.emit(img)
                 result_img, info, classes, results = self.run_infer(img, conf)
                 self.signals.result.emit(result_img, info, classes, results)
-            elif self.input_type == "视频":
-                cap = cv2.VideoCapture(self.input_path)
-                self.save_video_frames = []
-                while self.running and cap.isOpened():
-                    ret, img = cap.read()
-                    if not ret:
-                        break
-                    self.signals.input_img.emit(img)
-                    result_img, info, classes, results = self.run_infer(img, conf)
-                    self.signals.result.emit(result_img, info, classes, results)
-                    self.save_video_frames.append(result_img.copy())
-                    cv2.waitKey(1)
-                cap.release()
-            elif self.input_type == "摄像头":
-                cap = cv2.VideoCapture(0)
-                if not cap.isOpened():
-                    print("摄像头无法打开，请检查设备。")
-                self.save_video_frames = []
-                while self.running and cap.isOpened():
-                    ret, img = cap.read()
-                    if not ret:
-                        break
+            elif self.input_type in ["视频", "摄像头"]:
+                # 解码、推理、渲染三段流水线：视频按帧序批量推理不丢帧，摄像头只保留最新帧
+                live = self.input_type == "摄像头"
+                recorder = self.recorder = self.create_recorder()
+
+                def render(idx, img, output):
+                    result_img, info, classes, results = output
                     self.signals.input_img.emit(img)  # 关键：每帧都emit，实时显示
-                    result_img, info, classes, results = self.run_infer(img, conf)
                     self.signals.result.emit(result_img, info, classes, results)
-                    self.save_video_frames.append(result_img.copy())
-                    cv2.waitKey(1)
-                cap.release()
+                    if recorder is not None:
+                        recorder.write(result_img)
+
+                self.pipeline = FramePipeline(
+                    0 if live else self.input_path,
+                    render,
+                    infer_batch_fn=lambda frames: self.run_infer_batch(frames, conf),
+                    live=live,
+                    batch_sizer=None if live else BatchSizer(),
+                    # 回调不在except块中执行，须用异常自带的调用栈
+                    on_error=lambda e: self.signals.error.emit(
+                        f"推理异常: {e}\n{''.join(traceback.format_exception(type(e), e, e.__traceback__))}"),
+                )
+                self.pipeline.start()
+                self.pipeline.wait()
             t1 = time.time()
             infer_time = int((t1 - t0) * 1000)
             self.signals.status.emit(infer_time)
@@ -681,23 +709,14 @@ class MainWindow(QMainWindow):
         except Exception as e:
             self.signals.error.emit(f"推理异常: {e}\n{traceback.format_exc()}")
 
+    # 窗口最小化且没有在录制时，结果画面无人查看，跳过绘制
+    def result_view_needed(self):
+        return self.recorder is not None or not self.isMinimized()
+
     # 执行推理，返回推理结果和信息
     def run_infer(self, img, conf):
-        if self.model_type == "目标检测":
-            result_img, boxes_info, classes, results = self.model.infer(img)
-            confs = results[0].boxes.conf.cpu().numpy() if results[0].boxes is not None else []
-            return result_img, (boxes_info, classes, confs), classes, results
-        elif self.model_type == "图像分割":
-            result_img, seg_info, results = self.model.infer(img)
-            confs = results[0].boxes.conf.cpu().numpy() if hasattr(results[0], "boxes") and results[0].boxes is not None else []
-            classes = results[0].boxes.cls.cpu().numpy() if hasattr(results[0], "boxes") and results[0].boxes is not None else []
-            return result_img, (seg_info, classes, confs), classes, results
-        elif self.model_type == "姿态估计":
-            # 用cuda推理
-            result_img, keypoints_info, results = self.model.infer(img)
-            confs = results[0].boxes.conf.cpu().numpy() if hasattr(results[0], "boxes") and results[0].boxes is not None else []
-            classes = results[0].boxes.cls.cpu().numpy() if hasattr(results[0], "boxes") and results[0].boxes is not None else []
-            return result_img, (keypoints_info, classes, confs), classes, results
+        if self.model_type in ["目标检测", "图像分割", "姿态估计"]:
+            return self.run_infer_batch([img], conf)[0]
         elif self.model_type == "手部关键点检测":
             result_img, hand_keypoints_info, results = self.model.infer(img)
             return result_img, (hand_keypoints_info, None, None), None, results
@@ -707,41 +726,36 @@ class MainWindow(QMainWindow):
         else:
             raise ValueError("未知模型类型")
 
+    # 批量推理，检测/分割/姿态模型一次前向处理多帧，其余模型逐帧推理
+    def run_infer_batch(self, frames, conf):
+        if self.model_type not in ["目标检测", "图像分割", "姿态估计"]:
+            return [self.run_infer(img, conf) for img in frames]
+        outputs = []
+        for frame, det in zip(frames, self.model.predict_batch(frames)):
+            if self.model_type == "目标检测":
+                coords = det.boxes_info()
+            elif self.model_type == "图像分割":
+                coords = det.seg_info()
+            else:
+                coords = det.keypoints_info()
+            outputs.append((self.model.render(frame, det), (coords, det.classes, det.confs), det.classes, [det.raw]))
+        return outputs
+
     # 推理结果回调，显示结果图片和信息
     def on_infer_result(self, result_img, info, classes, results):
-        self.last_result_img = result_img.copy()
+        self.last_result_img = result_img
         self.input_img = self.input_img  # 保证有输入图像
-        img = result_img.copy()
-        # 直接渲染详细信息（坐标、类别、置信度等）
-        if self.model_type == "目标检测":
-            boxes_info, classes, confs = info
-            for box in boxes_info:
-                if isinstance(box, (tuple, list, np.ndarray)) and len(box) == 4:
-                    x1, y1, x2, y2 = map(int, box)
-                    cv2.rectangle(img, (x1, y1), (x2, y2), (0, 0, 255), 2)
-        elif self.model_type == "图像分割":
-            seg_info, classes, confs = info
-            for coords in seg_info:
-                if coords:
-                    pts = np.array(coords, np.int32).reshape((-1, 1, 2))
-                    cv2.polylines(img, [pts], isClosed=True, color=(0,0,255), thickness=2)
-        elif self.model_type == "姿态估计":
-            keypoints_info, classes, confs = info
-            for point in keypoints_info:
-                if isinstance(point, (tuple, list, np.ndarray)) and len(point) == 2:
-                    x, y = point
-                    cv2.circle(img, (int(x), int(y)), 4, (0, 0, 255), -1)
-        elif self.model_type == "手部关键点检测":
+        img = result_img
+        # 检测/分割/姿态结果已由OverlayRenderer绘制，这里只补充手部和面部关键点
+        if self.model_type == "手部关键点检测":
             hand_keypoints_info, _, _ = info
+            img = result_img.copy()
             for hand in hand_keypoints_info:
-                for point in hand:
-                    if isinstance(point, (tuple, list, np.ndarray)) and len(point) == 2:
-                        x, y = point
-                        cv2.circle(img, (x, y), 4, (0, 0, 255), -1)
+                self.renderer.draw_points(img, hand, (0, 0, 255), 4)
         elif self.model_type == "面部关键点与视线方向":
             faces, gaze_list = info
-            img = draw_face_landmarks_and_gaze(img, faces, gaze_list)
-        self.result_label.setPixmap(cvimg2qt(img).scaled(self.result_label.size(), Qt.KeepAspectRatio))
+            img = draw_face_landmarks_and_gaze(result_img.copy(), faces, gaze_list)
+        show_frame(self.result_label, img)
         # 新增：记录每次推理的结果信息和时间戳
         timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         info_text = self.get_result_info_text(info, classes)
@@ -755,7 +769,7 @@ class MainWindow(QMainWindow):
         if self.model_type == "目标检测":
             boxes_info, classes, confs = info
             for idx, (box, cls_id, conf) in enumerate(zip(boxes_info, classes, confs)):
-                lines.append(f"Obj{idx}: 坐标{box}, 类别{int(cls_id)}, 置信度:{conf:.2f}")
+                lines.append(f"Obj{idx}: 坐标{tuple(int(v) for v in box)}, 类别{int(cls_id)}, 置信度:{conf:.2f}")
         elif self.model_type == "图像分割":
             seg_info, classes, confs = info
             for idx, (coords, cls_id, conf) in enumerate(zip(seg_info, classes, confs)):
@@ -767,7 +781,7 @@ class MainWindow(QMainWindow):
         elif self.model_type == "手部关键点检测":
             hand_keypoints_info, _, _ = info
             for hand_idx, hand in enumerate(hand_keypoints_info):
-                lines.append(f"手{hand_idx+1}关键点: {hand}")
+                lines.append(f"手{hand_idx+1}关键点: {np.asarray(hand).tolist()}")
         elif self.model_type == "面部关键点与视线方向":
             faces, gaze_list = info
             for idx, (face, gaze) in enumerate(zip(faces, gaze_list)):
@@ -834,7 +848,7 @@ class MainWindow(QMainWindow):
     def save_result(self):
         import glob
 
-        if self.last_result_img is None and not self.save_video_frames:
+        if self.last_result_img is None and not self.recorder:
             self.show_info("没有可保存的推理结果。")
             return
 
@@ -859,23 +873,33 @@ class MainWindow(QMainWindow):
             self.log(f"推理结果图片已保存到: {path}")
             self.show_info(f"图片保存成功！文件名：{path}")
         elif self.input_type in ["视频", "摄像头"]:
-            if not self.save_video_frames:
-                self.show_info("没有可保存的视频结果。")
-                return
             base = "result_video"
             ext = "mp4"
             path = get_next_filename(base, ext)
-            h, w = self.save_video_frames[0].shape[:2]
-            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-            out = cv2.VideoWriter(path, fourcc, 20, (w, h))
-            for frame in self.save_video_frames:
-                out.write(frame)
-            out.release()
+            if self.recorder is None or not self.recorder.save(path):
+                self.show_info("没有可保存的视频结果。")
+                return
             self.log(f"推理结果视频已保存到: {path}")
             self.show_info(f"视频保存成功！文件名：{path}")
         else:
             self.show_info("当前输入类型不支持保存。")
 
+    # 按录制模式创建结果录制器（替换旧的录制器）；不录制时返回None
+    def create_recorder(self):
+        self.discard_recorder()
+        mode = self.record_combo.currentText()
+        if mode == "不录制":
+            return None
+        if mode == "最近30秒":
+            return FrameRecorder(FrameRecorder.MODE_RING, fps=20, seconds=30)
+        return FrameRecorder(FrameRecorder.MODE_STREAM, fps=20)
+
+    # 丢弃未保存的录制内容
+    def discard_recorder(self):
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
+
     # 推理完成后更新时间显示
     def on_infer_status(self, infer_time):
         """推理完成后更新时间显示"""
@@ -884,7 +908,7 @@ class MainWindow(QMainWindow):
     # 实时显示输入帧到原始输入区
     def on_input_img(self, img):
         # 实时显示输入帧到原始输入区
-        self.input_label.setPixmap(cvimg2qt(img).scaled(self.input_label.size(), Qt.KeepAspectRatio))
+        show_frame(self.input_label, img)
 
     # 复位所有界面和变量到初始状态
     def reset_all(self):
@@ -895,7 +919,7 @@ class MainWindow(QMainWindow):
         self.log_text.clear()
         self.last_result_img = None
         self.input_path = None
-        self.save_video_frames = []
+        self.discard_recorder()
         self.result_history = []
         self.model = None
         self.weight_path = None
@@ -955,11 +979,12 @@ class MainWindow(QMainWindow):
                 self.weight_path = local_path
                 self.model = ObjectDetector(self.weight_path)
                 self.weight_label.setText(os.path.basename(self.weight_path))
+                self.watch_model_load(self.model)
                 self.log(f"{weight_name}已存在于当前目录，直接加载: {self.weight_path}")
                 QMessageBox.information(self, "加载完成", f"{weight_name}已存在于当前目录，直接加载！")
                 return
             self.log(f"本地未找到{weight_name}，开始用Ultralytics自动下载...")
-            model = YOLO(weight_name)
+            model = get_model(weight_name)
             # 获取实际权重路径
             weight_path = None
             if hasattr(model, 'ckpt_path') and model.ckpt_path and os.path.exists(model.ckpt_path):
@@ -992,9 +1017,12 @@ class MainWindow(QMainWindow):
                 self.log(f"已将权重从{weight_path}复制到当前目录: {local_path}")
             else:
                 self.log(f"目标文件{local_path}已存在，无需复制。")
+            # 下载用的模型实例按名称缓存，之后统一按本地路径缓存，避免同一权重占用两份内存
+            registry.evict(weight_name)
             self.weight_path = local_path
             self.weight_label.setText(os.path.basename(self.weight_path))
             self.model = ObjectDetector(self.weight_path)
+            self.watch_model_load(self.model)
             self.log(f"{weight_name}权重下载并复制到当前目录并加载成功: {self.weight_path}")
             QMessageBox.information(self, "下载完成", f"{weight_name}权重下载并复制到当前目录并加载成功！")
         except Exception as e:
@@ -0,0 +1,88 @@
+import weakref
+import cv2
+import numpy as np
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QImage, QPixmap
+
+# OpenCV图像 -> Qt显示的公共工具，供所有窗口共用
+# BGR数据直接包装为Format_BGR888的QImage，不再逐帧转换RGB；先在OpenCV中缩小到控件大小再交给Qt
+# 每个QLabel复用两块QPixmap交替写入，避免每帧重新分配
+
+_BGR888 = getattr(QImage, "Format_BGR888", None)  # Qt 5.14+ 才有
+
+
+def _wrap(img):
+    """把ndarray包装为QImage（共享内存，不拷贝）；返回的QImage只在img存活期间有效"""
+    img = np.ascontiguousarray(img)
+    if img.ndim == 2:
+        h, w = img.shape
+        return QImage(img.data, w, h, img.strides[0], QImage.Format_Grayscale8), img
+    if img.shape[2] == 4:
+        img = cv2.cvtColor(img, cv2.COLOR_BGRA2BGR)
+    h, w = img.shape[:2]
+    if _BGR888 is not None:
+        return QImage(img.data, w, h, img.strides[0], _BGR888), img
+    rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    return QImage(rgb.data, w, h, rgb.strides[0], QImage.Format_RGB888), rgb
+
+
+def fit_to(img, size):
+    """按比例缩小到size(w, h)以内，只缩小不放大；size为空或不需要缩小时原样返回"""
+    if size is None:
+        return img
+    tw, th = size
+    h, w = img.shape[:2]
+    if tw <= 0 or th <= 0:
+        return img
+    scale = min(tw / w, th / h)
+    if scale >= 1:
+        return img
+    dst = (max(1, int(w * scale)), max(1, int(h * scale)))
+    if scale < 0.5:
+        # 大倍率缩小（如4K->窗口）先最近邻抽到目标的2倍，再做区域插值，比直接INTER_AREA快数倍
+        img = cv2.resize(img, (dst[0] * 2, dst[1] * 2), interpolation=cv2.INTER_NEAREST)
+    return cv2.resize(img, dst, interpolation=cv2.INTER_AREA)
+
+
+def cvimg2qt(img, size=None):
+    """OpenCV图像(BGR或灰度)转QPixmap；给定size(w, h)时先缩小到该范围内"""
+    qimg, _buf = _wrap(fit_to(img, size))
+    return QPixmap.fromImage(qimg)
+
+
+class _PixmapPool:
+    """单个控件的两块QPixmap轮换使用：控件持有一块时，写入另一块不会触发Qt的隐式共享拷贝"""
+    def __init__(self):
+        self.slots = [QPixmap(), QPixmap()]
+        self.index = 0
+
+    def next(self, qimg):
+        self.index ^= 1
+        pix = self.slots[self.index]
+        if pix.isNull() or pix.size() != qimg.size() or not pix.convertFromImage(qimg):
+            pix = self.slots[self.index] = QPixmap.fromImage(qimg)
+        return pix
+
+
+_pools = weakref.WeakKeyDictionary()
+
+
+def show_frame(label, img, size=None):
+    """
+    在label中按比例显示img，等价于 label.setPixmap(cvimg2qt(img).scaled(label.size(), Qt.KeepAspectRatio))
+    size: 可选的显示区域(w, h)，默认取label当前大小
+    """
+    if img is None:
+        return
+    if size is None:
+        size = (label.width(), label.height())
+    small = fit_to(img, size)
+    qimg, _buf = _wrap(small)
+    pool = _pools.get(label)
+    if pool is None:
+        pool = _pools[label] = _PixmapPool()
+    pix = pool.next(qimg)
+    if small is img and (img.shape[1] < size[0] and img.shape[0] < size[1]):
+        # 图像比显示区域小时仍按原逻辑放大铺满
+        pix = pix.scaled(size[0], size[1], Qt.KeepAspectRatio)
+    label.setPixmap(pix)
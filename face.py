@@ -1,6 +1,15 @@
 import cv2
 import numpy as np
 import mediapipe as mp
+from results import InferenceResult
+from renderer import OverlayRenderer
+
+NUM_LANDMARKS = 478  # refine_landmarks=True时每张脸的关键点数
+# 瞳孔与眼角在FaceMesh(refine_landmarks=True)中的关键点编号
+LEFT_PUPIL_IDX = 468
+RIGHT_PUPIL_IDX = 473
+LEFT_EYE_CORNER_IDX = 133
+RIGHT_EYE_CORNER_IDX = 362
 
 class FaceLandmarkGaze:
     def __init__(self, static_mode=False, max_faces=1, min_detection_confidence=0.5, min_tracking_confidence=0.5):
@@ -13,48 +22,50 @@ class FaceLandmarkGaze:
             refine_landmarks=True  # 关键
         )
 
-    def infer(self, image_bgr):
+    def predict(self, image_bgr):
+        """
+        输入: image_bgr (OpenCV BGR格式)
+        输出: InferenceResult，keypoints为 Fx478x3 (像素x, 像素y, 归一化深度z)，extras["gaze"]为每张脸的视线信息
+        """
         image_rgb = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2RGB)
         results = self.face_mesh.process(image_rgb)
         h, w, _ = image_bgr.shape
-        faces = []
+        faces = results.multi_face_landmarks or []
+        # 一次性取出所有关键点(归一化坐标)，视线向量与像素坐标均基于数组整体计算
+        points_3d = np.array([[(lm.x, lm.y, lm.z) for lm in face.landmark] for face in faces], np.float32).reshape(-1, NUM_LANDMARKS, 3)
+        kpts = points_3d.copy()
+        kpts[..., :2] *= (w, h)
+        points_2d = kpts[..., :2].astype(np.int32)
         gaze_list = []
-        if results.multi_face_landmarks:
-            for face_landmarks in results.multi_face_landmarks:
-                points_2d = []
-                points_3d = []
-                for lm in face_landmarks.landmark:
-                    x, y = int(lm.x * w), int(lm.y * h)
-                    points_2d.append((x, y))
-                    points_3d.append((lm.x, lm.y, lm.z))
-                faces.append(points_2d)
+        if len(faces):
+            left_vecs = points_3d[:, LEFT_PUPIL_IDX] - points_3d[:, LEFT_EYE_CORNER_IDX]
+            right_vecs = points_3d[:, RIGHT_PUPIL_IDX] - points_3d[:, RIGHT_EYE_CORNER_IDX]
+            for i in range(len(faces)):
+                gaze_list.append({
+                    "left_pupil_2d": points_2d[i, LEFT_PUPIL_IDX],
+                    "right_pupil_2d": points_2d[i, RIGHT_PUPIL_IDX],
+                    "left_pupil_3d": points_3d[i, LEFT_PUPIL_IDX],
+                    "right_pupil_3d": points_3d[i, RIGHT_PUPIL_IDX],
+                    "left_eye_vec": left_vecs[i],
+                    "right_eye_vec": right_vecs[i]
+                })
+        boxes = np.concatenate([kpts[..., :2].min(axis=1), kpts[..., :2].max(axis=1)], axis=1) if len(faces) else None
+        return InferenceResult(boxes=boxes, keypoints=kpts, shape=(h, w), extras={"gaze": gaze_list}, raw=results)
+
+    def infer(self, image_bgr):
+        """
+        输入: image_bgr (OpenCV BGR格式)
+        输出: 原图, faces (每张脸一个478x2 int32数组), gaze_list
+        """
+        det = self.predict(image_bgr)
+        return image_bgr.copy(), det.keypoints_per_instance(), det.extras["gaze"]
 
-                left_pupil_idx = 468
-                right_pupil_idx = 473
-                if len(points_2d) > right_pupil_idx:
-                    left_pupil_2d = points_2d[left_pupil_idx]
-                    right_pupil_2d = points_2d[right_pupil_idx]
-                    left_pupil_3d = points_3d[left_pupil_idx]
-                    right_pupil_3d = points_3d[right_pupil_idx]
-                    left_eye_corner_idx = 133
-                    right_eye_corner_idx = 362
-                    left_eye_vec = np.array(points_3d[left_pupil_idx]) - np.array(points_3d[left_eye_corner_idx])
-                    right_eye_vec = np.array(points_3d[right_pupil_idx]) - np.array(points_3d[right_eye_corner_idx])
-                    gaze_list.append({
-                        "left_pupil_2d": left_pupil_2d,
-                        "right_pupil_2d": right_pupil_2d,
-                        "left_pupil_3d": left_pupil_3d,
-                        "right_pupil_3d": right_pupil_3d,
-                        "left_eye_vec": left_eye_vec,
-                        "right_eye_vec": right_eye_vec
-                    })
-        return image_bgr.copy(), faces, gaze_list
+_renderer = OverlayRenderer(kpt_conf=None)
 
 def draw_face_landmarks_and_gaze(img, faces, gaze_list):
     for face, gaze in zip(faces, gaze_list):
-        # 画面部关键点
-        for (x, y) in face:
-            cv2.circle(img, (x, y), 1, (0, 255, 0), -1)
+        # 画面部关键点，478个点一次性写入像素
+        _renderer.draw_points(img, face, (0, 255, 0), 1)
         # 画瞳孔
         left_pupil_2d = tuple(map(int, gaze["left_pupil_2d"]))
         right_pupil_2d = tuple(map(int, gaze["right_pupil_2d"]))
@@ -0,0 +1,79 @@
+import time
+import cv2
+import numpy as np
+
+# 基于画面变化的自适应抽帧：只在镜头切换或画面明显变化时把帧送给VLM，静止画面按最大间隔兜底
+# 每帧只计算缩小后的灰度图和直方图作为签名，与上一次送出的帧比较，开销约1ms
+
+
+class SceneChangeSampler:
+    """
+    hist_threshold: 灰度直方图巴氏距离阈值(0~1)，超过视为镜头切换
+    diff_threshold: 缩略图平均绝对差阈值(0~1)，超过视为画面明显变化
+    min_gap: 两次送出之间至少间隔的帧数，防止快速闪烁时连续送帧
+    max_gap: 最多间隔多少帧必须送出一帧，保证长时间静止画面也会定期更新
+    max_seconds: 可选，按时间计的最大间隔（摄像头场景）
+    """
+    def __init__(self, hist_threshold=0.25, diff_threshold=0.08, min_gap=1, max_gap=300, max_seconds=None,
+                 size=(64, 36), bins=32):
+        self.hist_threshold = hist_threshold
+        self.diff_threshold = diff_threshold
+        self.min_gap = max(1, min_gap)
+        self.max_gap = max_gap
+        self.max_seconds = max_seconds
+        self.size = size
+        self.bins = bins
+        self.seen = 0  # 已检查的帧数
+        self.sent = 0  # 已送出的帧数
+        self.reset()
+
+    def reset(self):
+        self._ref_small = None
+        self._ref_hist = None
+        self._since = 0
+        self._last_time = None
+
+    def signature(self, frame):
+        """缩略灰度图 + 归一化直方图"""
+        w, h = self.size
+        fh, fw = frame.shape[:2]
+        if fw > w * 4 and fh > h * 4:
+            # 先最近邻抽样到2倍尺寸，再区域插值，避免对整帧做INTER_AREA
+            frame = cv2.resize(frame, (w * 2, h * 2), interpolation=cv2.INTER_NEAREST)
+        small = cv2.resize(frame, (w, h), interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        hist = cv2.calcHist([small], [0], None, [self.bins], [0, 256])
+        cv2.normalize(hist, hist, 1.0, 0.0, cv2.NORM_L1)
+        return small, hist
+
+    def _change(self, frame):
+        """与上一次送出的帧比较，返回 ((直方图距离, 平均差值), 缩略图, 直方图)；尚无参考帧时第一项为None"""
+        small, hist = self.signature(frame)
+        if self._ref_small is None:
+            return None, small, hist
+        hist_dist = cv2.compareHist(self._ref_hist, hist, cv2.HISTCMP_BHATTACHARYYA)
+        diff = float(np.mean(cv2.absdiff(self._ref_small, small))) / 255.0
+        return (hist_dist, diff), small, hist
+
+    def should_send(self, frame):
+        """判断当前帧是否需要送给VLM；返回True时该帧成为新的参考帧"""
+        self.seen += 1
+        self._since += 1
+        scores, small, hist = self._change(frame)
+        now = time.monotonic()
+        if scores is None:
+            send = True
+        elif self._since < self.min_gap:
+            send = False
+        else:
+            hist_dist, diff = scores
+            send = (hist_dist > self.hist_threshold or diff > self.diff_threshold
+                    or (self.max_gap is not None and self._since >= self.max_gap)
+                    or (self.max_seconds is not None and now - self._last_time >= self.max_seconds))
+        if send:
+            self._ref_small, self._ref_hist = small, hist
+            self._since = 0
+            self._last_time = now
+            self.sent += 1
+        return send
@@ -1,6 +1,7 @@
 import cv2
 import numpy as np
 import mediapipe as mp
+from results import InferenceResult
 
 class HandPoseEstimator:
     def __init__(self):
@@ -10,24 +11,29 @@ class HandPoseEstimator:
                                          min_detection_confidence=0.5,
                                          min_tracking_confidence=0.5)
 
-    def infer(self, image_bgr):
+    def predict(self, image_bgr):
         """
         输入: image_bgr (OpenCV BGR格式)
-        输出: 原图, hand_keypoints_info, results
-        hand_keypoints_info: [ [ (x1, y1), (x2, y2), ... ], ... ]  # 每只手21个关键点
+        输出: InferenceResult，keypoints为 Hx21x3 (像素x, 像素y, 归一化深度z)，boxes为每只手关键点的外接框
         """
         image_rgb = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2RGB)
         results = self.hands.process(image_rgb)
-        hand_keypoints_info = []
-        if results.multi_hand_landmarks:
-            h, w, _ = image_bgr.shape
-            for hand_landmarks in results.multi_hand_landmarks:
-                points = []
-                for lm in hand_landmarks.landmark:
-                    x, y = int(lm.x * w), int(lm.y * h)
-                    points.append((x, y))
-                hand_keypoints_info.append(points)
-        return image_bgr.copy(), hand_keypoints_info, results
+        h, w, _ = image_bgr.shape
+        hands = results.multi_hand_landmarks or []
+        # 一次性取出所有关键点，再整体换算到像素坐标
+        kpts = np.array([[(lm.x, lm.y, lm.z) for lm in hand.landmark] for hand in hands], np.float32).reshape(-1, 21, 3)
+        kpts[..., :2] *= (w, h)
+        boxes = np.concatenate([kpts[..., :2].min(axis=1), kpts[..., :2].max(axis=1)], axis=1) if len(hands) else None
+        return InferenceResult(boxes=boxes, keypoints=kpts, shape=(h, w), raw=results)
+
+    def infer(self, image_bgr):
+        """
+        输入: image_bgr (OpenCV BGR格式)
+        输出: 原图, hand_keypoints_info, results
+        hand_keypoints_info: [ 21x2 int32数组, ... ]  # 每只手21个关键点
+        """
+        det = self.predict(image_bgr)
+        return image_bgr.copy(), det.keypoints_per_instance(), det.raw
 
 if __name__ == "__main__":
     estimator = HandPoseEstimator()
@@ -39,7 +45,7 @@ if __name__ == "__main__":
         result_img, hand_keypoints_info, results = estimator.infer(img)
         # 可视化关键点
         for hand in hand_keypoints_info:
-            for idx, (x, y) in enumerate(hand):
+            for idx, (x, y) in enumerate(hand.tolist()):
                 cv2.circle(result_img, (x, y), 4, (0, 255, 0), -1)
                 cv2.putText(result_img, str(idx), (x+5, y-5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0,255,0), 1)
         cv2.imshow("HandPose", result_img)
@@ -16,6 +16,7 @@ from PyQt5.QtCore import Qt, QTimer
 from PyQt5.QtGui import QPixmap, QImage, QFont
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.figure import Figure
+from display import show_frame
 
 class StatisticsDialog(QFrame):
     def __init__(self, parent=None):
@@ -421,7 +422,7 @@ class ImageProcessingWindow(QWidget):
             self.stop_video_camera()
             return
         self.input_img = frame
-        self.input_label.setPixmap(cvimg2qt(frame).scaled(self.input_label.size(), Qt.KeepAspectRatio))
+        show_frame(self.input_label, frame)
         # 实时处理
         func = self.selected_func
         img = frame.copy()
@@ -532,7 +533,7 @@ class ImageProcessingWindow(QWidget):
         except Exception:
             res = img
         self.result_img = res
-        self.result_label.setPixmap(cvimg2qt(res).scaled(self.result_label.size(), Qt.KeepAspectRatio))
+        show_frame(self.result_label, res)
         # 实时刷新统计弹窗
         if self.stats_dialog and self.stats_dialog.isVisible():
             stat_funcs = {
@@ -654,7 +655,7 @@ class ImageProcessingWindow(QWidget):
         if 'res' not in locals():
             res = img
         self.result_img = res
-        self.result_label.setPixmap(cvimg2qt(res).scaled(self.result_label.size(), Qt.KeepAspectRatio))
+        show_frame(self.result_label, res)
 
     def closeEvent(self, event):
         self.stop_video_camera()
@@ -666,7 +667,7 @@ class ImageProcessingWindow(QWidget):
             img = cv2.imdecode(np.fromfile(fname, dtype=np.uint8), cv2.IMREAD_COLOR)
             if img is not None:
                 self.input_img = img
-                self.input_label.setPixmap(cvimg2qt(img).scaled(self.input_label.size(), Qt.KeepAspectRatio))
+                show_frame(self.input_label, img)
                 self.result_label.clear()
                 self.cap = None
 
@@ -692,15 +693,3 @@ class ImageProcessingWindow(QWidget):
             self.cap.release()
             self.cap = None
         self.timer.stop()
-
-def cvimg2qt(img):
-    """OpenCV图像转QPixmap"""
-    from PyQt5.QtGui import QImage, QPixmap
-    if len(img.shape) == 2:
-        h, w = img.shape
-        qimg = QImage(img.data, w, h, w, QImage.Format_Grayscale8)
-    else:
-        h, w, ch = img.shape
-        rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        qimg = QImage(rgb.data, w, h, ch * w, QImage.Format_RGB888)
-    return QPixmap.fromImage(qimg)
\ No newline at end of file
@@ -0,0 +1,216 @@
+import base64
+import threading
+import cv2
+import numpy as np
+
+# VLM上传图像编码：缩小到最长边上限、在字节预算内搜索JPEG质量、可按检测框裁剪感兴趣区域
+# 缩放缓冲按线程复用；质量搜索从上一帧选定的质量开始，连续画面通常1~2次编码即可收敛
+# 报警快照编码(SnapshotEncoder)：在小图上预测满足字节上限的质量，原图通常只编码一次；python jpeg_encoder.py 运行基准对比
+
+
+class UploadEncoder:
+    """
+    max_side: 最长边上限（像素），更大的图先等比缩小
+    byte_budget: 单张JPEG的目标字节数上限
+    min_quality / max_quality: 质量搜索范围；min_quality仍超预算时按min_quality输出
+    roi_margin: 裁剪感兴趣区域时在外接框四周额外保留的比例
+    """
+    QUALITY_TOLERANCE = 4
+
+    def __init__(self, max_side=1024, byte_budget=100 * 1024, min_quality=40, max_quality=85, roi_margin=0.1):
+        self.max_side = max_side
+        self.byte_budget = byte_budget
+        self.min_quality = min_quality
+        self.max_quality = max_quality
+        self.roi_margin = roi_margin
+        self.last_quality = max_quality
+        self.last_size = 0
+        self._local = threading.local()
+
+    # ---------------- 预处理 ----------------
+    def crop(self, img, roi):
+        """
+        roi: None、单个框(x1, y1, x2, y2)或Nx4框数组（如InferenceResult.boxes）
+        返回所有框外接矩形加边距后的裁剪视图（不拷贝）；没有框时返回原图
+        """
+        if roi is None:
+            return img
+        boxes = np.asarray(roi, np.float32).reshape(-1, 4)
+        if not len(boxes):
+            return img
+        h, w = img.shape[:2]
+        x1, y1 = boxes[:, :2].min(axis=0)
+        x2, y2 = boxes[:, 2:].max(axis=0)
+        mx, my = (x2 - x1) * self.roi_margin, (y2 - y1) * self.roi_margin
+        x1, y1 = int(max(0, x1 - mx)), int(max(0, y1 - my))
+        x2, y2 = int(min(w, x2 + mx)), int(min(h, y2 + my))
+        if x2 - x1 < 2 or y2 - y1 < 2:
+            return img
+        return img[y1:y2, x1:x2]
+
+    def resize(self, img):
+        """等比缩小到max_side以内，缩放结果写入本线程复用的缓冲区"""
+        h, w = img.shape[:2]
+        scale = self.max_side / max(h, w)
+        if scale >= 1:
+            return img
+        size = (max(1, int(w * scale)), max(1, int(h * scale)))
+        shape = (size[1], size[0]) + img.shape[2:]
+        buf = getattr(self._local, "buf", None)
+        if buf is None or buf.shape != shape or buf.dtype != img.dtype:
+            buf = self._local.buf = np.empty(shape, img.dtype)
+        cv2.resize(img, size, dst=buf, interpolation=cv2.INTER_AREA)
+        return buf
+
+    # ---------------- 编码 ----------------
+    def _imencode(self, img, quality):
+        ok, buf = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, int(quality)])
+        if not ok:
+            raise ValueError("JPEG编码失败")
+        return buf
+
+    def encode(self, img, roi=None):
+        """返回满足字节预算的JPEG数据(np.uint8一维数组)"""
+        img = self.resize(self.crop(img, roi))
+        lo, hi = self.min_quality, self.max_quality
+        q = min(max(self.last_quality, lo), hi)
+        best = None
+        # 二分搜索满足预算的最高质量，起点为上一帧的质量；与上界相差不超过QUALITY_TOLERANCE即停止
+        while lo <= hi and (best is None or hi - best[0] > self.QUALITY_TOLERANCE):
+            buf = self._imencode(img, q)
+            if len(buf) <= self.byte_budget:
+                best = (q, buf)
+                lo = q + 1
+            else:
+                hi = q - 1
+            q = (lo + hi + 1) // 2
+        if best is None:
+            best = (self.min_quality, self._imencode(img, self.min_quality))
+        self.last_quality, buf = best
+        self.last_size = len(buf)
+        return buf
+
+    def to_data_url(self, img, roi=None):
+        """编码为 data:image/jpeg;base64,... 字符串，base64直接作用于编码缓冲区，不做额外拷贝"""
+        buf = self.encode(img, roi)
+        return "data:image/jpeg;base64," + base64.b64encode(memoryview(buf)).decode("ascii")
+
+
+class SnapshotEncoder:
+    """
+    报警快照编码：在字节上限内取尽量高的JPEG质量，通常只需对原图编码一次
+    先在最近邻抽样的小图上搜索质量（按像素比例换算字节数，并用历史实际/预测比例校正），
+    再以选定质量编码原图；个别超限时小步降低质量重编码
+    byte_budget: 单张JPEG字节上限
+    probe_pixels: 探测小图的像素数
+    safety: 预测字节数需低于 byte_budget * safety
+    """
+    def __init__(self, byte_budget=2 * 1024 * 1024, min_quality=30, max_quality=95, probe_pixels=320 * 240,
+                 safety=0.9, step=5):
+        self.byte_budget = byte_budget
+        self.min_quality = min_quality
+        self.max_quality = max_quality
+        self.probe_pixels = probe_pixels
+        self.safety = safety
+        self.step = step
+        self.ratio = None  # 实际字节 / 预测字节，指数平均；尚无历史时按1.0（偏保守）
+        self.last_quality = max_quality
+        self.last_size = 0
+        self.full_encodes = 0  # 累计原图编码次数
+        self.probe_encodes = 0  # 累计小图编码次数
+
+    def _imencode(self, img, quality):
+        ok, buf = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, int(quality)])
+        if not ok:
+            raise ValueError("JPEG编码失败")
+        return buf
+
+    def _probe(self, img):
+        """最近邻抽样得到探测小图，返回(小图, 像素放大倍数)；最近邻保留纹理细节，预测偏保守"""
+        h, w = img.shape[:2]
+        step = int(np.sqrt(h * w / self.probe_pixels))
+        if step < 2:
+            return None, 1.0
+        probe = img[::step, ::step]
+        return probe, (h * w) / (probe.shape[0] * probe.shape[1])
+
+    def choose_quality(self, img):
+        """预测满足字节上限的最高质量"""
+        probe, scale = self._probe(img)
+        if probe is None:
+            return self.max_quality
+        target = self.byte_budget * self.safety
+
+        def predict(q):
+            self.probe_encodes += 1
+            return len(self._imencode(probe, q)) * scale * (self.ratio or 1.0)
+
+        if predict(self.max_quality) <= target:
+            return self.max_quality
+        lo, hi, best = self.min_quality, self.max_quality - 1, self.min_quality
+        while lo <= hi:
+            q = (lo + hi) // 2
+            if predict(q) <= target:
+                best, lo = q, q + 1
+            else:
+                hi = q - 1
+        return best
+
+    def encode(self, img):
+        """返回不超过byte_budget的JPEG数据(np.uint8一维数组)；min_quality仍超限时按min_quality输出"""
+        q = self.choose_quality(img)
+        probe, scale = self._probe(img)
+        while True:
+            buf = self._imencode(img, q)
+            self.full_encodes += 1
+            if len(buf) <= self.byte_budget or q <= self.min_quality:
+                break
+            q = max(self.min_quality, q - self.step)
+        if probe is not None:
+            # 用本次实际大小校正预测比例
+            predicted = len(self._imencode(probe, q)) * scale
+            self.probe_encodes += 1
+            ratio = len(buf) / max(predicted, 1)
+            self.ratio = ratio if self.ratio is None else 0.5 * self.ratio + 0.5 * ratio
+        self.last_quality = q
+        self.last_size = len(buf)
+        return buf
+
+
+if __name__ == "__main__":
+    # 基准：原逐级降质量循环(95起每次-5，直到<2MB) 与 SnapshotEncoder 的编码耗时和次数
+    import time
+
+    def step_down(img, budget):
+        quality, n = 95, 0
+        while quality >= 30:
+            _, buf = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, quality])
+            n += 1
+            if len(buf) < budget:
+                break
+            quality -= 5
+        return buf, quality, n
+
+    rng = np.random.default_rng(0)
+    base = cv2.resize(rng.integers(0, 256, (270, 480, 3), np.uint8), (3840, 2160), interpolation=cv2.INTER_CUBIC)
+    frames = {
+        "4K平滑": cv2.GaussianBlur(base, (0, 0), 3),
+        "4K纹理": cv2.add(base, rng.integers(0, 40, base.shape, np.uint8)),
+        "4K噪声": rng.integers(0, 256, (2160, 3840, 3), np.uint8),
+    }
+    budget = 2 * 1024 * 1024
+    for name, img in frames.items():
+        encoder = SnapshotEncoder(byte_budget=budget - 1)
+        encoder.encode(img)  # 预热，建立历史校正
+        encoder.full_encodes = encoder.probe_encodes = 0
+        runs = 5
+        t0 = time.perf_counter()
+        for _ in range(runs):
+            old_buf, old_q, old_n = step_down(img, budget)
+        t1 = time.perf_counter()
+        for _ in range(runs):
+            buf = encoder.encode(img)
+        t2 = time.perf_counter()
+        print(f"{name}: 逐级降质量 {(t1 - t0) / runs * 1000:.1f} ms ({old_n}次编码, q={old_q}, {len(old_buf) / 1024:.0f}KB) | "
+              f"SnapshotEncoder {(t2 - t1) / runs * 1000:.1f} ms (原图{encoder.full_encodes / runs:.1f}次, "
+              f"小图{encoder.probe_encodes / runs:.1f}次, q={encoder.last_quality}, {encoder.last_size / 1024:.0f}KB)")
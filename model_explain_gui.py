@@ -8,15 +8,8 @@ from PyQt5.QtWidgets import (
 from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QPixmap, QImage, QFont
 from model_explain import ModelExplainer
-from detect import ObjectDetector
-from seg import Segmentor
-from pos import PoseEstimator
-
-def cvimg2qt(img):
-    rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-    h, w, ch = rgb.shape
-    bytes_per_line = ch * w
-    return QPixmap.fromImage(QImage(rgb.data, w, h, bytes_per_line, QImage.Format_RGB888))
+from model_registry import load_yolo
+from display import show_frame
 
 class ModelExplainWindow(QDialog):
     def __init__(self, parent=None):
@@ -119,7 +112,7 @@ class ModelExplainWindow(QDialog):
             if path:
                 img = cv2.imread(path)
                 self.input_img = img
-                self.input_label.setPixmap(cvimg2qt(img).scaled(self.input_label.size(), Qt.KeepAspectRatio))
+                show_frame(self.input_label, img)
                 self.info_text.append(f"已选择图片: {path}")
         elif t == "视频":
             path, _ = QFileDialog.getOpenFileName(self, "选择视频", "", "Videos (*.mp4 *.avi *.mov)")
@@ -128,7 +121,7 @@ class ModelExplainWindow(QDialog):
                 ret, img = cap.read()
                 if ret:
                     self.input_img = img
-                    self.input_label.setPixmap(cvimg2qt(img).scaled(self.input_label.size(), Qt.KeepAspectRatio))
+                    show_frame(self.input_label, img)
                 cap.release()
                 self.info_text.append(f"已选择视频: {path}")
         elif t == "摄像头":
@@ -139,7 +132,7 @@ class ModelExplainWindow(QDialog):
             ret, img = cap.read()
             if ret:
                 self.input_img = img
-                self.input_label.setPixmap(cvimg2qt(img).scaled(self.input_label.size(), Qt.KeepAspectRatio))
+                show_frame(self.input_label, img)
                 self.info_text.append("已打开摄像头")
             cap.release()
 
@@ -157,13 +150,9 @@ class ModelExplainWindow(QDialog):
         path, _ = QFileDialog.getOpenFileName(self, "选择权重文件", "", "PyTorch Weights (*.pt *.pth)")
         if path:
             try:
-                if t == "目标检测":
-                    # ultralytics YOLO对象的 .model 才是真正的torch模型
-                    self.model = ObjectDetector(path).model.model
-                elif t == "图像分割":
-                    self.model = Segmentor(path).model.model
-                elif t == "姿态估计":
-                    self.model = PoseEstimator(path).model.model
+                # ultralytics YOLO对象的 .model 才是真正的torch模型
+                # 特征图hook注册在网络模块上，不能用模型缓存中与其他窗口共享的网络，这里单独加载一份（也未经推理时的层融合）
+                self.model = load_yolo(path).model
                 self.explainer = ModelExplainer(self.model)
                 self.weight_label.setText(os.path.basename(path))
                 self.info_text.append("模型加载成功")
@@ -198,7 +187,7 @@ class ModelExplainWindow(QDialog):
             h, w = self.input_img.shape[:2]
             heatmap = cv2.resize(heatmap, (w, h))
             overlay = cv2.addWeighted(self.input_img, 0.5, heatmap, 0.5, 0)
-            self.vis_label.setPixmap(cvimg2qt(overlay).scaled(self.vis_label.size(), Qt.KeepAspectRatio))
+            show_frame(self.vis_label, overlay)
             self.info_text.append(f"已可视化层级: {layer}")
         else:
             QMessageBox.warning(self, "可视化失败", "未获取到特征图")
@@ -328,7 +317,7 @@ class AllLayersVisDialog(QDialog):
             col = idx % 4
             vbox = QVBoxLayout()
             label_img = QLabel()
-            label_img.setPixmap(cvimg2qt(img).scaled(200, 200, Qt.KeepAspectRatio))
+            show_frame(label_img, img, (200, 200))
             label_img.setAlignment(Qt.AlignCenter)
             vbox.addWidget(label_img)
             label_name = QLabel(layer_name)
@@ -392,7 +381,7 @@ class ChannelHeatmapsDialog(QDialog):
             col = idx % 4
             vbox = QVBoxLayout()
             label_img = QLabel()
-            label_img.setPixmap(cvimg2qt(heatmap).scaled(200, 200, Qt.KeepAspectRatio))
+            show_frame(label_img, heatmap, (200, 200))
             label_img.setAlignment(Qt.AlignCenter)
             vbox.addWidget(label_img)
             label_name = QLabel(f"通道 {start + idx}")
@@ -0,0 +1,187 @@
+import concurrent.futures
+import copy
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+from backend import get_device
+
+# 进程级模型缓存：按(权重绝对路径, 任务, 设备)缓存已加载的模型，切换权重时直接复用
+# 总内存按参数与缓冲区字节数估算，超过预算时淘汰最久未使用的模型（至少保留最近使用的一个）
+# 预热：对全零图像做一次推理，让Ultralytics在加载阶段完成predictor初始化、算子选择等首帧开销
+# 内存预算可通过环境变量 VRP_MODEL_CACHE_MB 设置（默认2048）
+# 缓存的是网络权重：get_model返回各自独立的浅拷贝，predictor、回调和参数互不影响，一个窗口的推理参数或追踪状态不会带到另一个窗口
+
+
+def load_yolo(path, task=None):
+    from ultralytics import YOLO
+    return YOLO(path, task=task) if task else YOLO(path)
+
+
+def model_nbytes(model, path=None):
+    """估算模型占用的内存（参数+缓冲区），无法获取时按权重文件大小估算"""
+    module = getattr(model, "model", model)
+    try:
+        tensors = list(module.parameters()) + list(module.buffers())
+        return sum(t.numel() * t.element_size() for t in tensors)
+    except (AttributeError, TypeError):
+        return os.path.getsize(path) if path and os.path.exists(path) else 0
+
+
+def warmup_yolo(model, imgsz=640):
+    model.predict(np.zeros((imgsz, imgsz, 3), np.uint8), device=get_device(), verbose=False)
+
+
+class _Entry:
+    __slots__ = ("model", "nbytes", "future")
+
+    def __init__(self):
+        self.model = None
+        self.nbytes = 0
+        self.future = concurrent.futures.Future()
+
+
+class ModelRegistry:
+    """
+    memory_budget_mb: 缓存模型的总内存上限（MB）
+    get/preload的参数：
+    loader(path, task): 加载函数，默认加载YOLO；SAM等模型可传入自定义加载函数
+    warmup_fn(model): 预热函数，默认对640x640全零图像推理一次
+    """
+    def __init__(self, memory_budget_mb=None):
+        if memory_budget_mb is None:
+            memory_budget_mb = float(os.getenv("VRP_MODEL_CACHE_MB", 2048))
+        self.memory_budget = int(memory_budget_mb * 1024 * 1024)
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def key(self, path, task=None):
+        return (os.path.abspath(path) if os.path.exists(path) else path, task, get_device())
+
+    def get(self, path, task=None, loader=load_yolo, warmup=False, warmup_fn=warmup_yolo):
+        """返回缓存的模型；未缓存时在当前线程加载（另一线程正在加载同一模型时等待其完成）"""
+        entry, owner = self._claim(path, task)
+        if owner:
+            self._load(entry, path, task, loader, warmup_fn if warmup else None)
+        return entry.future.result()
+
+    def preload(self, path, task=None, loader=load_yolo, warmup=True, warmup_fn=warmup_yolo):
+        """在后台线程加载并预热，立即返回Future；之后的get会等待该次加载，不会重复加载"""
+        entry, owner = self._claim(path, task)
+        if owner:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="model-preload")
+            self._executor.submit(self._load, entry, path, task, loader, warmup_fn if warmup else None)
+        return entry.future
+
+    def _claim(self, path, task):
+        key = self.key(path, task)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and not (entry.future.done() and entry.future.exception() is not None):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry, False
+            entry = self._entries[key] = _Entry()
+            return entry, True
+
+    def _load(self, entry, path, task, loader, warmup_fn):
+        try:
+            model = loader(path, task)
+            if warmup_fn is not None:
+                warmup_fn(model)
+        except Exception as e:
+            with self._lock:
+                key = self.key(path, task)
+                if self._entries.get(key) is entry:
+                    del self._entries[key]
+            entry.future.set_exception(e)
+            return
+        entry.model = model
+        entry.nbytes = model_nbytes(model, path)
+        with self._lock:
+            self.loads += 1
+            self._evict()
+        entry.future.set_result(model)
+
+    def _evict(self):
+        """超出内存预算时按LRU淘汰已加载完成的模型，最近使用的模型始终保留"""
+        total = sum(e.nbytes for e in self._entries.values())
+        for key in list(self._entries)[:-1]:
+            if total <= self.memory_budget:
+                break
+            entry = self._entries[key]
+            if not entry.future.done():
+                continue
+            total -= entry.nbytes
+            del self._entries[key]
+            self.evictions += 1
+
+    def evict(self, path, task=None):
+        with self._lock:
+            return self._entries.pop(self.key(path, task), None) is not None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "models": [(k[0], k[1], e.nbytes) for k, e in self._entries.items()],
+                "memory_mb": sum(e.nbytes for e in self._entries.values()) / 1024 / 1024,
+                "budget_mb": self.memory_budget / 1024 / 1024,
+                "hits": self.hits,
+                "loads": self.loads,
+                "evictions": self.evictions,
+            }
+
+
+def model_view(model):
+    """共享网络权重的浅拷贝，predictor、回调和overrides各自独立（与模型服务的追踪会话相同）"""
+    view = copy.copy(model)
+    if hasattr(view, "predictor"):
+        view.predictor = None
+    if isinstance(getattr(model, "callbacks", None), dict):
+        view.callbacks = {k: list(v) for k, v in model.callbacks.items()}
+    if isinstance(getattr(model, "overrides", None), dict):
+        view.overrides = dict(model.overrides)
+    return view
+
+
+class LazyModel:
+    """
+    构造时在后台加载并预热（preload_model），立即返回，可在界面线程中创建
+    get()在推理线程中调用，首次调用等待加载完成并返回本使用者独立的模型；加载失败时抛出加载异常
+    future: 加载的Future，可用add_done_callback提示加载结果
+    """
+    def __init__(self, path, task=None, loader=load_yolo, warmup=True, warmup_fn=warmup_yolo):
+        self.path = path
+        self.task = task
+        self.future = preload_model(path, task, loader, warmup, warmup_fn)
+        self._model = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        with self._lock:
+            if self._model is None:
+                self._model = model_view(self.future.result())
+            return self._model
+
+
+registry = ModelRegistry()
+
+
+def get_model(path, task=None, loader=load_yolo, warmup=False, warmup_fn=warmup_yolo):
+    """返回缓存权重的独立浅拷贝（见model_view）；未缓存时在当前线程加载"""
+    return model_view(registry.get(path, task, loader, warmup, warmup_fn))
+
+
+def preload_model(path, task=None, loader=load_yolo, warmup=True, warmup_fn=warmup_yolo):
+    """后台加载，返回Future，结果为缓存中的共享模型；使用前应经model_view拷贝，或直接使用LazyModel"""
+    return registry.preload(path, task, loader, warmup, warmup_fn)
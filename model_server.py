@@ -0,0 +1,517 @@
+import copy
+import concurrent.futures
+import getpass
+import itertools
+import os
+import queue
+import re
+import secrets
+import stat
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Listener, Client
+from backend import get_device, FPSMeter
+from results import InferenceResult
+from model_registry import get_model
+from checkpoint import tracker_state, restore_tracker
+
+# 本地模型服务进程：每个权重文件只加载一次，所有窗口和脚本通过本机套接字（Linux/macOS为UNIX套接字，Windows为命名管道）共享
+# 同一模型的请求在该模型的工作线程中排队执行，可查询每个模型的队列深度和推理延迟
+# 追踪请求按会话区分：各会话的追踪器状态独立，但共享同一份网络权重
+# 每个RemoteModel使用独立的连接，服务端每条连接一个线程，不同窗口的请求不在客户端互相排队
+# 服务进程退出后RemoteModel自动重连（必要时重新启动服务），仍不可用时改为进程内加载
+# 启动: python model_server.py        查看状态: python model_server.py --stats
+# 设置环境变量 VRP_MODEL_SERVER=0 可禁用模型服务，各窗口退回进程内加载
+# 套接字和随机认证密钥放在当前用户私有的目录中，其他用户无法连接
+
+KEY_BYTES = 32
+
+
+def runtime_dir():
+    """
+    当前用户私有的运行目录，存放套接字和认证密钥
+    Linux/macOS: $XDG_RUNTIME_DIR/vrp，未设置时为 临时目录/vrp-<uid>，权限0700且必须属于当前用户
+    Windows: %LOCALAPPDATA%/vrp（用户配置目录，默认只有本人和管理员可访问）
+    """
+    if sys.platform == "win32":
+        path = os.path.join(os.getenv("LOCALAPPDATA") or os.path.expanduser("~"), "vrp")
+        os.makedirs(path, exist_ok=True)
+        return path
+    base = os.getenv("XDG_RUNTIME_DIR")
+    path = os.path.join(base, "vrp") if base and os.path.isdir(base) else \
+        os.path.join(tempfile.gettempdir(), f"vrp-{os.getuid()}")
+    try:
+        os.mkdir(path, 0o700)
+    except FileExistsError:
+        pass
+    # 公共临时目录下的同名目录可能被其他用户抢先创建，不属于自己或权限过宽时拒绝使用
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid():
+        raise RuntimeError(f"模型服务目录不属于当前用户: {path}")
+    if stat.S_IMODE(st.st_mode) & 0o077:
+        os.chmod(path, 0o700)
+    return path
+
+
+def load_authkey():
+    """当前用户的随机认证密钥，首次使用时生成并以0600权限保存，服务端和客户端读取同一文件"""
+    path = os.path.join(runtime_dir(), "vrp_model_server.key")
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        # 其他进程刚创建、尚未写完时稍等
+        for _ in range(50):
+            with open(path, "rb") as f:
+                key = f.read()
+            if len(key) >= KEY_BYTES:
+                return key
+            time.sleep(0.02)
+        raise RuntimeError(f"模型服务密钥文件无效: {path}")
+    key = secrets.token_bytes(KEY_BYTES)
+    with os.fdopen(fd, "wb") as f:
+        f.write(key)
+    return key
+
+
+def default_address():
+    if sys.platform == "win32":
+        user = re.sub(r"[^\w.-]", "_", getpass.getuser())
+        return rf"\\.\pipe\vrp_model_server_{user}"
+    return os.path.join(runtime_dir(), "vrp_model_server.sock")
+
+
+if sys.platform == "win32":
+    import ctypes
+    import _winapi
+    from ctypes import wintypes
+    from multiprocessing.connection import PipeListener, BUFSIZE
+
+    class _SecurityAttributes(ctypes.Structure):
+        _fields_ = [("nLength", wintypes.DWORD), ("lpSecurityDescriptor", wintypes.LPVOID),
+                    ("bInheritHandle", wintypes.BOOL)]
+
+    class _UserPipeListener(PipeListener):
+        """
+        只允许当前用户（及SYSTEM）连接的命名管道；multiprocessing默认的安全描述符允许Everyone读取
+        OW为对象所有者即创建管道的用户，同时拒绝远程客户端
+        """
+        SDDL = "D:P(A;;GA;;;OW)(A;;GA;;;SY)"
+        PIPE_REJECT_REMOTE_CLIENTS = 0x8
+
+        def _new_handle(self, first=False):
+            kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+            advapi32 = ctypes.WinDLL("advapi32", use_last_error=True)
+            kernel32.CreateNamedPipeW.restype = wintypes.HANDLE
+            descriptor = wintypes.LPVOID()
+            if not advapi32.ConvertStringSecurityDescriptorToSecurityDescriptorW(
+                    self.SDDL, 1, ctypes.byref(descriptor), None):
+                raise ctypes.WinError(ctypes.get_last_error())
+            try:
+                attrs = _SecurityAttributes(ctypes.sizeof(_SecurityAttributes), descriptor, False)
+                flags = _winapi.PIPE_ACCESS_DUPLEX | _winapi.FILE_FLAG_OVERLAPPED
+                if first:
+                    flags |= _winapi.FILE_FLAG_FIRST_PIPE_INSTANCE
+                handle = kernel32.CreateNamedPipeW(
+                    self._address, flags,
+                    _winapi.PIPE_TYPE_MESSAGE | _winapi.PIPE_READMODE_MESSAGE | _winapi.PIPE_WAIT |
+                    self.PIPE_REJECT_REMOTE_CLIENTS,
+                    _winapi.PIPE_UNLIMITED_INSTANCES, BUFSIZE, BUFSIZE, _winapi.NMPWAIT_WAIT_FOREVER,
+                    ctypes.byref(attrs))
+                if handle is None or handle == wintypes.HANDLE(-1).value:
+                    raise ctypes.WinError(ctypes.get_last_error())
+                return handle
+            finally:
+                kernel32.LocalFree(descriptor)
+
+
+def _listen(address, authkey):
+    if sys.platform != "win32":
+        return Listener(address, authkey=authkey)
+    # Listener没有提供设置管道安全属性的参数，换入自定义的PipeListener
+    listener = Listener.__new__(Listener)
+    listener._listener = _UserPipeListener(address)
+    listener._authkey = authkey
+    return listener
+
+
+class _ModelWorker:
+    """服务端的单个模型：权重、追踪会话和请求队列"""
+    def __init__(self, weight_path, task=None):
+        self.weight_path = weight_path
+        self.task = task
+        self.model = None
+        self.sessions = {}  # 会话id -> 共享权重的模型副本（独立的predictor与追踪器）
+        self.queue = queue.Queue()
+        self.latency = FPSMeter()  # 推理耗时
+        self.wait = FPSMeter()     # 排队耗时
+        self.requests = 0
+        self.errors = 0
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, op, frames=None, kwargs=None, session=None):
+        future = concurrent.futures.Future()
+        self.queue.put((time.perf_counter(), op, frames, kwargs or {}, session, future))
+        return future
+
+    def _load(self):
+        from ultralytics import YOLO
+        return YOLO(self.weight_path, task=self.task) if self.task else YOLO(self.weight_path)
+
+    def _session_model(self, session):
+        model = self.sessions.get(session)
+        if model is None:
+            # 浅拷贝共享网络权重，predictor和回调各自独立，追踪器状态互不干扰
+            model = copy.copy(self.model)
+            model.predictor = None
+            model.callbacks = {k: list(v) for k, v in self.model.callbacks.items()}
+            self.sessions[session] = model
+        return model
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            t_submit, op, frames, kwargs, session, future = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                if self.model is None:
+                    self.model = self._load()
+                t0 = time.perf_counter()
+                self.wait.update(t0 - t_submit)
+                if op == "load":
+                    result = None
+                elif op == "release":
+                    self.sessions.pop(session, None)
+                    result = None
+                elif op == "get_state":
+                    result = tracker_state(self._session_model(session))
+                elif op == "set_state":
+                    restore_tracker(self._session_model(session), kwargs.get("state"))
+                    result = None
+                else:
+                    if op == "track":
+                        results = self._session_model(session).track(frames, device=get_device(), verbose=False, **kwargs)
+                    else:
+                        results = self.model.predict(frames, device=get_device(), verbose=False, **kwargs)
+                    self.latency.update(time.perf_counter() - t0, len(frames) if isinstance(frames, (list, tuple)) else 1)
+                    self.requests += 1
+                    result = [InferenceResult.from_ultralytics(r) for r in results]
+                future.set_result(result)
+            except Exception as e:
+                self.errors += 1
+                future.set_exception(e)
+
+    def stats(self):
+        return {
+            "weight": self.weight_path,
+            "task": self.task,
+            "loaded": self.model is not None,
+            "queue": self.queue.qsize(),
+            "latency_ms": self.latency.latency * 1000,
+            "wait_ms": self.wait.latency * 1000,
+            "frames": self.latency.frames,
+            "requests": self.requests,
+            "errors": self.errors,
+            "sessions": len(self.sessions),
+        }
+
+    def close(self):
+        self.queue.put(None)
+
+
+class ModelServer:
+    """
+    接收请求 {"op", "weight", "task", "frames", "kwargs", "session"}，回复 ("ok", 结果) 或 ("error", 信息)
+    op: predict / track / load / release / get_state / set_state / stats / shutdown
+    """
+    def __init__(self, address=None, authkey=None):
+        self.address = address or default_address()
+        authkey = authkey or load_authkey()
+        if sys.platform != "win32" and os.path.exists(self.address):
+            try:
+                Client(self.address, authkey=authkey).close()
+                raise RuntimeError(f"模型服务已在运行: {self.address}")
+            except (ConnectionError, OSError):
+                os.unlink(self.address)  # 上次异常退出留下的套接字文件
+        self.listener = _listen(self.address, authkey)
+        self.workers = {}
+        self._lock = threading.Lock()
+        self._running = True
+
+    def worker(self, weight_path, task=None):
+        key = (os.path.abspath(weight_path) if os.path.exists(weight_path) else weight_path, task)
+        with self._lock:
+            worker = self.workers.get(key)
+            if worker is None:
+                worker = self.workers[key] = _ModelWorker(weight_path, task)
+            return worker
+
+    def stats(self):
+        with self._lock:
+            return [w.stats() for w in self.workers.values()]
+
+    def handle(self, conn):
+        sessions = set()
+        try:
+            while True:
+                try:
+                    request = conn.recv()
+                except (EOFError, OSError):
+                    break
+                op = request.get("op")
+                try:
+                    if op == "stats":
+                        reply = ("ok", self.stats())
+                    elif op == "shutdown":
+                        conn.send(("ok", None))
+                        self.shutdown()
+                        break
+                    else:
+                        worker = self.worker(request["weight"], request.get("task"))
+                        session = request.get("session")
+                        if op in ("track", "set_state"):
+                            sessions.add((worker, session))
+                        elif op == "release":
+                            sessions.discard((worker, session))
+                        future = worker.submit(op, request.get("frames"), request.get("kwargs"), session)
+                        reply = ("ok", future.result())
+                except Exception as e:
+                    reply = ("error", f"{type(e).__name__}: {e}")
+                conn.send(reply)
+        finally:
+            # 客户端断开时释放其追踪会话
+            for worker, session in sessions:
+                worker.submit("release", session=session)
+            conn.close()
+
+    def serve_forever(self):
+        print(f"模型服务已启动: {self.address}")
+        while self._running:
+            try:
+                conn = self.listener.accept()
+            except (OSError, EOFError):
+                if not self._running:
+                    break
+                continue
+            except Exception as e:
+                # 认证失败等单个连接的错误不影响服务
+                print(f"拒绝连接: {e}")
+                continue
+            threading.Thread(target=self.handle, args=(conn,), daemon=True).start()
+
+    def shutdown(self):
+        self._running = False
+        with self._lock:
+            for worker in self.workers.values():
+                worker.close()
+        self.listener.close()
+
+
+class ModelClient:
+    """模型服务的一条客户端连接，可在多个线程间共享（请求在连接上按顺序发送）"""
+    def __init__(self, address=None, authkey=None):
+        self.address = address or default_address()
+        self.conn = Client(self.address, authkey=authkey or load_authkey())
+        self._lock = threading.Lock()
+
+    def call(self, **request):
+        with self._lock:
+            self.conn.send(request)
+            status, payload = self.conn.recv()
+        if status != "ok":
+            raise RuntimeError(f"模型服务错误: {payload}")
+        return payload
+
+    def stats(self):
+        return self.call(op="stats")
+
+    def shutdown(self):
+        return self.call(op="shutdown")
+
+    def close(self):
+        self.conn.close()
+
+
+class RemoteModel:
+    """
+    服务进程中某个权重的代理；predict/track返回InferenceResult列表
+    client: 该代理独占的连接（由connect创建）
+    连接断开（服务进程崩溃或被关闭）时重连一次并重发请求，重连失败则改为进程内的LocalModel；
+    服务端的追踪器状态随旧进程丢失，重连后追踪从头开始，已保存的断点仍可用于续跑
+    """
+    _session_ids = itertools.count()
+
+    def __init__(self, client, weight_path, task=None):
+        self.client = client
+        self.weight_path = weight_path
+        self.task = task
+        self.session = None
+        self.local = None  # 服务不可用后的进程内替代
+        self.reconnects = 0  # 连接断开的次数，每次断开后服务端的追踪器状态都从头开始
+        self._lock = threading.Lock()
+        self.reset()
+
+    def _call(self, op, frames=None, **kwargs):
+        request = dict(op=op, weight=self.weight_path, task=self.task, frames=frames, kwargs=kwargs,
+                       session=self.session)
+        client = self.client
+        if self.local is None:
+            try:
+                return client.call(**request)
+            except (EOFError, OSError) as e:
+                print(f"模型服务连接断开: {e}")
+                with self._lock:
+                    if self.client is client and self.local is None:  # 其他线程可能已经重连
+                        self._reconnect()
+            if op == "release":
+                return None  # 旧连接上的会话已随服务进程释放
+            if self.local is None:
+                return self.client.call(**request)
+        return self._local_call(op, frames, kwargs)
+
+    def _reconnect(self):
+        self.reconnects += 1
+        self.client.close()
+        client = connect(self.client.address)
+        if client is not None:
+            self.client = client
+        else:
+            print("模型服务不可用，改为进程内加载")
+            self.local = LocalModel(self.weight_path, self.task)
+
+    def _local_call(self, op, frames, kwargs):
+        if op in ("predict", "track"):
+            return getattr(self.local, op)(frames, **kwargs)
+        if op == "release":
+            self.local.reset()
+        elif op == "get_state":
+            return self.local.tracker_state()
+        elif op == "set_state":
+            self.local.restore_tracker(kwargs.get("state"))
+        return None
+
+    def load(self):
+        """确保服务端已加载该模型"""
+        self._call("load")
+        return self
+
+    def predict(self, frames, **kwargs):
+        return self._call("predict", frames, **kwargs)
+
+    def track(self, frames, **kwargs):
+        return self._call("track", frames, **kwargs)
+
+    def reset(self):
+        """开始新的追踪会话，旧会话的追踪器状态在服务端释放"""
+        if self.session is not None:
+            self._call("release")
+        self.session = f"{os.getpid()}-{id(self)}-{next(self._session_ids)}"
+
+    def tracker_state(self):
+        """当前会话追踪器状态的bytes，用于断点保存"""
+        return self._call("get_state")
+
+    def restore_tracker(self, state):
+        self._call("set_state", state=state)
+
+
+class LocalModel:
+    """模型服务不可用时的进程内实现，接口与RemoteModel一致；权重由进程级模型缓存加载"""
+    def __init__(self, weight_path, task=None):
+        self.weight_path = weight_path
+        self.task = task
+        self.base = get_model(weight_path, task)
+        self.model = None
+        self.reset()
+
+    def load(self):
+        return self
+
+    def predict(self, frames, **kwargs):
+        results = self.base.predict(frames, device=get_device(), verbose=False, **kwargs)
+        return [InferenceResult.from_ultralytics(r) for r in results]
+
+    def track(self, frames, **kwargs):
+        results = self.model.track(frames, device=get_device(), verbose=False, **kwargs)
+        return [InferenceResult.from_ultralytics(r) for r in results]
+
+    def reset(self):
+        self.model = copy.copy(self.base)
+        self.model.predictor = None
+        self.model.callbacks = {k: list(v) for k, v in self.base.callbacks.items()}
+
+    def tracker_state(self):
+        return tracker_state(self.model)
+
+    def restore_tracker(self, state):
+        restore_tracker(self.model, state)
+
+
+_start_lock = threading.Lock()
+
+
+def connect(address=None, autostart=True, timeout=20.0):
+    """新建一条到模型服务的连接；服务未运行且autostart时在后台启动服务进程，失败返回None"""
+    if os.getenv("VRP_MODEL_SERVER", "1") == "0":
+        return None
+    # 多个窗口同时连接时只启动一个服务进程
+    with _start_lock:
+        try:
+            return ModelClient(address)
+        except AuthenticationError:
+            return None  # 地址被其他用户或旧版本的服务占用
+        except RuntimeError as e:
+            print(f"模型服务不可用，改为进程内加载: {e}")
+            return None
+        except (ConnectionError, OSError):
+            if not autostart:
+                return None
+        cmd = [sys.executable, os.path.abspath(__file__)] + (["--address", address] if address else [])
+        if sys.platform == "win32":
+            subprocess.Popen(cmd, creationflags=subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP)
+        else:
+            subprocess.Popen(cmd, start_new_session=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            time.sleep(0.2)
+            try:
+                return ModelClient(address)
+            except (ConnectionError, OSError):
+                pass
+        return None
+
+
+def shared_model(weight_path, task=None):
+    """优先使用模型服务中的共享模型（每次调用一条独立连接），服务不可用时退回进程内缓存的模型"""
+    client = connect()
+    if client is not None:
+        return RemoteModel(client, weight_path, task)
+    return LocalModel(weight_path, task)
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="本地模型服务")
+    parser.add_argument("--address", default=None)
+    parser.add_argument("--stats", action="store_true", help="打印运行中服务的各模型队列深度与延迟")
+    parser.add_argument("--shutdown", action="store_true", help="关闭运行中的服务")
+    args = parser.parse_args()
+    if args.stats or args.shutdown:
+        client = ModelClient(args.address)
+        if args.shutdown:
+            client.shutdown()
+        else:
+            for s in client.stats():
+                print(f"{s['weight']} [{s['task'] or 'auto'}] 已加载={s['loaded']} 队列={s['queue']} "
+                      f"推理={s['latency_ms']:.1f}ms 排队={s['wait_ms']:.1f}ms 帧数={s['frames']} "
+                      f"请求={s['requests']} 错误={s['errors']} 追踪会话={s['sessions']}")
+        client.close()
+    else:
+        ModelServer(args.address).serve_forever()
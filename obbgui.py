@@ -12,19 +12,17 @@ from PyQt5.QtCore import Qt, QTimer, pyqtSignal
 from PyQt5.QtGui import QPixmap, QImage, QFont
 
 # Ultralytics YOLO OBB
-from ultralytics import YOLO
-
-def cvimg2qt(img):
-    rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-    h, w, ch = rgb.shape
-    bytes_per_line = ch * w
-    return QPixmap.fromImage(QImage(rgb.data, w, h, bytes_per_line, QImage.Format_RGB888))
+from backend import get_device, FPSMeter
+from pipeline import FramePipeline
+from display import show_frame
+from model_registry import LazyModel
 
 class OBBWindow(QMainWindow):
     # 新增信号
     result_img_signal = pyqtSignal(object)
     info_signal = pyqtSignal(str)
     input_img_signal = pyqtSignal(object)
+    log_signal = pyqtSignal(str)
 
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -37,7 +35,9 @@ class OBBWindow(QMainWindow):
         self.input_path = None
         self.input_img = None
         self.running = False
-        self.save_video_frames = []
+        self.pipeline = None  # 视频/摄像头检测流水线
+        self.device = get_device()
+        self.fps_meter = FPSMeter()
         self.init_ui()
         self.init_statusbar()
         self.init_timer()
@@ -45,6 +45,7 @@ class OBBWindow(QMainWindow):
         self.result_img_signal.connect(self.show_result_img)
         self.info_signal.connect(self.show_info)
         self.input_img_signal.connect(self.show_input_img)
+        self.log_signal.connect(self.log)
 
     def init_ui(self):
         main_widget = QWidget()
@@ -137,6 +138,8 @@ class OBBWindow(QMainWindow):
         self.setStatusBar(self.status)
         self.status_time = QLabel("检测时间: 0 ms")
         self.status.addWidget(self.status_time)
+        self.status_fps = QLabel(f"设备: {self.device}  FPS: 0.0")
+        self.status.addWidget(self.status_fps)
 
     def init_timer(self):
         self.timer = QTimer(self)
@@ -144,7 +147,7 @@ class OBBWindow(QMainWindow):
         self.timer.start(1000)
 
     def update_status(self):
-        pass
+        self.status_fps.setText(f"设备: {self.device}  FPS: {self.fps_meter.fps:.1f}")
 
     def log(self, msg):
         now = time.strftime("[%H:%M:%S] ")
@@ -160,7 +163,7 @@ class OBBWindow(QMainWindow):
                 self.input_path = path
                 img = cv2.imread(path)
                 self.input_img = img
-                self.input_label.setPixmap(cvimg2qt(img).scaled(self.input_label.size(), Qt.KeepAspectRatio))
+                show_frame(self.input_label, img)
                 self.log(f"已选择图片: {path}")
         elif self.input_type == "视频":
             path, _ = QFileDialog.getOpenFileName(self, "选择视频", "", "Videos (*.mp4 *.avi *.mov)")
@@ -170,7 +173,7 @@ class OBBWindow(QMainWindow):
                 ret, img = cap.read()
                 if ret:
                     self.input_img = img
-                    self.input_label.setPixmap(cvimg2qt(img).scaled(self.input_label.size(), Qt.KeepAspectRatio))
+                    show_frame(self.input_label, img)
                 cap.release()
                 self.log(f"已选择视频: {path}")
         elif self.input_type == "摄像头":
@@ -181,7 +184,7 @@ class OBBWindow(QMainWindow):
             ret, img = cap.read()
             if ret:
                 self.input_img = img
-                self.input_label.setPixmap(cvimg2qt(img).scaled(self.input_label.size(), Qt.KeepAspectRatio))
+                show_frame(self.input_label, img)
                 self.input_path = 0
                 self.log("已打开摄像头")
             cap.release()
@@ -192,19 +195,20 @@ class OBBWindow(QMainWindow):
         self.result_label.clear()
         self.info_text.clear()
         self.input_path = None
-        self.save_video_frames = []
 
     def select_weight(self):
         path, _ = QFileDialog.getOpenFileName(self, "选择OBB权重文件", "", "PyTorch Weights (*.pt *.pth)")
         if path:
             self.weight_path = path
             self.weight_label.setText(os.path.basename(path))
-            try:
-                self.model = YOLO(path, task="obb")
-                self.log("OBB模型加载成功")
-            except Exception as e:
-                self.show_error(f"模型加载失败: {e}")
-                self.model = None
+            # 权重在后台加载预热，界面不等待；检测线程首次推理时等待加载完成
+            self.model = LazyModel(path, task="obb")
+            self.log("OBB模型加载中...")
+            self.model.future.add_done_callback(self.on_model_loaded)
+
+    def on_model_loaded(self, future):
+        error = future.exception()
+        self.log_signal.emit("OBB模型加载成功" if error is None else f"[错误] 模型加载失败: {error}")
 
     def start_infer(self):
         if self.model is None:
@@ -213,15 +217,18 @@ class OBBWindow(QMainWindow):
         if self.input_path is None:
             self.show_error("请先上传输入数据")
             return
+        if self.pipeline is not None:
+            self.pipeline.stop()
         self.running = True
         self.info_text.clear()
         self.result_label.clear()
-        self.save_video_frames = []
         import threading
         threading.Thread(target=self.infer_thread, daemon=True).start()
 
     def stop_infer(self):
         self.running = False
+        if self.pipeline is not None:
+            self.pipeline.stop()
         self.log("停止检测")
 
     def infer_thread(self):
@@ -234,37 +241,32 @@ class OBBWindow(QMainWindow):
                 result_img, info = self.run_obb(img)
                 self.result_img_signal.emit(result_img)
                 self.info_signal.emit(info)
-            elif self.input_type == "视频":
-                cap = cv2.VideoCapture(self.input_path)
-                self.save_video_frames = []
-                while self.running and cap.isOpened():
-                    ret, img = cap.read()
-                    if not ret:
-                        break
-                    self.input_img_signal.emit(img)
-                    result_img, info = self.run_obb(img)
-                    self.result_img_signal.emit(result_img)
-                    self.info_signal.emit(info)
-                    self.save_video_frames.append(result_img.copy())
-                    cv2.waitKey(1)
-                cap.release()
-            elif self.input_type == "摄像头":
-                cap = cv2.VideoCapture(0)
-                if not cap.isOpened():
-                    self.show_error("摄像头无法打开，请检查设备。")
-                    return
-                self.save_video_frames = []
-                while self.running and cap.isOpened():
-                    ret, img = cap.read()
-                    if not ret:
-                        break
+            elif self.input_type in ["视频", "摄像头"]:
+                # 解码、推理、渲染三段流水线：视频严格按帧序，摄像头只保留最新帧
+                live = self.input_type == "摄像头"
+                source = self.input_path
+                if live:
+                    source = cv2.VideoCapture(0)
+                    if not source.isOpened():
+                        self.show_error("摄像头无法打开，请检查设备。")
+                        return
+
+                # 推理线程只跑模型，绘制放到渲染线程与下一帧推理重叠
+                def render(idx, img, results):
+                    result_img, info = self.draw_obb(results)
                     self.input_img_signal.emit(img)
-                    result_img, info = self.run_obb(img)
                     self.result_img_signal.emit(result_img)
                     self.info_signal.emit(info)
-                    self.save_video_frames.append(result_img.copy())
-                    cv2.waitKey(1)
-                cap.release()
+
+                self.pipeline = FramePipeline(
+                    source,
+                    render,
+                    infer_fn=self.predict_obb,
+                    live=live,
+                    on_error=lambda e: self.info_signal.emit(f"[错误] 检测异常: {e}"),
+                )
+                self.pipeline.start()
+                self.pipeline.wait()
             t1 = time.time()
             infer_time = int((t1 - t0) * 1000)
             self.status_time.setText(f"检测时间: {infer_time} ms")
@@ -273,8 +275,15 @@ class OBBWindow(QMainWindow):
             self.show_error(f"检测异常: {e}\n{traceback.format_exc()}")
 
     def run_obb(self, img):
-        # OBB推理，强制用CUDA
-        results = self.model(img, device='cuda')
+        return self.draw_obb(self.predict_obb(img))
+
+    def predict_obb(self, img):
+        # OBB推理，设备由backend统一选择（无CUDA时自动回退CPU）
+        model = self.model.get()  # 首次调用时等待后台加载完成，不计入推理耗时
+        with self.fps_meter:
+            return model(img, device=self.device)
+
+    def draw_obb(self, results):
         result_img = results[0].plot()
         result_img = cv2.cvtColor(result_img, cv2.COLOR_RGB2BGR)
         info = self.get_obb_info(results)
@@ -292,13 +301,13 @@ class OBBWindow(QMainWindow):
         # 保证输入流显示BGR->RGB一致
         if img is not None:
             img_bgr = img if img.shape[2] == 3 else cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
-            self.input_label.setPixmap(cvimg2qt(img_bgr).scaled(self.input_label.size(), Qt.KeepAspectRatio))
+            show_frame(self.input_label, img_bgr)
 
     def show_result_img(self, img):
         # 保证输出流显示BGR->RGB一致
         if img is not None:
             img_bgr = img if img.shape[2] == 3 else cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
-            self.result_label.setPixmap(cvimg2qt(img_bgr).scaled(self.result_label.size(), Qt.KeepAspectRatio))
+            show_frame(self.result_label, img_bgr)
 
     def show_info(self, info):
         self.info_text.setPlainText(info)
@@ -308,7 +317,6 @@ class OBBWindow(QMainWindow):
         self.result_label.clear()
         self.info_text.clear()
         self.input_path = None
-        self.save_video_frames = []
         self.model = None
         self.weight_path = None
         self.input_type = "图片"
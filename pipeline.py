@@ -0,0 +1,234 @@
+import queue
+import threading
+import time
+import cv2
+from backend import FPSMeter
+
+# 采集 -> 推理 -> 渲染 三段式流水线
+# 解码、推理、绘制分别在独立线程中运行，通过有界队列衔接，使解码和绘制的耗时与模型推理重叠
+
+_END = object()  # 结束标记
+
+
+class FramePipeline:
+    """
+    source: 视频路径、摄像头编号或已打开的cv2.VideoCapture
+    render_fn(idx, frame, result): 在渲染线程中调用，负责绘制、保存与发射Qt信号
+    infer_fn(frame) -> result: 单帧推理函数
+    infer_batch_fn(frames) -> [result, ...]: 批量推理函数（与infer_fn二选一），配合batch_sizer使用
+    live: True为摄像头模式，队列满时丢弃旧帧只保留最新帧；False为文件模式，严格按帧序处理且不丢帧
+    workers: 推理线程数，模型不支持并发调用时保持为1
+    start_frame: 文件模式下从第几帧开始（断点续跑时定位），帧号从该值开始计数
+    """
+    def __init__(self, source, render_fn, infer_fn=None, infer_batch_fn=None, live=False,
+                 workers=1, queue_size=4, batch_sizer=None, on_finished=None, on_error=None, start_frame=0):
+        if infer_fn is None and infer_batch_fn is None:
+            raise ValueError("infer_fn和infer_batch_fn至少需要提供一个")
+        self.source = source
+        self.render_fn = render_fn
+        self.infer_fn = infer_fn
+        self.infer_batch_fn = infer_batch_fn
+        self.live = live
+        self.workers = max(1, workers)
+        self.batch_sizer = batch_sizer
+        self.on_finished = on_finished
+        self.on_error = on_error
+        self.start_frame = start_frame
+        self.in_queue = queue.Queue(maxsize=queue_size)
+        self.out_queue = queue.Queue(maxsize=queue_size)
+        self.fps_meter = FPSMeter()
+        self.paused = False
+        self.dropped = 0
+        self.frames_rendered = 0
+        self._stop = threading.Event()
+        self._done = threading.Event()
+        self._threads = []
+
+    # ---------------- 控制接口 ----------------
+    def start(self):
+        self._threads = [threading.Thread(target=self._decode_loop, daemon=True)]
+        for _ in range(self.workers):
+            self._threads.append(threading.Thread(target=self._infer_loop, daemon=True))
+        self._threads.append(threading.Thread(target=self._render_loop, daemon=True))
+        for t in self._threads:
+            t.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def wait(self, timeout=None):
+        """阻塞等待流水线结束，返回是否已结束"""
+        return self._done.wait(timeout)
+
+    @property
+    def running(self):
+        return bool(self._threads) and not self._done.is_set()
+
+    def queue_depth(self):
+        return self.in_queue.qsize(), self.out_queue.qsize()
+
+    # ---------------- 队列工具 ----------------
+    def _put(self, q, item):
+        """阻塞放入队列，期间响应stop；返回是否放入成功"""
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _put_latest(self, q, item):
+        """队列满时丢弃最旧的帧，只保留最新帧"""
+        while True:
+            try:
+                q.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    q.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def _get(self, q):
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _END
+
+    def _fail(self, e):
+        self._stop.set()
+        if self.on_error is not None:
+            self.on_error(e)
+
+    # ---------------- 各阶段线程 ----------------
+    def _decode_loop(self):
+        cap = self.source if isinstance(self.source, cv2.VideoCapture) else cv2.VideoCapture(self.source)
+        idx = self.start_frame
+        try:
+            if idx:
+                cap = self._seek(cap, idx)
+            while not self._stop.is_set() and cap.isOpened():
+                if self.paused:
+                    time.sleep(0.05)
+                    continue
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                if self.live:
+                    self._put_latest(self.in_queue, (idx, frame))
+                elif not self._put(self.in_queue, (idx, frame)):
+                    break
+                idx += 1
+        except Exception as e:
+            self._fail(e)
+        finally:
+            cap.release()
+            for _ in range(self.workers):
+                self._put(self.in_queue, _END)
+
+    def _seek(self, cap, idx):
+        """
+        定位到第idx帧并核对实际位置；部分编码格式只能按关键帧定位，位置不符时从头逐帧grab到idx
+        无法到达idx（视频比断点记录的短）时抛出异常，不会从错误的帧继续
+        """
+        cap.set(cv2.CAP_PROP_POS_FRAMES, idx)
+        if int(cap.get(cv2.CAP_PROP_POS_FRAMES)) == idx:
+            return cap
+        if isinstance(self.source, cv2.VideoCapture):
+            cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            if int(cap.get(cv2.CAP_PROP_POS_FRAMES)) != 0:
+                raise RuntimeError(f"视频无法定位到第{idx}帧")
+        else:
+            cap.release()
+            cap = cv2.VideoCapture(self.source)
+        for i in range(idx):
+            if self._stop.is_set():
+                break
+            if not cap.grab():
+                cap.release()
+                raise RuntimeError(f"视频无法定位到第{idx}帧（只有{i}帧）")
+        return cap
+
+    def _next_batch(self):
+        first = self._get(self.in_queue)
+        if first is _END:
+            return [], True
+        batch = [first]
+        size = self.batch_sizer.size if self.batch_sizer is not None else 1
+        while len(batch) < size:
+            try:
+                item = self.in_queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _END:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _infer_loop(self):
+        try:
+            while not self._stop.is_set():
+                batch, ended = self._next_batch()
+                if batch:
+                    frames = [frame for _, frame in batch]
+                    t0 = time.perf_counter()
+                    if self.infer_batch_fn is not None:
+                        results = self.infer_batch_fn(frames)
+                    else:
+                        results = [self.infer_fn(frame) for frame in frames]
+                    if self.batch_sizer is not None:
+                        self.batch_sizer.update(time.perf_counter() - t0, len(frames))
+                    for (idx, frame), result in zip(batch, results):
+                        if not self._put(self.out_queue, (idx, frame, result)):
+                            return
+                if ended:
+                    break
+        except Exception as e:
+            self._fail(e)
+        finally:
+            self._put(self.out_queue, _END)
+
+    def _render_loop(self):
+        ended_workers = 0
+        next_idx = self.start_frame
+        pending = {}  # 文件模式下多推理线程的乱序结果，按帧号重排
+        last_t = None
+        try:
+            while ended_workers < self.workers and not self._stop.is_set():
+                item = self._get(self.out_queue)
+                if item is _END:
+                    ended_workers += 1
+                    continue
+                idx, frame, result = item
+                if self.live:
+                    # 实时模式只渲染比上一帧更新的结果
+                    if idx < next_idx:
+                        continue
+                    ready = [(idx, frame, result)]
+                    next_idx = idx + 1
+                else:
+                    pending[idx] = (frame, result)
+                    ready = []
+                    while next_idx in pending:
+                        frame, result = pending.pop(next_idx)
+                        ready.append((next_idx, frame, result))
+                        next_idx += 1
+                for idx, frame, result in ready:
+                    self.render_fn(idx, frame, result)
+                    self.frames_rendered += 1
+                    now = time.perf_counter()
+                    if last_t is not None:
+                        self.fps_meter.update(now - last_t)
+                    last_t = now
+        except Exception as e:
+            self._fail(e)
+        finally:
+            self._stop.set()
+            self._done.set()
+            if self.on_finished is not None:
+                self.on_finished()
@@ -1,28 +1,65 @@
+import time
 import cv2
-from ultralytics import YOLO
+import numpy as np
+from backend import get_device, InputBuffer, FPSMeter
+from results import InferenceResult
+from renderer import OverlayRenderer
+from model_registry import LazyModel
 
 class PoseEstimator:
     def __init__(self, weight_path):
-        self.model = YOLO(weight_path)
+        # 同一权重在进程内只加载一次，首次加载时预热，切换回来无需重新加载
+        # 加载和预热在后台进行，构造立即返回（可在界面线程选择权重时创建），首次推理时等待加载完成
+        self._model = LazyModel(weight_path)
+        self.loaded = self._model.future
+        self.device = get_device()
+        self.input_buffer = InputBuffer()
+        self.fps_meter = FPSMeter()
+        self.renderer = OverlayRenderer()
+
+    @property
+    def model(self):
+        """本实例独立的Ultralytics模型（共享缓存中的网络权重）"""
+        return self._model.get()
 
     def infer(self, image_bgr):
         """
         输入: image_bgr (OpenCV BGR格式)
-        输出: result_img (带关键点的BGR图像), results (原始推理结果)
-        """
-        image_rgb = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2RGB)
-        results = self.model(image_rgb, task="pose", device='cuda')
-        # result_img = results[0].plot()  # 带关键点的BGR图像（实际为RGB格式）
-        result_img = results[0].plot()
-        # plot输出为RGB格式，需转回BGR
-        if result_img.shape[2] == 3:
-            result_img = cv2.cvtColor(result_img, cv2.COLOR_RGB2BGR)
-        keypoints_info = []
-        for i, kp in enumerate(results[0].keypoints.xy):
-            # kp: [num_keypoints, 2]
-            for j, (x, y) in enumerate(kp):
-                keypoints_info.append((int(x), int(y)))
-        return result_img, keypoints_info, results
+        输出: result_img (带关键点的BGR图像), keypoints_info (所有人关键点展平为Kx2 int32), results (原始推理结果)
+        """
+        return self.infer_batch([image_bgr])[0]
+
+    def predict(self, image_bgr):
+        """
+        输入: image_bgr (OpenCV BGR格式)
+        输出: InferenceResult (keypoints为NxKx3数组: x, y, 置信度)
+        """
+        return self.predict_batch([image_bgr])[0]
+
+    def predict_batch(self, frames):
+        """
+        输入: frames (BGR图像列表)，所有帧合并为一次前向推理
+        输出: 每帧一个InferenceResult
+        """
+        self.input_buffer.resize(len(frames))
+        batch_rgb = [self.input_buffer.to_rgb(img) for img in frames]
+        model = self.model  # 首次调用时等待后台加载完成，不计入推理耗时
+        t0 = time.perf_counter()
+        batch_results = model(batch_rgb, task="pose", device=self.device)
+        self.fps_meter.update(time.perf_counter() - t0, len(frames))
+        return [InferenceResult.from_ultralytics(r) for r in batch_results]
+
+    def infer_batch(self, frames):
+        """
+        输入: frames (BGR图像列表)
+        输出: 每帧一个 (result_img, keypoints_info, results) 元组，与infer一致
+        """
+        dets = self.predict_batch(frames)
+        return [(self.render(frame, det), det.keypoints_info(), [det.raw]) for frame, det in zip(frames, dets)]
+
+    def render(self, frame, det):
+        """在原始BGR帧上绘制关键点结果，返回BGR图像"""
+        return self.renderer.draw(frame, det)
 
 if __name__ == "__main__":
     estimator = PoseEstimator("yolov8n-pose.pt")
@@ -35,7 +72,7 @@ if __name__ == "__main__":
             break
         result_img, keypoints_info, results = estimator.infer(img)
         # 在画面上渲染关键点坐标
-        for idx, (x, y) in enumerate(keypoints_info):
+        for idx, (x, y) in enumerate(keypoints_info.tolist()):
             cv2.circle(result_img, (x, y), 4, (0, 255, 0), -1)
             cv2.putText(result_img, f"{idx}:({x},{y})", (x+5, y-5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0,255,0), 1, cv2.LINE_AA)
         cv2.imshow("estimator", result_img)
@@ -0,0 +1,243 @@
+from collections import OrderedDict
+import cv2
+import numpy as np
+
+# 统一的结果叠加渲染：直接在BGR帧上一次性绘制检测框、分割mask、关键点和标签
+# 取代 results[0].plot() + RGB/BGR 来回转换；类别颜色与标签图块均做缓存
+
+# Ultralytics默认调色板(十六进制RGB)
+_PALETTE_HEX = ("FF3838", "FF9D97", "FF701F", "FFB21D", "CFD231", "48F90A", "92CC17", "3DDB86", "1A9334", "00D4BB",
+                "2C99A8", "00C2FF", "344593", "6473FF", "0018EC", "8438FF", "520085", "CB38FF", "FF95C8", "FF37C7")
+
+# 关键点连线：COCO人体17点、MediaPipe手部21点
+COCO_SKELETON = ((15, 13), (13, 11), (16, 14), (14, 12), (11, 12), (5, 11), (6, 12), (5, 6), (5, 7), (6, 8),
+                 (7, 9), (8, 10), (1, 2), (0, 1), (0, 2), (1, 3), (2, 4), (3, 5), (4, 6))
+HAND_SKELETON = ((0, 1), (1, 2), (2, 3), (3, 4), (0, 5), (5, 6), (6, 7), (7, 8), (5, 9), (9, 10), (10, 11), (11, 12),
+                 (9, 13), (13, 14), (14, 15), (15, 16), (13, 17), (0, 17), (17, 18), (18, 19), (19, 20))
+SKELETONS = {17: np.array(COCO_SKELETON), 21: np.array(HAND_SKELETON)}
+
+
+class OverlayRenderer:
+    """
+    enabled: 为False时draw直接返回原帧，不做任何绘制
+    visible_fn: 可选的可见性回调，返回False（窗口被遮挡/最小化且无需录制）时同样跳过绘制
+    kpt_conf: 关键点置信度阈值；keypoints第三列不是置信度时(MediaPipe)设为None
+    """
+    def __init__(self, line_width=None, font_scale=0.5, mask_alpha=0.5, kpt_conf=0.5, kpt_radius=None,
+                 glyph_cache_size=1024):
+        self.line_width = line_width
+        self.font_scale = font_scale
+        self.mask_alpha = mask_alpha
+        self.kpt_conf = kpt_conf
+        self.kpt_radius = kpt_radius
+        self.enabled = True
+        self.visible_fn = None
+        self._palette = [tuple(int(h[i:i + 2], 16) for i in (4, 2, 0)) for h in _PALETTE_HEX]  # 转为BGR
+        self._glyphs = OrderedDict()
+        self._glyph_cache_size = glyph_cache_size
+        self._overlay = None
+        self._disks = {}
+
+    @property
+    def active(self):
+        return self.enabled and (self.visible_fn is None or self.visible_fn())
+
+    def color(self, cls_id):
+        return self._palette[int(cls_id) % len(self._palette)]
+
+    def draw(self, frame, det, copy=True, labels=True):
+        """在BGR帧上绘制InferenceResult，返回绘制后的BGR图像；copy=False时原地绘制"""
+        if not self.active:
+            return frame
+        img = frame.copy() if copy else frame
+        lw = self.line_width or max(round(sum(img.shape[:2]) / 2 * 0.003), 2)
+        if det.num_polygons:
+            self.draw_masks(img, det)
+        for box, cls_id in zip(det.boxes_info(), det.classes):
+            x1, y1, x2, y2 = box.tolist()
+            cv2.rectangle(img, (x1, y1), (x2, y2), self.color(cls_id), lw, cv2.LINE_AA)
+        if labels and len(det):
+            for i, (x1, y1) in enumerate(det.boxes_info()[:, :2].tolist()):
+                self.draw_label(img, self.label_text(det, i), (x1, y1), self.color(det.classes[i]))
+        if det.keypoints is not None and len(det.keypoints):
+            self.draw_keypoints(img, det.keypoints, lw)
+        return img
+
+    def label_text(self, det, i):
+        cls_id = int(det.classes[i])
+        name = det.names.get(cls_id, str(cls_id))
+        if det.track_ids is not None:
+            name = f"id:{int(det.track_ids[i])} {name}"
+        return f"{name} {det.confs[i]:.2f}"
+
+    # ---------------- 各图元 ----------------
+    def draw_masks(self, img, det):
+        """所有多边形先按类别颜色填充到复用的叠加层，再整体做一次alpha混合"""
+        if self._overlay is None or self._overlay.shape != img.shape:
+            self._overlay = np.empty_like(img)
+        np.copyto(self._overlay, img)
+        polys = [p.reshape(-1, 1, 2) for p in det.seg_info()]
+        classes = det.classes if len(det.classes) == len(polys) else np.zeros(len(polys), np.int32)
+        for cls_id in np.unique(classes):
+            group = [polys[i] for i in np.flatnonzero(classes == cls_id) if len(polys[i])]
+            if group:
+                cv2.fillPoly(self._overlay, group, self.color(cls_id))
+        cv2.addWeighted(self._overlay, self.mask_alpha, img, 1 - self.mask_alpha, 0, dst=img)
+
+    def draw_keypoints(self, img, keypoints, lw):
+        """keypoints: NxKx3；连线用一次polylines调用完成，点用向量化的像素填充"""
+        xy = keypoints[..., :2]
+        if self.kpt_conf is not None:
+            valid = keypoints[..., 2] >= self.kpt_conf
+        else:
+            valid = np.ones(keypoints.shape[:2], bool)
+        valid &= (xy[..., 0] > 0) | (xy[..., 1] > 0)
+        edges = SKELETONS.get(keypoints.shape[1])
+        if edges is not None:
+            segs = xy[:, edges].astype(np.int32)  # N x E x 2 x 2
+            seg_valid = valid[:, edges].all(axis=2)
+            if seg_valid.any():
+                cv2.polylines(img, list(segs[seg_valid]), False, self.color(7), max(lw // 2, 1), cv2.LINE_AA)
+        radius = self.kpt_radius or max(lw, 2)
+        self.draw_points(img, xy[valid], self.color(0), radius)
+
+    def draw_points(self, img, points, color, radius=1):
+        """批量绘制实心圆点：预计算圆盘偏移，一次性写入像素，避免逐点调用cv2.circle"""
+        points = np.asarray(points).reshape(-1, 2)
+        if not len(points):
+            return img
+        disk = self._disks.get(radius)
+        if disk is None:
+            r = np.arange(-radius, radius + 1)
+            dx, dy = np.meshgrid(r, r)
+            inside = dx * dx + dy * dy <= radius * radius
+            disk = self._disks[radius] = np.stack([dx[inside], dy[inside]], axis=1)
+        pts = (np.rint(points).astype(np.int32)[:, None, :] + disk[None]).reshape(-1, 2)
+        h, w = img.shape[:2]
+        keep = (pts[:, 0] >= 0) & (pts[:, 0] < w) & (pts[:, 1] >= 0) & (pts[:, 1] < h)
+        pts = pts[keep]
+        img[pts[:, 1], pts[:, 0]] = color
+        return img
+
+    def draw_label(self, img, text, org, color):
+        """把缓存的标签图块（底色+文字）贴到框的左上角"""
+        glyph = self._glyph(text, color)
+        gh, gw = glyph.shape[:2]
+        h, w = img.shape[:2]
+        x, y = org
+        y = y - gh if y - gh >= 0 else y  # 框上方放不下时放到框内
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + gw, w), min(y + gh, h)
+        if x1 > x0 and y1 > y0:
+            img[y0:y1, x0:x1] = glyph[y0 - y:y1 - y, x0 - x:x1 - x]
+
+    def _glyph(self, text, color):
+        key = (text, color)
+        glyph = self._glyphs.get(key)
+        if glyph is not None:
+            self._glyphs.move_to_end(key)
+            return glyph
+        (tw, th), baseline = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, self.font_scale, 1)
+        glyph = np.empty((th + baseline + 4, tw + 4, 3), np.uint8)
+        glyph[:] = color
+        cv2.putText(glyph, text, (2, th + 2), cv2.FONT_HERSHEY_SIMPLEX, self.font_scale, (255, 255, 255), 1, cv2.LINE_AA)
+        self._glyphs[key] = glyph
+        if len(self._glyphs) > self._glyph_cache_size:
+            self._glyphs.popitem(last=False)
+        return glyph
+
+
+class TrajectoryRenderer(OverlayRenderer):
+    """
+    绘制TrajectorySnapshot：每条轨迹一次cv2.polylines调用，颜色按追踪ID预先转换好
+    暂时丢失的目标（age>0）按 1 - age/(grace+1) 淡出，透明度量化为fade_levels档：
+    同一档的轨迹画在同一张复用的叠加层上，每档只在这些轨迹的合并外接矩形内做一次混合（矩形过大时直接混合整帧）
+    colors: 追踪ID取模索引的BGR颜色列表
+    """
+    FULL_FRAME_RATIO = 0.5  # 合并外接矩形超过整帧面积的该比例时，直接整帧混合
+    BLEND_OVERHEAD = 4096   # 每次混合的固定开销，折算为像素数
+
+    def __init__(self, colors, grace=15, thickness=5, radius=7, box_thickness=2, fade_levels=4):
+        super().__init__()
+        self.colors = [tuple(int(x) for x in c) for c in colors]
+        self.grace = grace
+        self.thickness = thickness
+        self.radius = radius
+        self.box_thickness = box_thickness
+        self.fade_levels = fade_levels
+
+    def track_color(self, tid):
+        return self.colors[int(tid) % len(self.colors)]
+
+    def fade_level(self, age):
+        """丢失age帧的轨迹所在的透明度档位，0档最淡"""
+        alpha = 1.0 - age / (self.grace + 1.0)
+        return min(max(int(alpha * self.fade_levels), 0), self.fade_levels - 1)
+
+    def draw_tracks(self, frame, snapshot, bboxes=(), track_ids=(), copy=True):
+        if not self.active:
+            return frame
+        img = frame.copy() if copy else frame
+        for bbox, tid in zip(bboxes, track_ids):
+            x1, y1, x2, y2 = bbox
+            cv2.rectangle(img, (x1, y1), (x2, y2), self.track_color(tid), self.box_thickness)
+        if not len(snapshot):
+            return img
+        points = snapshot.points.astype(np.int32)
+        counts = snapshot.counts.tolist()
+        ages = snapshot.ages.tolist()
+        faded = [[] for _ in range(self.fade_levels)]
+        current = []
+        for i, n in enumerate(counts):
+            if n:
+                (faded[self.fade_level(ages[i])] if ages[i] else current).append(i)
+        # 先画最淡的一档，当前帧出现的轨迹画在最上方
+        for level, rows in enumerate(faded):
+            if rows:
+                self._draw_faded(img, points, snapshot.counts, snapshot.ids, rows, (level + 0.5) / self.fade_levels)
+        for i in current:
+            self._draw_track(img, points[i, :counts[i]], self.track_color(snapshot.ids[i]))
+        return img
+
+    def _draw_track(self, img, track, color):
+        if len(track) > 1:
+            cv2.polylines(img, [track], False, color, self.thickness)
+        cv2.circle(img, tuple(track[-1].tolist()), self.radius, color, -1)
+
+    def _draw_faded(self, img, points, counts, ids, rows, alpha):
+        """
+        同一档透明度的轨迹一起混合：默认在合并外接矩形内混合一次；
+        轨迹小而分散、各自外接矩形面积之和（加上每次混合的固定开销）小于合并矩形时，逐条在各自的矩形内混合
+        """
+        pad = max(self.thickness, self.radius) + 1
+        h, w = img.shape[:2]
+        rows = np.asarray(rows)
+        pts = points[rows]
+        valid = (np.arange(pts.shape[1]) < counts[rows][:, None])[..., None]
+        lo = np.maximum(np.where(valid, pts, np.iinfo(np.int32).max).min(axis=1) - pad, 0)
+        hi = np.minimum(np.where(valid, pts, -1).max(axis=1) + pad + 1, (w, h))
+        areas = np.clip(hi - lo, 0, None).prod(axis=1)
+        box = lo.min(axis=0).tolist() + hi.max(axis=0).tolist()
+        union = (box[2] - box[0]) * (box[3] - box[1])
+        if union > self.FULL_FRAME_RATIO * w * h:
+            box, union = [0, 0, w, h], w * h
+        if areas.sum() + len(rows) * self.BLEND_OVERHEAD < union:
+            for i, x0, y0, x1, y1 in zip(rows.tolist(), *lo.T.tolist(), *hi.T.tolist()):
+                self._blend(img, points, counts, ids, [i], (x0, y0, x1, y1), alpha)
+        else:
+            self._blend(img, points, counts, ids, rows.tolist(), box, alpha)
+
+    def _blend(self, img, points, counts, ids, rows, box, alpha):
+        x0, y0, x1, y1 = box
+        if x1 <= x0 or y1 <= y0:
+            return
+        h, w = img.shape[:2]
+        if self._overlay is None or self._overlay.shape[0] < h or self._overlay.shape[1] < w:
+            self._overlay = np.empty((h, w, 3), np.uint8)
+        roi = img[y0:y1, x0:x1]
+        overlay = self._overlay[:y1 - y0, :x1 - x0]
+        np.copyto(overlay, roi)
+        offset = np.array([x0, y0], np.int32)
+        for i in rows:
+            self._draw_track(overlay, points[i, :counts[i]] - offset, self.track_color(ids[i]))
+        cv2.addWeighted(overlay, alpha, roi, 1 - alpha, 0, dst=roi)
@@ -0,0 +1,109 @@
+import numpy as np
+
+# 统一的推理结果结构：所有数据以连续NumPy数组存放，避免逐点构造Python元组
+# 各模型封装的predict/predict_batch返回InferenceResult，infer/infer_batch通过兼容视图返回旧格式
+
+
+class InferenceResult:
+    """
+    单帧推理结果
+    boxes: Nx4 float32 (x1, y1, x2, y2)
+    classes: N int32
+    confs: N float32
+    track_ids: N int32，未追踪时为None
+    polygon_points: Px2 float32，所有实例的多边形顶点首尾拼接
+    polygon_offsets: N+1 int64，第i个多边形为 polygon_points[offsets[i]:offsets[i+1]]
+    keypoints: NxKx3 float32，最后一维为 (x, y, score)；MediaPipe模型的第三列为归一化深度z
+    names: 类别id到类别名的字典
+    shape: 原图 (h, w)
+    extras: 模型特有的附加信息（如视线方向）
+    raw: 原始推理结果对象（如Ultralytics Results），不参与序列化
+    """
+    __slots__ = ("boxes", "classes", "confs", "track_ids", "polygon_points", "polygon_offsets",
+                 "keypoints", "names", "shape", "extras", "raw")
+
+    def __init__(self, boxes=None, classes=None, confs=None, track_ids=None, polygons=None,
+                 keypoints=None, names=None, shape=None, extras=None, raw=None):
+        self.boxes = np.empty((0, 4), np.float32) if boxes is None else np.ascontiguousarray(boxes, np.float32)
+        n = len(self.boxes)
+        self.classes = np.zeros(n, np.int32) if classes is None else np.asarray(classes, np.int32)
+        self.confs = np.ones(n, np.float32) if confs is None else np.asarray(confs, np.float32)
+        self.track_ids = None if track_ids is None else np.asarray(track_ids, np.int32)
+        self.set_polygons(polygons or [])
+        self.keypoints = None if keypoints is None else np.ascontiguousarray(keypoints, np.float32)
+        self.names = names or {}
+        self.shape = shape
+        self.extras = extras or {}
+        self.raw = raw
+
+    def __len__(self):
+        return len(self.boxes)
+
+    def __getstate__(self):
+        return {k: getattr(self, k) for k in self.__slots__ if k != "raw"}
+
+    def __setstate__(self, state):
+        for k in self.__slots__:
+            setattr(self, k, state.get(k))
+
+    def set_polygons(self, polygons):
+        lengths = np.fromiter((len(p) for p in polygons), np.int64, len(polygons))
+        self.polygon_offsets = np.zeros(len(polygons) + 1, np.int64)
+        np.cumsum(lengths, out=self.polygon_offsets[1:])
+        if len(polygons):
+            self.polygon_points = np.concatenate([np.asarray(p, np.float32).reshape(-1, 2) for p in polygons])
+        else:
+            self.polygon_points = np.empty((0, 2), np.float32)
+
+    def polygon(self, i):
+        return self.polygon_points[self.polygon_offsets[i]:self.polygon_offsets[i + 1]]
+
+    @property
+    def num_polygons(self):
+        return len(self.polygon_offsets) - 1
+
+    @classmethod
+    def from_ultralytics(cls, r):
+        """从单帧Ultralytics Results提取数组，只做一次GPU->CPU拷贝"""
+        boxes = getattr(r, "boxes", None)
+        obb = getattr(r, "obb", None)
+        det = boxes if boxes is not None else obb
+        kwargs = {}
+        if det is not None:
+            kwargs["boxes"] = det.xyxy.cpu().numpy()
+            kwargs["classes"] = det.cls.cpu().numpy()
+            kwargs["confs"] = det.conf.cpu().numpy()
+            if getattr(det, "id", None) is not None:
+                kwargs["track_ids"] = det.id.cpu().numpy()
+        masks = getattr(r, "masks", None)
+        if masks is not None:
+            kwargs["polygons"] = masks.xy
+        keypoints = getattr(r, "keypoints", None)
+        if keypoints is not None:
+            kpts = keypoints.data.cpu().numpy()
+            if kpts.shape[-1] == 2:
+                kpts = np.concatenate([kpts, np.ones(kpts.shape[:-1] + (1,), kpts.dtype)], axis=-1)
+            kwargs["keypoints"] = kpts
+        return cls(names=getattr(r, "names", None), shape=tuple(r.orig_shape), raw=r, **kwargs)
+
+    # ---------------- 兼容视图：GUI沿用的旧格式 ----------------
+    def boxes_info(self):
+        """Nx4 int32 检测框"""
+        return self.boxes.astype(np.int32)
+
+    def seg_info(self):
+        """每个实例一个 Mx2 int32 多边形（共享同一块内存拆分而来）"""
+        points = self.polygon_points.astype(np.int32)
+        return np.split(points, self.polygon_offsets[1:-1]) if self.num_polygons else []
+
+    def keypoints_info(self):
+        """所有实例的关键点展平为 (N*K)x2 int32"""
+        if self.keypoints is None:
+            return np.empty((0, 2), np.int32)
+        return self.keypoints[..., :2].reshape(-1, 2).astype(np.int32)
+
+    def keypoints_per_instance(self):
+        """每个实例一个 Kx2 int32 关键点数组"""
+        if self.keypoints is None:
+            return []
+        return list(self.keypoints[..., :2].astype(np.int32))
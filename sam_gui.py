@@ -1,23 +1,27 @@
 import sys
 import os
+import threading
 import cv2
 import numpy as np
 from PyQt5.QtWidgets import (
     QWidget, QLabel, QPushButton, QComboBox, QFileDialog, QHBoxLayout, QVBoxLayout,
     QTextEdit, QApplication, QFrame, QSizePolicy, QSpacerItem, QDialog, QMessageBox
 )
-from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtCore import Qt, QTimer, pyqtSignal
 from PyQt5.QtGui import QPixmap, QImage, QFont
 
 from ultralytics import SAM
-
-def cvimg2qt(img):
-    rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-    h, w, ch = rgb.shape
-    bytes_per_line = ch * w
-    return QPixmap.fromImage(QImage(rgb.data, w, h, bytes_per_line, QImage.Format_RGB888))
+from backend import get_device
+from display import show_frame
+from pipeline import FramePipeline
+from model_registry import get_model
 
 class SAMWindow(QDialog):
+    # 工作线程 -> UI线程的结果投递
+    result_signal = pyqtSignal(object, object, str)  # (输入帧, 分割结果图, 信息)
+    error_signal = pyqtSignal(str)
+    image_done_signal = pyqtSignal()  # 单张图片分割结束（无论成功与否）
+
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setWindowTitle("SAM实例分割")
@@ -28,11 +32,18 @@ class SAMWindow(QDialog):
         self.input_img = None
         self.input_path = None
         self.input_type = "图片"
-        self.save_video_frames = []
-        self.timer = None
-        self.cap = None
+        self.pipeline = None  # 视频/摄像头分割流水线
+        self.image_busy = False  # 单张图片正在后台分割
+        self.device = get_device()
 
         self.init_ui()
+        self.result_signal.connect(self.show_result)
+        self.error_signal.connect(self.show_error)
+        self.image_done_signal.connect(self.on_image_done)
+        # 定时刷新处理帧率与队列深度
+        self.status_timer = QTimer(self)
+        self.status_timer.timeout.connect(self.update_status)
+        self.status_timer.start(500)
 
     def init_ui(self):
         main_layout = QVBoxLayout(self)
@@ -68,6 +79,8 @@ class SAMWindow(QDialog):
         toolbar.addWidget(self.btn_stop)
 
         toolbar.addItem(QSpacerItem(10, 10, QSizePolicy.Expanding, QSizePolicy.Minimum))
+        self.status_label = QLabel("处理帧率: 0.0 FPS  队列: 0/0")
+        toolbar.addWidget(self.status_label)
         main_layout.addLayout(toolbar)
 
         body_layout = QHBoxLayout()
@@ -116,9 +129,9 @@ class SAMWindow(QDialog):
     def resizeEvent(self, event):
         # 窗口大小变化时自适应图片显示
         if self.input_img is not None:
-            self.input_label.setPixmap(cvimg2qt(self.input_img).scaled(self.input_label.size(), Qt.KeepAspectRatio))
+            show_frame(self.input_label, self.input_img)
         if hasattr(self, 'last_result_img') and self.last_result_img is not None:
-            self.result_label.setPixmap(cvimg2qt(self.last_result_img).scaled(self.result_label.size(), Qt.KeepAspectRatio))
+            show_frame(self.result_label, self.last_result_img)
         super().resizeEvent(event)
 
     def select_weight(self):
@@ -127,7 +140,8 @@ class SAMWindow(QDialog):
             self.weight_path = path
             self.weight_label.setText(os.path.basename(path))
             try:
-                self.model = SAM(self.weight_path)
+                # SAM预热需要完整的全图分割，代价较高，只做缓存不预热
+                self.model = get_model(self.weight_path, task="sam", loader=lambda path, task: SAM(path))
                 QMessageBox.information(self, "加载成功", f"权重加载成功: {os.path.basename(path)}")
             except Exception as e:
                 self.model = None
@@ -141,7 +155,7 @@ class SAMWindow(QDialog):
         self.info_text.clear()
         self.input_img = None
         self.input_path = None
-        self.save_video_frames = []
+        self.stop_pipeline()
 
     def upload_input(self):
         if self.input_type == "图片":
@@ -150,7 +164,7 @@ class SAMWindow(QDialog):
                 self.input_path = path
                 img = cv2.imread(path)
                 self.input_img = img
-                self.input_label.setPixmap(cvimg2qt(img).scaled(self.input_label.size(), Qt.KeepAspectRatio))
+                show_frame(self.input_label, img)
         elif self.input_type == "视频":
             path, _ = QFileDialog.getOpenFileName(self, "选择视频", "", "Videos (*.mp4 *.avi *.mov)")
             if path:
@@ -159,81 +173,114 @@ class SAMWindow(QDialog):
                 ret, img = cap.read()
                 if ret:
                     self.input_img = img
-                    self.input_label.setPixmap(cvimg2qt(img).scaled(self.input_label.size(), Qt.KeepAspectRatio))
+                    show_frame(self.input_label, img)
                 cap.release()
         elif self.input_type == "摄像头":
             cap = cv2.VideoCapture(0)
             ret, img = cap.read()
             if ret:
                 self.input_img = img
-                self.input_label.setPixmap(cvimg2qt(img).scaled(self.input_label.size(), Qt.KeepAspectRatio))
+                show_frame(self.input_label, img)
                 self.input_path = 0
             cap.release()
 
     def start_infer(self):
+        if self.image_busy:
+            return  # 上一张图片仍在分割，忽略重复点击
         self.result_label.clear()
         self.info_text.clear()
         if self.model is None:
             QMessageBox.warning(self, "未加载权重", "请先上传并加载SAM权重文件！")
             return
+        self.stop_pipeline()
         if self.input_type == "图片":
             if self.input_img is not None:
-                self.run_sam(self.input_img)
-        elif self.input_type == "视频":
-            if self.input_path is not None:
-                self.cap = cv2.VideoCapture(self.input_path)
-                self.timer = QTimer(self)
-                self.timer.timeout.connect(self.process_video_frame)
-                self.timer.start(30)
-        elif self.input_type == "摄像头":
-            self.cap = cv2.VideoCapture(0)
-            self.timer = QTimer(self)
-            self.timer.timeout.connect(self.process_video_frame)
-            self.timer.start(30)
+                # 单张图片也在后台线程推理，SAM耗时数秒时界面保持响应
+                self.image_busy = True
+                self.btn_infer.setEnabled(False)
+                threading.Thread(target=self.segment_image, args=(self.input_img,), daemon=True).start()
+        elif self.input_type in ["视频", "摄像头"]:
+            if self.input_type == "摄像头":
+                self.input_path = 0
+            if self.input_path is None:
+                return
+            # 解码、推理、绘制分线程进行，结果经信号回到UI线程；摄像头队列满时只保留最新帧
+            self.pipeline = FramePipeline(
+                self.input_path,
+                lambda idx, img, results: self.result_signal.emit(img, *self.draw_sam(img, results)),
+                infer_fn=self.predict_sam,
+                live=self.input_type == "摄像头",
+                on_error=lambda e: self.error_signal.emit(str(e)),
+            )
+            self.pipeline.start()
 
     def stop_infer(self):
-        if self.timer:
-            self.timer.stop()
-        if self.cap:
-            self.cap.release()
+        self.stop_pipeline()
 
-    def process_video_frame(self):
-        if self.cap is None or not self.cap.isOpened():
-            return
-        ret, img = self.cap.read()
-        if not ret:
-            self.stop_infer()
+    def stop_pipeline(self):
+        if self.pipeline is not None:
+            self.pipeline.stop()
+            self.pipeline = None
+
+    def closeEvent(self, event):
+        self.stop_pipeline()
+        super().closeEvent(event)
+
+    def update_status(self):
+        if self.pipeline is None:
             return
-        self.input_label.setPixmap(cvimg2qt(img).scaled(self.input_label.size(), Qt.KeepAspectRatio))
-        self.run_sam(img)
+        in_depth, out_depth = self.pipeline.queue_depth()
+        self.status_label.setText(f"处理帧率: {self.pipeline.fps_meter.fps:.1f} FPS  队列: {in_depth}/{out_depth}  "
+                                  f"丢帧: {self.pipeline.dropped}")
 
-    def run_sam(self, img):
+    def segment_image(self, img):
+        """工作线程中推理并绘制单张图片，结果或错误经信号投递到UI线程"""
         try:
-            results = self.model(img, device='cuda')
-            masks = results[0].masks.data.cpu().numpy() if hasattr(results[0], "masks") and results[0].masks is not None else []
-            classes = results[0].boxes.cls.cpu().numpy() if hasattr(results[0], "boxes") and results[0].boxes is not None else []
-            confs = results[0].boxes.conf.cpu().numpy() if hasattr(results[0], "boxes") and results[0].boxes is not None else []
-            boxes = results[0].boxes.xyxy.cpu().numpy() if hasattr(results[0], "boxes") and results[0].boxes is not None else []
-
-            # 可视化分割结果
-            seg_img = img.copy()
-            info_lines = []
-            contour_color = (0, 255, 0)  # 统一轮廓颜色为绿色
-            for idx, mask in enumerate(masks):
-                color = np.random.randint(0, 255, (3,), dtype=np.uint8)
-                # 填充mask区域
-                seg_img[mask > 0.5] = seg_img[mask > 0.5] * 0.5 + color * 0.5
-                # 轮廓着色（统一颜色）
-                mask_uint8 = (mask > 0.5).astype(np.uint8) * 255
-                contours, _ = cv2.findContours(mask_uint8, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-                cv2.drawContours(seg_img, contours, -1, contour_color, 2)
-                if idx < len(boxes):
-                    box = boxes[idx]
-                    cls_id = int(classes[idx]) if idx < len(classes) else -1
-                    conf = confs[idx] if idx < len(confs) else 0
-                    info_lines.append(f"Obj{idx}: 坐标{box.astype(int).tolist()}, 类别{cls_id}, 置信度:{conf:.2f}")
-            self.last_result_img = seg_img.copy()
-            self.result_label.setPixmap(cvimg2qt(seg_img).scaled(self.result_label.size(), Qt.KeepAspectRatio))
-            self.info_text.setPlainText("\n".join(info_lines) if info_lines else "无分割结果")
+            results = self.predict_sam(img)
+            self.result_signal.emit(img, *self.draw_sam(img, results))
         except Exception as e:
-            QMessageBox.critical(self, "分割失败", f"分割失败: {e}")
+            self.error_signal.emit(str(e))
+        finally:
+            self.image_done_signal.emit()
+
+    def on_image_done(self):
+        self.image_busy = False
+        self.btn_infer.setEnabled(True)
+
+    def show_result(self, img, seg_img, info):
+        show_frame(self.input_label, img)
+        self.last_result_img = seg_img
+        show_frame(self.result_label, seg_img)
+        self.info_text.setPlainText(info)
+
+    def show_error(self, msg):
+        QMessageBox.critical(self, "分割失败", f"分割失败: {msg}")
+
+    def predict_sam(self, img):
+        return self.model(img, device=self.device)
+
+    def draw_sam(self, img, results):
+        """绘制分割结果，返回(结果图, 信息文本)"""
+        masks = results[0].masks.data.cpu().numpy() if hasattr(results[0], "masks") and results[0].masks is not None else []
+        classes = results[0].boxes.cls.cpu().numpy() if hasattr(results[0], "boxes") and results[0].boxes is not None else []
+        confs = results[0].boxes.conf.cpu().numpy() if hasattr(results[0], "boxes") and results[0].boxes is not None else []
+        boxes = results[0].boxes.xyxy.cpu().numpy() if hasattr(results[0], "boxes") and results[0].boxes is not None else []
+
+        # 可视化分割结果
+        seg_img = img.copy()
+        info_lines = []
+        contour_color = (0, 255, 0)  # 统一轮廓颜色为绿色
+        for idx, mask in enumerate(masks):
+            color = np.random.randint(0, 255, (3,), dtype=np.uint8)
+            # 填充mask区域
+            seg_img[mask > 0.5] = seg_img[mask > 0.5] * 0.5 + color * 0.5
+            # 轮廓着色（统一颜色）
+            mask_uint8 = (mask > 0.5).astype(np.uint8) * 255
+            contours, _ = cv2.findContours(mask_uint8, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+            cv2.drawContours(seg_img, contours, -1, contour_color, 2)
+            if idx < len(boxes):
+                box = boxes[idx]
+                cls_id = int(classes[idx]) if idx < len(classes) else -1
+                conf = confs[idx] if idx < len(confs) else 0
+                info_lines.append(f"Obj{idx}: 坐标{box.astype(int).tolist()}, 类别{cls_id}, 置信度:{conf:.2f}")
+        return seg_img, "\n".join(info_lines) if info_lines else "无分割结果"
@@ -1,26 +1,65 @@
+import time
 import cv2
-from ultralytics import YOLO
+import numpy as np
+from backend import get_device, InputBuffer, FPSMeter
+from results import InferenceResult
+from renderer import OverlayRenderer
+from model_registry import LazyModel
 
 class Segmentor:
     def __init__(self, weight_path):
-        self.model = YOLO(weight_path)
+        # 同一权重在进程内只加载一次，首次加载时预热，切换回来无需重新加载
+        # 加载和预热在后台进行，构造立即返回（可在界面线程选择权重时创建），首次推理时等待加载完成
+        self._model = LazyModel(weight_path)
+        self.loaded = self._model.future
+        self.device = get_device()
+        self.input_buffer = InputBuffer()
+        self.fps_meter = FPSMeter()
+        self.renderer = OverlayRenderer()
+
+    @property
+    def model(self):
+        """本实例独立的Ultralytics模型（共享缓存中的网络权重）"""
+        return self._model.get()
 
     def infer(self, image_bgr):
         """
         输入: image_bgr (OpenCV BGR格式)
-        输出: result_img (带分割mask的BGR图像), results (原始推理结果)
-        """
-        image_rgb = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2RGB)
-        results = self.model(image_rgb, task="segment", device='cuda')
-        result_img = results[0].plot()  # 带分割mask的RGB图像
-        result_img = cv2.cvtColor(result_img, cv2.COLOR_RGB2BGR)  # 转回BGR，保证输入输出一致
-        # 提取分割坐标信息
-        seg_info = []
-        for i, mask in enumerate(results[0].masks.xy if results[0].masks is not None else []):
-            # mask: [N,2]，N为多边形点数
-            coords = [(int(x), int(y)) for x, y in mask]
-            seg_info.append(coords)
-        return result_img, seg_info, results
+        输出: result_img (带分割mask的BGR图像), seg_info (每个目标一个Mx2 int32多边形), results (原始推理结果)
+        """
+        return self.infer_batch([image_bgr])[0]
+
+    def predict(self, image_bgr):
+        """
+        输入: image_bgr (OpenCV BGR格式)
+        输出: InferenceResult (boxes、polygons以顶点数组+偏移表存放)
+        """
+        return self.predict_batch([image_bgr])[0]
+
+    def predict_batch(self, frames):
+        """
+        输入: frames (BGR图像列表)，所有帧合并为一次前向推理
+        输出: 每帧一个InferenceResult
+        """
+        self.input_buffer.resize(len(frames))
+        batch_rgb = [self.input_buffer.to_rgb(img) for img in frames]
+        model = self.model  # 首次调用时等待后台加载完成，不计入推理耗时
+        t0 = time.perf_counter()
+        batch_results = model(batch_rgb, task="segment", device=self.device)
+        self.fps_meter.update(time.perf_counter() - t0, len(frames))
+        return [InferenceResult.from_ultralytics(r) for r in batch_results]
+
+    def infer_batch(self, frames):
+        """
+        输入: frames (BGR图像列表)
+        输出: 每帧一个 (result_img, seg_info, results) 元组，与infer一致
+        """
+        dets = self.predict_batch(frames)
+        return [(self.render(frame, det), det.seg_info(), [det.raw]) for frame, det in zip(frames, dets)]
+
+    def render(self, frame, det):
+        """在原始BGR帧上绘制分割结果，返回BGR图像"""
+        return self.renderer.draw(frame, det)
 
 if __name__ == "__main__":
     segmentor = Segmentor("yolov8n-seg.pt")
@@ -34,15 +73,13 @@ if __name__ == "__main__":
         result_img, seg_info, results = segmentor.infer(img)
         # 在画面上渲染分割多边形的部分坐标
         for idx, coords in enumerate(seg_info):
-            if coords:
+            if len(coords):
                 # 只显示第一个点和多边形中心
-                x0, y0 = coords[0]
+                x0, y0 = coords[0].tolist()
                 cv2.circle(result_img, (x0, y0), 5, (0, 255, 0), -1)
                 cv2.putText(result_img, f"Obj{idx}({x0},{y0})", (x0+5, y0-5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0,255,0), 1, cv2.LINE_AA)
                 # 计算多边形中心
-                xs = [x for x, y in coords]
-                ys = [y for x, y in coords]
-                cx, cy = int(sum(xs)/len(xs)), int(sum(ys)/len(ys))
+                cx, cy = coords.mean(axis=0).astype(int).tolist()
                 cv2.circle(result_img, (cx, cy), 4, (255, 0, 0), -1)
                 cv2.putText(result_img, f"C({cx},{cy})", (cx+5, cy-5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255,0,0), 1, cv2.LINE_AA)
         cv2.imshow("segmentor", result_img)
@@ -5,9 +5,12 @@ from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QPushButton, QLabel, QHBoxLayout, QSizePolicy,
     QFileDialog, QTextEdit, QComboBox, QFrame, QLineEdit
 )
-from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtCore import Qt, QTimer, pyqtSignal
 from PyQt5.QtGui import QFont, QImage, QPixmap
 from ultralytics import solutions
+from backend import get_device
+from display import show_frame
+from pipeline import FramePipeline
 
 # 解决方案子功能及中文
 SOLUTION_FEATURES = [
@@ -30,7 +33,30 @@ SOLUTION_FEATURES = [
     ("相似性检索",)
 ]
 
+class SolutionSlot:
+    """
+    一轮推理使用的解决方案实例：参数不变时跨帧沿用（不重新加载模型，保留追踪器状态与累计计数），参数变化时才重建
+    每条流水线持有自己的实例，重新开始后旧流水线尚未处理完的帧不会改动新一轮的实例
+    """
+    def __init__(self):
+        self.sol = None
+        self.key = None  # 当前实例对应的参数集
+
+    def build(self, factory, **kwargs):
+        """返回是否新建了实例"""
+        key = (factory.__name__, tuple(sorted((k, repr(v)) for k, v in kwargs.items())))
+        if self.sol is not None and key == self.key:
+            return False
+        self.sol = factory(**kwargs)
+        self.key = key
+        return True
+
+
 class SolutionSubWindow(QMainWindow):
+    # 工作线程 -> UI线程的结果投递
+    frame_signal = pyqtSignal(object, object)  # (输入帧, 解决方案结果)
+    info_signal = pyqtSignal(str)
+
     def __init__(self, cn_name, parent=None):
         super().__init__(parent)
         self.cn_name = cn_name
@@ -42,10 +68,15 @@ class SolutionSubWindow(QMainWindow):
         self.input_path = None
         self.input_img = None
         self.cap = None
-        self.timer = QTimer(self)
-        self.timer.timeout.connect(self.process_video_frame)
-        self.sol = None
+        self.pipeline = None  # 视频/摄像头处理流水线，推理在工作线程中进行
+        self.slot = SolutionSlot()  # 当前一轮推理的解决方案实例
         self.init_ui()
+        self.frame_signal.connect(self.on_frame_result)
+        self.info_signal.connect(self.info_text.append)
+        # 定时刷新处理帧率与队列深度
+        self.status_timer = QTimer(self)
+        self.status_timer.timeout.connect(self.update_status)
+        self.status_timer.start(500)
 
     def init_ui(self):
         main_widget = QWidget()
@@ -88,6 +119,8 @@ class SolutionSubWindow(QMainWindow):
         self.param_combo.setFixedWidth(120)
         self.param_combo.addItem("默认参数")
         toolbar1.addWidget(self.param_combo)
+        self.status_label = QLabel("处理帧率: 0.0 FPS  队列: 0/0")
+        toolbar1.addWidget(self.status_label)
         main_layout.addLayout(toolbar1)
         # 参数设置区（原toolbar改为toolbar2）
         toolbar = toolbar2
@@ -569,7 +602,8 @@ class SolutionSubWindow(QMainWindow):
         if self.cap:
             self.cap.release()
             self.cap = None
-        self.timer.stop()
+        self.stop_pipeline()
+        self.reset_solution()
 
     def upload_input(self):
         if self.input_type == "图片":
@@ -578,7 +612,7 @@ class SolutionSubWindow(QMainWindow):
                 self.input_path = path
                 img = cv2.imread(path)
                 self.input_img = img
-                self.input_label.setPixmap(self.cvimg2qt(img).scaled(self.input_label.size(), Qt.KeepAspectRatio))
+                show_frame(self.input_label, img)
                 self.info_text.append(f"已选择图片: {path}")
         elif self.input_type == "视频":
             path, _ = QFileDialog.getOpenFileName(self, "选择视频", "", "Videos (*.mp4 *.avi *.mov)")
@@ -588,7 +622,7 @@ class SolutionSubWindow(QMainWindow):
                 ret, img = self.cap.read()
                 if ret:
                     self.input_img = img
-                    self.input_label.setPixmap(self.cvimg2qt(img).scaled(self.input_label.size(), Qt.KeepAspectRatio))
+                    show_frame(self.input_label, img)
                 self.info_text.append(f"已选择视频: {path}")
         elif self.input_type == "摄像头":
             self.cap = cv2.VideoCapture(0)
@@ -598,7 +632,7 @@ class SolutionSubWindow(QMainWindow):
             ret, img = self.cap.read()
             if ret:
                 self.input_img = img
-                self.input_label.setPixmap(self.cvimg2qt(img).scaled(self.input_label.size(), Qt.KeepAspectRatio))
+                show_frame(self.input_label, img)
                 self.input_path = 0
                 self.info_text.append("已打开摄像头")
 
@@ -608,24 +642,76 @@ class SolutionSubWindow(QMainWindow):
             self.model_path = path
             self.weight_label.setText(os.path.basename(path))
             self.info_text.append(f"已选择权重: {path}")
+            self.reset_solution()
 
     def start_infer(self):
         if not self.model_path:
             self.info_text.append("请先上传权重文件！")
             return
+        # 每次开始推理都从新的解决方案实例开始，同一轮内跨帧复用
+        self.reset_solution()
+        params = self.read_params()
         if self.input_type == "图片":
             if self.input_img is not None:
-                self.run_solution(self.input_img)
+                self.run_solution(self.input_img, params)
         elif self.input_type == "视频":
-            if self.cap is not None:
-                self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-                self.timer.start(1)
+            if self.input_path is not None:
+                self.start_pipeline(self.input_path, params, live=False)
         elif self.input_type == "摄像头":
-            if self.cap is not None:
-                self.timer.start(1)
+            if self.input_path is not None:
+                # 已打开的摄像头交给流水线读取，结束时由流水线释放
+                source = self.cap if self.cap is not None else 0
+                self.cap = None
+                self.start_pipeline(source, params, live=True)
+
+    def read_params(self):
+        """在UI线程中一次性读取所有参数输入框/下拉框的当前值，按控件属性名保存"""
+        params = {}
+        for name, widget in vars(self).items():
+            if isinstance(widget, QLineEdit):
+                params[name] = widget.text()
+            elif isinstance(widget, QComboBox):
+                params[name] = widget.currentText()
+            elif isinstance(widget, QTextEdit) and not widget.isReadOnly():
+                params[name] = widget.toPlainText()
+        return params
+
+    def start_pipeline(self, source, params, live):
+        """
+        解码、解决方案推理、结果显示分线程进行：推理在工作线程中执行，结果经信号回到UI线程显示
+        摄像头模式队列满时只保留最新帧，推理再慢界面也不会卡顿
+        """
+        self.stop_pipeline()
+        slot = self.slot
+        self.pipeline = FramePipeline(
+            source,
+            lambda idx, img, results: self.frame_signal.emit(img, results),
+            infer_fn=lambda img: self.run_solution(img, params, return_results=True, slot=slot),
+            live=live,
+            on_finished=lambda: self.info_signal.emit("视频/摄像头处理结束"),
+            on_error=lambda e: self.info_signal.emit(f"推理异常: {e}"),
+        )
+        self.pipeline.start()
+
+    def stop_pipeline(self):
+        if self.pipeline is not None:
+            self.pipeline.stop()
+            self.pipeline = None
+
+    def on_frame_result(self, img, results):
+        self.input_img = img
+        show_frame(self.input_label, img)
+        self.show_result(results)
+
+    def update_status(self):
+        if self.pipeline is None:
+            return
+        in_depth, out_depth = self.pipeline.queue_depth()
+        self.status_label.setText(f"处理帧率: {self.pipeline.fps_meter.fps:.1f} FPS  队列: {in_depth}/{out_depth}  "
+                                  f"丢帧: {self.pipeline.dropped}")
 
     def stop_infer(self):
-        self.timer.stop()
+        self.stop_pipeline()
         self.info_text.append("已停止推理")
 
     def reset_all(self):
@@ -639,22 +725,10 @@ class SolutionSubWindow(QMainWindow):
         if self.cap:
             self.cap.release()
             self.cap = None
-        self.timer.stop()
+        self.stop_pipeline()
+        self.reset_solution()
         self.info_text.append("已复位所有界面和变量")
 
-    def process_video_frame(self):
-        # 视频流卡顿优化：每帧都推理，提升流畅度
-        if self.cap is not None and self.cap.isOpened():
-            ret, img = self.cap.read()
-            if not ret:
-                self.timer.stop()
-                self.info_text.append("视频/摄像头读取结束")
-                return
-            self.input_img = img
-            self.input_label.setPixmap(self.cvimg2qt(img).scaled(self.input_label.size(), Qt.KeepAspectRatio))
-            results = self.run_solution(img, return_results=True)
-            self.show_result(results)
-
     def on_region_type_changed(self, text):
         # 可根据选择自动切换region_points
         if text == "矩形区域":
@@ -675,81 +749,95 @@ class SolutionSubWindow(QMainWindow):
         elif text == "仰卧起坐":
             self.kpts_input.setText("12,14,16")
 
-    def run_solution(self, img, return_results=False):
+    def reset_solution(self):
+        """换用新的解决方案实例，下一帧按当前参数重建（计数、轨迹从零开始）；旧流水线仍持有旧实例"""
+        self.slot = SolutionSlot()
+
+    def run_solution(self, img, params, return_results=False, slot=None):
+        """
+        params: read_params在UI线程中读取的参数快照，视频/摄像头时本方法在推理线程中执行，不访问控件
+        slot: 使用的SolutionSlot，流水线传入开始时的实例，默认为当前实例
+        结果由show_result/on_frame_result在界面中显示，解决方案均以show=False创建，不另开cv2窗口
+        """
+        slot = slot or self.slot
         try:
             if self.cn_name == "目标计数":
                 # 读取参数
                 region_points = getattr(self, 'region_points', [(20, 400), (1080, 400), (1080, 360), (20, 360)])
-                class_str = self.class_input.text() if hasattr(self, 'class_input') else ''
+                class_str = params.get("class_input", '')
                 classes = [int(x) for x in class_str.split(',') if x.strip().isdigit()] if class_str else None
-                conf = float(self.conf_input.text()) if hasattr(self, 'conf_input') and self.conf_input.text() else 0.3
-                iou = float(self.iou_input.text()) if hasattr(self, 'iou_input') and self.iou_input.text() else 0.5
-                tracker = self.tracker_combo.currentText() if hasattr(self, 'tracker_combo') else 'botsort.yaml'
-                self.sol = solutions.ObjectCounter(
-                    show=True,
+                conf = float(params.get("conf_input") or 0.3)
+                iou = float(params.get("iou_input") or 0.5)
+                tracker = params.get("tracker_combo", 'botsort.yaml')
+                slot.build(
+                    solutions.ObjectCounter,
+                    show=False,
                     region=region_points,
                     model=self.model_path,
                     classes=classes,
                     conf=conf,
                     iou=iou,
                     tracker=tracker,
-                    device='cuda'
+                    device=get_device()
                 )
-                results = self.sol(img)
+                results = slot.sol(img)
                 if return_results:
                     return results
                 self.show_result(results)
             elif self.cn_name == "目标裁剪":
                 # 读取参数
-                class_str = self.crop_class_input.text() if hasattr(self, 'crop_class_input') else ''
+                class_str = params.get("crop_class_input", '')
                 classes = [int(x) for x in class_str.split(',') if x.strip().isdigit()] if class_str else None
-                conf = float(self.crop_conf_input.text()) if hasattr(self, 'crop_conf_input') and self.crop_conf_input.text() else 0.25
-                crop_dir = self.crop_dir_input.text() if hasattr(self, 'crop_dir_input') and self.crop_dir_input.text() else "cropped-detections"
-                self.sol = solutions.ObjectCropper(
-                    show=True,
+                conf = float(params.get("crop_conf_input") or 0.25)
+                crop_dir = params.get("crop_dir_input") or "cropped-detections"
+                slot.build(
+                    solutions.ObjectCropper,
+                    show=False,
                     model=self.model_path,
                     classes=classes,
                     conf=conf,
                     crop_dir=crop_dir,
-                    device='cuda'
+                    device=get_device()
                 )
-                results = self.sol(img)
+                results = slot.sol(img)
                 if return_results:
                     return results
                 self.show_result(results)
             elif self.cn_name == "目标模糊":
                 # 读取参数
-                class_str = self.blur_class_input.text() if hasattr(self, 'blur_class_input') else ''
+                class_str = params.get("blur_class_input", '')
                 classes = [int(x) for x in class_str.split(',') if x.strip().isdigit()] if class_str else None
-                conf = float(self.blur_conf_input.text()) if hasattr(self, 'blur_conf_input') and self.blur_conf_input.text() else 0.3
-                iou = float(self.blur_iou_input.text()) if hasattr(self, 'blur_iou_input') and self.blur_iou_input.text() else 0.5
-                blur_ratio = float(self.blur_ratio_input.text()) if hasattr(self, 'blur_ratio_input') and self.blur_ratio_input.text() else 0.5
-                tracker = self.blur_tracker_combo.currentText() if hasattr(self, 'blur_tracker_combo') else 'botsort.yaml'
-                self.sol = solutions.ObjectBlurrer(
-                    show=True,
+                conf = float(params.get("blur_conf_input") or 0.3)
+                iou = float(params.get("blur_iou_input") or 0.5)
+                blur_ratio = float(params.get("blur_ratio_input") or 0.5)
+                tracker = params.get("blur_tracker_combo", 'botsort.yaml')
+                slot.build(
+                    solutions.ObjectBlurrer,
+                    show=False,
                     model=self.model_path,
                     classes=classes,
                     conf=conf,
                     iou=iou,
                     blur_ratio=blur_ratio,
                     tracker=tracker,
-                    device='cuda'
+                    device=get_device()
                 )
-                results = self.sol(img)
+                results = slot.sol(img)
                 if return_results:
                     return results
                 self.show_result(results)
             elif self.cn_name == "锻炼监测":
                 # 读取参数
-                kpts_str = self.kpts_input.text() if hasattr(self, 'kpts_input') and self.kpts_input.text() else "6,8,10"
+                kpts_str = params.get("kpts_input") or "6,8,10"
                 kpts = [int(x) for x in kpts_str.split(',') if x.strip().isdigit()]
-                up_angle = float(self.up_angle_input.text()) if hasattr(self, 'up_angle_input') and self.up_angle_input.text() else 145.0
-                down_angle = float(self.down_angle_input.text()) if hasattr(self, 'down_angle_input') and self.down_angle_input.text() else 90.0
-                conf = float(self.gym_conf_input.text()) if hasattr(self, 'gym_conf_input') and self.gym_conf_input.text() else 0.3
-                iou = float(self.gym_iou_input.text()) if hasattr(self, 'gym_iou_input') and self.gym_iou_input.text() else 0.5
-                tracker = self.gym_tracker_combo.currentText() if hasattr(self, 'gym_tracker_combo') else 'botsort.yaml'
-                self.sol = solutions.AIGym(
-                    show=True,
+                up_angle = float(params.get("up_angle_input") or 145.0)
+                down_angle = float(params.get("down_angle_input") or 90.0)
+                conf = float(params.get("gym_conf_input") or 0.3)
+                iou = float(params.get("gym_iou_input") or 0.5)
+                tracker = params.get("gym_tracker_combo", 'botsort.yaml')
+                slot.build(
+                    solutions.AIGym,
+                    show=False,
                     kpts=kpts,
                     up_angle=up_angle,
                     down_angle=down_angle,
@@ -757,16 +845,16 @@ class SolutionSubWindow(QMainWindow):
                     conf=conf,
                     iou=iou,
                     tracker=tracker,
-                    device='cuda'
+                    device=get_device()
                 )
-                results = self.sol(img)
+                results = slot.sol(img)
                 if return_results:
                     return results
                 self.show_result(results)
             elif self.cn_name == "区域内目标计数":
                 # 读取参数
-                region_type = self.region_type_combo.currentText() if hasattr(self, 'region_type_combo') else "单区域"
-                region_points_text = self.region_points_input.toPlainText() if hasattr(self, 'region_points_input') else ""
+                region_type = params.get("region_type_combo", "单区域")
+                region_points_text = params.get("region_points_input", "")
                 # 区域点解析
                 if region_type == "单区域":
                     # 只取第一行，格式 x1,y1;x2,y2;...
@@ -800,16 +888,17 @@ class SolutionSubWindow(QMainWindow):
                 else:
                     regions = [[(20, 400), (1080, 400), (1080, 360), (20, 360)]]
                 # 其它参数
-                class_str = self.region_class_input.text() if hasattr(self, 'region_class_input') else ''
+                class_str = params.get("region_class_input", '')
                 classes = [int(x) for x in class_str.split(',') if x.strip().isdigit()] if class_str else None
-                conf = float(self.region_conf_input.text()) if hasattr(self, 'region_conf_input') and self.region_conf_input.text() else 0.3
-                iou = float(self.region_iou_input.text()) if hasattr(self, 'region_iou_input') and self.region_iou_input.text() else 0.5
-                tracker = self.region_tracker_combo.currentText() if hasattr(self, 'region_tracker_combo') else 'botsort.yaml'
-                show_conf = self.region_show_conf_combo.currentText() == "显示" if hasattr(self, 'region_show_conf_combo') else True
-                show_labels = self.region_show_labels_combo.currentText() == "显示" if hasattr(self, 'region_show_labels_combo') else True
-                line_width = int(self.region_line_width_input.text()) if hasattr(self, 'region_line_width_input') and self.region_line_width_input.text().isdigit() else None
-                self.sol = solutions.RegionCounter(
-                    show=True,
+                conf = float(params.get("region_conf_input") or 0.3)
+                iou = float(params.get("region_iou_input") or 0.5)
+                tracker = params.get("region_tracker_combo", 'botsort.yaml')
+                show_conf = params.get("region_show_conf_combo", "显示") == "显示"
+                show_labels = params.get("region_show_labels_combo", "显示") == "显示"
+                line_width = int(params["region_line_width_input"]) if params.get("region_line_width_input", "").isdigit() else None
+                slot.build(
+                    solutions.RegionCounter,
+                    show=False,
                     region=regions,
                     model=self.model_path,
                     classes=classes,
@@ -819,28 +908,29 @@ class SolutionSubWindow(QMainWindow):
                     show_conf=show_conf,
                     show_labels=show_labels,
                     line_width=line_width,
-                    device='cuda'
+                    device=get_device()
                 )
-                results = self.sol(img)
+                results = slot.sol(img)
                 if return_results:
                     return results
                 self.show_result(results)
             elif self.cn_name == "安全报警系统":
                 # 读取参数
-                class_str = self.alarm_class_input.text() if hasattr(self, 'alarm_class_input') else ''
+                class_str = params.get("alarm_class_input", '')
                 classes = [int(x) for x in class_str.split(',') if x.strip().isdigit()] if class_str else None
-                conf = float(self.alarm_conf_input.text()) if hasattr(self, 'alarm_conf_input') and self.alarm_conf_input.text() else 0.3
-                iou = float(self.alarm_iou_input.text()) if hasattr(self, 'alarm_iou_input') and self.alarm_iou_input.text() else 0.5
-                tracker = self.alarm_tracker_combo.currentText() if hasattr(self, 'alarm_tracker_combo') else 'botsort.yaml'
-                records = int(self.alarm_records_input.text()) if hasattr(self, 'alarm_records_input') and self.alarm_records_input.text().isdigit() else 5
-                show_conf = self.alarm_show_conf_combo.currentText() == "显示" if hasattr(self, 'alarm_show_conf_combo') else True
-                show_labels = self.alarm_show_labels_combo.currentText() == "显示" if hasattr(self, 'alarm_show_labels_combo') else True
-                line_width = int(self.alarm_line_width_input.text()) if hasattr(self, 'alarm_line_width_input') and self.alarm_line_width_input.text().isdigit() else None
-                from_email = self.alarm_from_email.text() if hasattr(self, 'alarm_from_email') else ''
-                email_pwd = self.alarm_email_pwd.text() if hasattr(self, 'alarm_email_pwd') else ''
-                to_email = self.alarm_to_email.text() if hasattr(self, 'alarm_to_email') else ''
-                self.sol = solutions.SecurityAlarm(
-                    show=True,
+                conf = float(params.get("alarm_conf_input") or 0.3)
+                iou = float(params.get("alarm_iou_input") or 0.5)
+                tracker = params.get("alarm_tracker_combo", 'botsort.yaml')
+                records = int(params["alarm_records_input"]) if params.get("alarm_records_input", "").isdigit() else 5
+                show_conf = params.get("alarm_show_conf_combo", "显示") == "显示"
+                show_labels = params.get("alarm_show_labels_combo", "显示") == "显示"
+                line_width = int(params["alarm_line_width_input"]) if params.get("alarm_line_width_input", "").isdigit() else None
+                from_email = params.get("alarm_from_email", '')
+                email_pwd = params.get("alarm_email_pwd", '')
+                to_email = params.get("alarm_to_email", '')
+                created = slot.build(
+                    solutions.SecurityAlarm,
+                    show=False,
                     model=self.model_path,
                     records=records,
                     tracker=tracker,
@@ -850,15 +940,15 @@ class SolutionSubWindow(QMainWindow):
                     show_conf=show_conf,
                     show_labels=show_labels,
                     line_width=line_width,
-                    device='cuda'
+                    device=get_device()
                 )
-                # 邮箱认证
-                if from_email and email_pwd and to_email:
-                    self.sol.authenticate(from_email, email_pwd, to_email)
-                    self.info_text.append(f"已设置报警邮箱：{from_email} -> {to_email}")
-                else:
-                    self.info_text.append("未设置报警邮箱参数，仅本地报警显示")
-                results = self.sol(img)
+                # 邮箱认证（只在新建实例时进行）
+                if created and from_email and email_pwd and to_email:
+                    slot.sol.authenticate(from_email, email_pwd, to_email)
+                    self.info_signal.emit(f"已设置报警邮箱：{from_email} -> {to_email}")
+                elif created:
+                    self.info_signal.emit("未设置报警邮箱参数，仅本地报警显示")
+                results = slot.sol(img)
                 if return_results:
                     return results
                 self.show_result(results)
@@ -888,11 +978,11 @@ class SolutionSubWindow(QMainWindow):
                     "TURBO": cv2.COLORMAP_TURBO if hasattr(cv2, 'COLORMAP_TURBO') else cv2.COLORMAP_JET,
                     "DEEPGREEN": cv2.COLORMAP_DEEPGREEN if hasattr(cv2, 'COLORMAP_DEEPGREEN') else cv2.COLORMAP_JET,
                 }
-                colormap_name = self.heatmap_colormap_combo.currentText()
+                colormap_name = params["heatmap_colormap_combo"]
                 colormap = colormap_map.get(colormap_name, cv2.COLORMAP_JET)
-                show_in = self.heatmap_show_in_combo.currentText() == "显示"
-                show_out = self.heatmap_show_out_combo.currentText() == "显示"
-                region_text = self.heatmap_region_input.text()
+                show_in = params["heatmap_show_in_combo"] == "显示"
+                show_out = params["heatmap_show_out_combo"] == "显示"
+                region_text = params["heatmap_region_input"]
                 region = None
                 if region_text:
                     try:
@@ -901,16 +991,17 @@ class SolutionSubWindow(QMainWindow):
                             region = pts
                     except Exception:
                         region = None
-                class_str = self.heatmap_class_input.text() if hasattr(self, 'heatmap_class_input') else ''
+                class_str = params.get("heatmap_class_input", '')
                 classes = [int(x) for x in class_str.split(',') if x.strip().isdigit()] if class_str else None
-                conf = float(self.heatmap_conf_input.text()) if hasattr(self, 'heatmap_conf_input') and self.heatmap_conf_input.text() else 0.3
-                iou = float(self.heatmap_iou_input.text()) if hasattr(self, 'heatmap_iou_input') and self.heatmap_iou_input.text() else 0.5
-                tracker = self.heatmap_tracker_combo.currentText() if hasattr(self, 'heatmap_tracker_combo') else 'botsort.yaml'
-                show_conf = self.heatmap_show_conf_combo.currentText() == "显示" if hasattr(self, 'heatmap_show_conf_combo') else True
-                show_labels = self.heatmap_show_labels_combo.currentText() == "显示" if hasattr(self, 'heatmap_show_labels_combo') else True
-                line_width = int(self.heatmap_line_width_input.text()) if hasattr(self, 'heatmap_line_width_input') and self.heatmap_line_width_input.text().isdigit() else None
-                self.sol = solutions.Heatmap(
-                    show=True,
+                conf = float(params.get("heatmap_conf_input") or 0.3)
+                iou = float(params.get("heatmap_iou_input") or 0.5)
+                tracker = params.get("heatmap_tracker_combo", 'botsort.yaml')
+                show_conf = params.get("heatmap_show_conf_combo", "显示") == "显示"
+                show_labels = params.get("heatmap_show_labels_combo", "显示") == "显示"
+                line_width = int(params["heatmap_line_width_input"]) if params.get("heatmap_line_width_input", "").isdigit() else None
+                slot.build(
+                    solutions.Heatmap,
+                    show=False,
                     model=self.model_path,
                     colormap=colormap,
                     show_in=show_in,
@@ -923,15 +1014,15 @@ class SolutionSubWindow(QMainWindow):
                     show_conf=show_conf,
                     show_labels=show_labels,
                     line_width=line_width,
-                    device='cuda'
+                    device=get_device()
                 )
-                results = self.sol(img)
+                results = slot.sol(img)
                 if return_results:
                     return results
                 self.show_result(results)
             elif self.cn_name == "实例分割与目标跟踪":
                 # 读取参数
-                region_text = self.seg_region_input.text() if hasattr(self, 'seg_region_input') else ''
+                region_text = params.get("seg_region_input", '')
                 region = None
                 if region_text:
                     try:
@@ -940,16 +1031,17 @@ class SolutionSubWindow(QMainWindow):
                             region = pts
                     except Exception:
                         region = None
-                class_str = self.seg_class_input.text() if hasattr(self, 'seg_class_input') else ''
+                class_str = params.get("seg_class_input", '')
                 classes = [int(x) for x in class_str.split(',') if x.strip().isdigit()] if class_str else None
-                conf = float(self.seg_conf_input.text()) if hasattr(self, 'seg_conf_input') and self.seg_conf_input.text() else 0.3
-                iou = float(self.seg_iou_input.text()) if hasattr(self, 'seg_iou_input') and self.seg_iou_input.text() else 0.5
-                tracker = self.seg_tracker_combo.currentText() if hasattr(self, 'seg_tracker_combo') else 'botsort.yaml'
-                show_conf = self.seg_show_conf_combo.currentText() == "显示" if hasattr(self, 'seg_show_conf_combo') else True
-                show_labels = self.seg_show_labels_combo.currentText() == "显示" if hasattr(self, 'seg_show_labels_combo') else True
-                line_width = int(self.seg_line_width_input.text()) if hasattr(self, 'seg_line_width_input') and self.seg_line_width_input.text().isdigit() else None
-                self.sol = solutions.InstanceSegmentation(
-                    show=True,
+                conf = float(params.get("seg_conf_input") or 0.3)
+                iou = float(params.get("seg_iou_input") or 0.5)
+                tracker = params.get("seg_tracker_combo", 'botsort.yaml')
+                show_conf = params.get("seg_show_conf_combo", "显示") == "显示"
+                show_labels = params.get("seg_show_labels_combo", "显示") == "显示"
+                line_width = int(params["seg_line_width_input"]) if params.get("seg_line_width_input", "").isdigit() else None
+                slot.build(
+                    solutions.InstanceSegmentation,
+                    show=False,
                     model=self.model_path,
                     region=region,
                     classes=classes,
@@ -959,15 +1051,15 @@ class SolutionSubWindow(QMainWindow):
                     show_conf=show_conf,
                     show_labels=show_labels,
                     line_width=line_width,
-                    device='cuda'
+                    device=get_device()
                 )
-                results = self.sol(img)
+                results = slot.sol(img)
                 if return_results:
                     return results
                 self.show_result(results)
             elif self.cn_name == "VisionEye视图对象映射":
                 # 读取参数
-                point_text = self.visioneye_point_input.text() if hasattr(self, 'visioneye_point_input') else ''
+                point_text = params.get("visioneye_point_input", '')
                 vision_point = (20, 20)
                 if point_text:
                     try:
@@ -975,16 +1067,17 @@ class SolutionSubWindow(QMainWindow):
                         vision_point = (x, y)
                     except Exception:
                         vision_point = (20, 20)
-                class_str = self.visioneye_class_input.text() if hasattr(self, 'visioneye_class_input') else ''
+                class_str = params.get("visioneye_class_input", '')
                 classes = [int(x) for x in class_str.split(',') if x.strip().isdigit()] if class_str else None
-                conf = float(self.visioneye_conf_input.text()) if hasattr(self, 'visioneye_conf_input') and self.visioneye_conf_input.text() else 0.3
-                iou = float(self.visioneye_iou_input.text()) if hasattr(self, 'visioneye_iou_input') and self.visioneye_iou_input.text() else 0.5
-                tracker = self.visioneye_tracker_combo.currentText() if hasattr(self, 'visioneye_tracker_combo') else 'botsort.yaml'
-                show_conf = self.visioneye_show_conf_combo.currentText() == "显示" if hasattr(self, 'visioneye_show_conf_combo') else True
-                show_labels = self.visioneye_show_labels_combo.currentText() == "显示" if hasattr(self, 'visioneye_show_labels_combo') else True
-                line_width = int(self.visioneye_line_width_input.text()) if hasattr(self, 'visioneye_line_width_input') and self.visioneye_line_width_input.text().isdigit() else None
-                self.sol = solutions.VisionEye(
-                    show=True,
+                conf = float(params.get("visioneye_conf_input") or 0.3)
+                iou = float(params.get("visioneye_iou_input") or 0.5)
+                tracker = params.get("visioneye_tracker_combo", 'botsort.yaml')
+                show_conf = params.get("visioneye_show_conf_combo", "显示") == "显示"
+                show_labels = params.get("visioneye_show_labels_combo", "显示") == "显示"
+                line_width = int(params["visioneye_line_width_input"]) if params.get("visioneye_line_width_input", "").isdigit() else None
+                slot.build(
+                    solutions.VisionEye,
+                    show=False,
                     model=self.model_path,
                     vision_point=vision_point,
                     classes=classes,
@@ -994,48 +1087,48 @@ class SolutionSubWindow(QMainWindow):
                     show_conf=show_conf,
                     show_labels=show_labels,
                     line_width=line_width,
-                    device='cuda'
+                    device=get_device()
                 )
-                results = self.sol(img)
+                results = slot.sol(img)
                 if return_results:
                     return results
                 self.show_result(results)
             elif self.cn_name == "速度估计":
-                self.sol = solutions.SpeedEstimator(show=True, model=self.model_path, device='cuda')
-                results = self.sol(img)
+                slot.build(solutions.SpeedEstimator, show=False, model=self.model_path, device=get_device())
+                results = slot.sol(img)
                 if return_results:
                     return results
                 self.show_result(results)
             elif self.cn_name == "距离计算":
-                self.sol = solutions.DistanceCalculation(show=True, model=self.model_path, device='cuda')
-                results = self.sol(img)
+                slot.build(solutions.DistanceCalculation, show=False, model=self.model_path, device=get_device())
+                results = slot.sol(img)
                 if return_results:
                     return results
                 self.show_result(results)
             elif self.cn_name == "排队管理":
-                self.sol = solutions.QueueManager(show=True, model=self.model_path, device='cuda')
-                results = self.sol(img)
+                slot.build(solutions.QueueManager, show=False, model=self.model_path, device=get_device())
+                results = slot.sol(img)
                 if return_results:
                     return results
                 self.show_result(results)
             elif self.cn_name == "停车管理":
-                self.sol = solutions.ParkingPtsSelection(show=True, model=self.model_path, device='cuda')
-                results = self.sol(img)
+                slot.build(solutions.ParkingPtsSelection, show=False, model=self.model_path, device=get_device())
+                results = slot.sol(img)
                 if return_results:
                     return results
                 self.show_result(results)
             elif self.cn_name == "分析":
-                self.sol = solutions.Analytics(show=True, model=self.model_path, device='cuda')
-                results = self.sol(img)
+                slot.build(solutions.Analytics, show=False, model=self.model_path, device=get_device())
+                results = slot.sol(img)
                 if return_results:
                     return results
                 self.show_result(results)
             elif self.cn_name == "实时推理":
-                solutions.Inference(model=self.model_path, source=self.input_path if self.input_path else 0, device='cuda')
-                self.info_text.append("已启动实时推理窗口")
+                solutions.Inference(model=self.model_path, source=self.input_path if self.input_path else 0, device=get_device())
+                self.info_signal.emit("已启动实时推理窗口")
             elif self.cn_name == "区域内目标跟踪":
-                self.sol = solutions.TrackZone(show=True, model=self.model_path, device='cuda')
-                results = self.sol(img)
+                slot.build(solutions.TrackZone, show=False, model=self.model_path, device=get_device())
+                results = slot.sol(img)
                 if return_results:
                     return results
                 self.show_result(results)
@@ -1045,12 +1138,12 @@ class SolutionSubWindow(QMainWindow):
                     # 已有文本检索控件，不自动推理
                     return
                 else:
-                    self.sol = solutions.SearchApp(data="images", model="clip")
-                    self.info_text.append("请在上方输入检索文本并点击检索按钮")
+                    slot.build(solutions.SearchApp, data="images", model="clip")
+                    self.info_signal.emit("请在上方输入检索文本并点击检索按钮")
             else:
-                self.info_text.append("暂未实现该功能")
+                self.info_signal.emit("暂未实现该功能")
         except Exception as e:
-            self.info_text.append(f"推理异常: {e}")
+            self.info_signal.emit(f"推理异常: {e}")
         if return_results:
             return None
 
@@ -1062,12 +1155,12 @@ class SolutionSubWindow(QMainWindow):
         if hasattr(results, 'plot_im'):
             img = results.plot_im
             img_bgr = img if img.shape[2] == 3 else cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
-            self.result_label.setPixmap(self.cvimg2qt(img_bgr).scaled(self.result_label.size(), Qt.KeepAspectRatio))
+            show_frame(self.result_label, img_bgr)
         info = []
         # 展示Ultralytics Solutions参数（如有）
-        if hasattr(self, 'sol') and hasattr(self.sol, '__dict__'):
+        if hasattr(self.slot.sol, '__dict__'):
             sol_params = {}
-            for k, v in self.sol.__dict__.items():
+            for k, v in self.slot.sol.__dict__.items():
                 if not k.startswith('_') and not callable(v):
                     sol_params[k] = v
             if sol_params:
@@ -1204,12 +1297,6 @@ class SolutionSubWindow(QMainWindow):
         self.info_text.clear()
         self.info_text.append("\n".join([str(i) for i in info]) if info else "推理完成")
 
-    def cvimg2qt(self, img):
-        rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        h, w, ch = rgb.shape
-        bytes_per_line = ch * w
-        return QPixmap.fromImage(QImage(rgb.data, w, h, bytes_per_line, QImage.Format_RGB888))
-
     def closeEvent(self, event):
         # 关闭窗口时自动停止推理和释放资源
         self.stop_infer()
@@ -1226,7 +1313,7 @@ class SolutionSubWindow(QMainWindow):
             return
         if not hasattr(self, 'searcher'):
             from ultralytics import solutions
-            self.searcher = solutions.VisualAISearch(device='cuda')
+            self.searcher = solutions.VisualAISearch(device=get_device())
         self.info_text.append(f"正在检索：{query}")
         results = self.searcher(query)
         if hasattr(results, 'images') and len(results.images) > 0:
@@ -1237,7 +1324,7 @@ class SolutionSubWindow(QMainWindow):
                     img_bgr = img
                 else:
                     img_bgr = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
-                self.result_label.setPixmap(self.cvimg2qt(img_bgr).scaled(self.result_label.size(), Qt.KeepAspectRatio))
+                show_frame(self.result_label, img_bgr)
         # 显示所有检索结果文件名和分数
         info = []
         if hasattr(results, 'filenames') and hasattr(results, 'scores'):
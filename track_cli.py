@@ -0,0 +1,227 @@
+import argparse
+import concurrent.futures
+import csv
+import multiprocessing
+import os
+import sys
+import time
+import cv2
+import numpy as np
+from pipeline import FramePipeline
+from model_server import LocalModel
+from checkpoint import Checkpoint, PartialFile
+
+# 无界面批量追踪：遍历目录中的视频，多个工作进程并行追踪，每个视频输出一个MOT格式的轨迹文件
+# MOT格式每行: frame,id,bb_left,bb_top,bb_width,bb_height,conf,-1,-1,-1（帧号从1开始，未分配ID的框不输出）
+# 已有输出的视频默认跳过，中断后重新运行即可接着处理；summary.csv 记录每个视频的帧数、耗时和处理帧率
+# 处理中的视频定期在输出旁保存断点(.ckpt)，进程崩溃后重新运行会从断点帧继续，而不是从头开始
+# 已处理帧的MOT行逐帧追加到输出旁的.part文件，断点只记录其长度，处理完成后一次写出最终文件
+# 用法: python track_cli.py 视频目录 -o 输出目录 --workers 4 [--format parquet]
+
+VIDEO_EXTS = (".mp4", ".avi", ".mov", ".mkv", ".flv", ".wmv", ".m4v", ".ts")
+MOT_HEADER = ("frame", "id", "bb_left", "bb_top", "bb_width", "bb_height", "conf", "x", "y", "z")
+
+_model = None
+_options = None
+
+
+def find_videos(root, recursive=True):
+    if os.path.isfile(root):
+        return [root]
+    videos = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        videos.extend(os.path.join(dirpath, f) for f in sorted(filenames) if f.lower().endswith(VIDEO_EXTS))
+        if not recursive:
+            break
+    return videos
+
+
+def output_path(video, root, out_dir, fmt):
+    """输出文件保持输入目录的相对结构"""
+    rel = os.path.relpath(video, root) if os.path.isdir(root) else os.path.basename(video)
+    return os.path.join(out_dir, os.path.splitext(rel)[0] + (".parquet" if fmt == "parquet" else ".txt"))
+
+
+def mot_rows(frame_idx, det):
+    """单帧InferenceResult -> MOT行数组 (N, 10)，只保留已分配追踪ID的框"""
+    if det.track_ids is None or not len(det):
+        return np.empty((0, 10), np.float32)
+    boxes = det.boxes
+    rows = np.empty((len(boxes), 10), np.float32)
+    rows[:, 0] = frame_idx + 1
+    rows[:, 1] = det.track_ids
+    rows[:, 2:4] = boxes[:, :2]
+    rows[:, 4:6] = boxes[:, 2:] - boxes[:, :2]
+    rows[:, 6] = det.confs
+    rows[:, 7:] = -1
+    return rows[det.track_ids >= 0]
+
+
+def write_mot(path, rows, fmt="csv"):
+    """先写临时文件再改名，中断时不会留下不完整的输出"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    if fmt == "parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        columns = {name: rows[:, i] for i, name in enumerate(MOT_HEADER)}
+        for name in ("frame", "id"):
+            columns[name] = columns[name].astype(np.int32)
+        pq.write_table(pa.table(columns), tmp)
+    else:
+        with open(tmp, "w", newline="") as f:
+            writer = csv.writer(f)
+            for r in rows.tolist():
+                writer.writerow([int(r[0]), int(r[1]), f"{r[2]:.2f}", f"{r[3]:.2f}", f"{r[4]:.2f}", f"{r[5]:.2f}",
+                                 f"{r[6]:.4f}", -1, -1, -1])
+    os.replace(tmp, path)
+
+
+def _init_worker(options):
+    # 每个工作进程加载一次模型，进程内的各视频共用，每个视频开始时重置追踪器
+    # CPU核心在工作进程间平分，须在加载模型（选择设备、设置PyTorch线程数）之前设置，避免各进程都按全部核心开线程
+    global _model, _options
+    _options = options
+    threads = os.getenv("VRP_NUM_THREADS") or str(max(1, (os.cpu_count() or 1) // options["workers"]))
+    os.environ["VRP_NUM_THREADS"] = threads
+    cv2.setNumThreads(max(1, int(threads) // 2))
+    _model = LocalModel(options["weight"])
+
+
+def track_video(video, out_path):
+    """在工作进程中追踪一个视频，返回统计信息"""
+    options = _options
+    model = _model
+    model.reset()
+    partial = PartialFile(out_path + ".part")
+    errors = []
+    start_frame = 0
+    checkpoint = None
+    if options["checkpoint_interval"] > 0:
+        checkpoint = Checkpoint(out_path + ".ckpt", video, interval=options["checkpoint_interval"])
+        state = checkpoint.load()
+        # .part文件比断点记录的短（被删除或损坏）时无法续跑，从头开始
+        if state is not None and state.get("tracker_config") == options["tracker"] and \
+                partial.open(state.get("rows_offset")):
+            model.restore_tracker(state["tracker"])
+            start_frame = state["frame"]
+    if not start_frame:
+        partial.open()
+
+    # 追踪器状态在推理线程中与本帧结果一起取出，渲染线程写完本帧之前的所有行后写入断点
+    def infer(frame):
+        results = model.track(frame, persist=True, tracker=options["tracker"], conf=options["conf"])
+        return results, model.tracker_state() if checkpoint is not None and checkpoint.due() else False
+
+    def render(frame_idx, frame, output):
+        results, tracker_state = output
+        partial.write(mot_rows(frame_idx, results[0]).tobytes())
+        if tracker_state is not False:
+            checkpoint.save({"frame": frame_idx + 1, "tracker": tracker_state, "tracker_config": options["tracker"],
+                             "rows_offset": partial.flush()})
+
+    t0 = time.perf_counter()
+    pipeline = FramePipeline(
+        video,
+        render,
+        infer_fn=infer,
+        on_error=errors.append,
+        start_frame=start_frame,
+    )
+    pipeline.start()
+    pipeline.wait()
+    seconds = time.perf_counter() - t0
+    partial.close()
+    frames = pipeline.frames_rendered
+    stats = {"video": video, "output": out_path, "frames": frames, "seconds": seconds,
+             "fps": frames / seconds if seconds > 0 else 0.0, "tracks": 0, "status": "ok", "resumed": start_frame}
+    if errors or (frames == 0 and not start_frame):
+        stats["status"] = f"error: {errors[0]}" if errors else "error: 无法读取视频"
+        if checkpoint is None:
+            partial.remove()  # 不续跑时部分结果没有用处；有断点时保留，供下次续跑
+        return stats
+    rows = np.fromfile(partial.path, np.float32).reshape(-1, 10)
+    write_mot(out_path, rows, options["format"])
+    partial.remove()
+    if checkpoint is not None:
+        checkpoint.remove()
+    stats["tracks"] = len(np.unique(rows[:, 1]))
+    return stats
+
+
+def run(args):
+    if args.format == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            sys.exit("输出parquet需要安装pyarrow: pip install pyarrow")
+    videos = find_videos(args.input, not args.no_recursive)
+    jobs = []
+    skipped = 0
+    for video in videos:
+        out_path = output_path(video, args.input, args.output, args.format)
+        if os.path.exists(out_path) and not args.overwrite:
+            skipped += 1
+            continue
+        jobs.append((video, out_path))
+    print(f"共 {len(videos)} 个视频，待处理 {len(jobs)} 个，已有结果跳过 {skipped} 个，工作进程 {args.workers} 个")
+    if not jobs:
+        return 0
+
+    os.makedirs(args.output, exist_ok=True)
+    summary_path = os.path.join(args.output, "summary.csv")
+    new_summary = not os.path.exists(summary_path)
+    options = {"weight": args.weight, "tracker": args.tracker, "conf": args.conf, "format": args.format,
+               "checkpoint_interval": args.checkpoint_interval, "workers": args.workers}
+    total_frames = 0
+    failed = 0
+    t0 = time.perf_counter()
+    # spawn: 工作进程不继承父进程的CUDA上下文
+    ctx = multiprocessing.get_context("spawn")
+    with open(summary_path, "a", newline="", encoding="utf-8") as f, \
+            concurrent.futures.ProcessPoolExecutor(args.workers, mp_context=ctx, initializer=_init_worker,
+                                                   initargs=(options,)) as executor:
+        summary = csv.writer(f)
+        if new_summary:
+            summary.writerow(("video", "output", "frames", "seconds", "fps", "tracks", "status"))
+        futures = {executor.submit(track_video, video, out_path): (video, out_path) for video, out_path in jobs}
+        for i, future in enumerate(concurrent.futures.as_completed(futures), 1):
+            video, out_path = futures[future]
+            try:
+                s = future.result()
+            except Exception as e:
+                s = {"video": video, "output": out_path, "frames": 0, "seconds": 0.0, "fps": 0.0, "tracks": 0,
+                     "status": f"error: {e}", "resumed": 0}
+            if s["status"] != "ok":
+                failed += 1
+            total_frames += s["frames"]
+            summary.writerow((s["video"], s["output"], s["frames"], f"{s['seconds']:.2f}", f"{s['fps']:.1f}",
+                              s["tracks"], s["status"]))
+            f.flush()
+            resumed = f" (从第{s['resumed']}帧续跑)" if s["resumed"] else ""
+            print(f"[{i}/{len(jobs)}] {video}: {s['frames']} 帧{resumed}, {s['seconds']:.1f} s, {s['fps']:.1f} FPS, "
+                  f"{s['tracks']} 个目标, {s['status']}")
+    elapsed = time.perf_counter() - t0
+    print(f"完成: {len(jobs) - failed} 个成功, {failed} 个失败, 共 {total_frames} 帧, 用时 {elapsed:.1f} s, "
+          f"总吞吐 {total_frames / elapsed if elapsed > 0 else 0:.1f} FPS；汇总见 {summary_path}")
+    return 1 if failed else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="无界面批量目标追踪，输出MOT格式轨迹")
+    parser.add_argument("input", help="视频文件或目录")
+    parser.add_argument("-o", "--output", default="tracking_output", help="输出目录")
+    parser.add_argument("--weight", default="yolov8n.pt")
+    parser.add_argument("--tracker", default="bytetrack.yaml", help="bytetrack.yaml 或 botsort.yaml")
+    parser.add_argument("--conf", type=float, default=0.25)
+    parser.add_argument("--workers", type=int, default=max(1, min(4, os.cpu_count() or 1)), help="并行的工作进程数")
+    parser.add_argument("--format", choices=("csv", "parquet"), default="csv")
+    parser.add_argument("--overwrite", action="store_true", help="重新处理已有输出的视频")
+    parser.add_argument("--no-recursive", action="store_true", help="不处理子目录")
+    parser.add_argument("--checkpoint-interval", type=float, default=60.0, help="断点保存间隔（秒），0为不保存")
+    return run(parser.parse_args(argv))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,26 +1,31 @@
 import os
 import cv2
 import time
+import tempfile
 import threading
 import numpy as np
 from PyQt5.QtWidgets import (
     QWidget, QLabel, QPushButton, QComboBox, QFileDialog, QHBoxLayout, QVBoxLayout, QTextEdit, QSizePolicy, QFrame, QMessageBox
 )
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, pyqtSignal
 from PyQt5.QtGui import QPixmap, QImage, QFont
 
 try:
     from ultralytics import YOLO
 except ImportError:
     YOLO = None
-
-def cvimg2qt(img):
-    rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-    h, w, ch = rgb.shape
-    bytes_per_line = ch * w
-    return QPixmap.fromImage(QImage(rgb.data, w, h, bytes_per_line, QImage.Format_RGB888))
+from model_server import shared_model
+from pipeline import FramePipeline
+from video_writer import FrameRecorder
+from renderer import OverlayRenderer
+from checkpoint import Checkpoint, PartialFile, checkpoint_path
+from display import show_frame
 
 class TrackingWindow(QWidget):
+    # 追踪线程 -> UI线程的结果投递（QPixmap和控件只能在UI线程中使用）
+    frame_signal = pyqtSignal(object, object)  # (输入帧, 追踪结果图)
+    info_signal = pyqtSignal(str)
+
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setWindowTitle("目标追踪")
@@ -31,12 +36,25 @@ class TrackingWindow(QWidget):
         self.input_path = None
         self.input_type = None
         self.running = False
-        self.save_frames = []
-        self.track_history = []  # [(frame_idx, [track_info,...])]
+        self.recorder = None  # 追踪结果录制器，后台写盘，内存占用恒定
+        self.history = None  # 追踪记录 (frame_idx, [track_info,...]) 逐帧追加写盘，内存中不保留
+        self.pipeline = None  # 追踪流水线
+        self.checkpoint = None  # 视频输入时定期保存断点，异常退出后可从断点继续
+        self.resume_state = None
+        self.video_start = 0  # 结果视频的起始帧；断点续跑时录制器只包含续跑之后的画面
+        self.renderer = OverlayRenderer()
         self.init_ui()
+        self.frame_signal.connect(self.show_frames)
+        self.info_signal.connect(self.info_text.append)
 
     def closeEvent(self, event):
         self.running = False  # 关闭窗口时自动停止追踪线程
+        if self.pipeline is not None:
+            self.pipeline.stop()
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
+        self.discard_history()
         event.accept()
 
     def init_ui(self):
@@ -91,6 +109,7 @@ class TrackingWindow(QWidget):
         self.info_text = QTextEdit()
         self.info_text.setReadOnly(True)
         self.info_text.setFont(QFont("Consolas", 9))
+        self.info_text.document().setMaximumBlockCount(2000)  # 只保留最近的输出，长时间追踪内存不增长
         main_layout.addWidget(self.info_text, 2)
 
     def on_tracker_type_changed(self, text):
@@ -104,7 +123,7 @@ class TrackingWindow(QWidget):
             cap = cv2.VideoCapture(path)
             ret, img = cap.read()
             if ret:
-                self.input_label.setPixmap(cvimg2qt(img).scaled(self.input_label.size(), Qt.KeepAspectRatio))
+                show_frame(self.input_label, img)
             cap.release()
             self.info_text.append(f"已选择视频: {path}")
 
@@ -117,7 +136,7 @@ class TrackingWindow(QWidget):
             return
         ret, img = cap.read()
         if ret:
-            self.input_label.setPixmap(cvimg2qt(img).scaled(self.input_label.size(), Qt.KeepAspectRatio))
+            show_frame(self.input_label, img)
         cap.release()
         self.info_text.append("已打开摄像头")
 
@@ -128,62 +147,144 @@ class TrackingWindow(QWidget):
         if self.input_path is None:
             QMessageBox.information(self, "提示", "请先上传视频或打开摄像头")
             return
+        if self.pipeline is not None:
+            self.pipeline.stop()
+            self.pipeline.wait()  # 上一次追踪结束后才能删除其追踪记录
         self.running = True
-        self.save_frames = []
-        self.track_history = []
+        if self.recorder is not None:
+            self.recorder.close()
+        self.recorder = FrameRecorder(fps=20)
+        self.discard_history()
+        self.prepare_checkpoint()
+        self.history = self.create_history()
         threading.Thread(target=self.tracking_thread, daemon=True).start()
 
+    def tracker_config(self):
+        return "bytetrack.yaml" if self.tracker_type == "多目标追踪" else "botsort.yaml"
+
+    def prepare_checkpoint(self):
+        """视频输入时创建断点；存在同一视频、同一追踪器的断点且用户选择继续时记下保存的状态"""
+        self.checkpoint = None
+        self.resume_state = None
+        if self.input_type != "视频":
+            return
+        self.checkpoint = Checkpoint(checkpoint_path(self.input_path, tag="tracking"), self.input_path, interval=30)
+        state = self.checkpoint.load()
+        if state is None or state.get("tracker_config") != self.tracker_config():
+            return
+        reply = QMessageBox.question(self, "断点续跑", f"检测到该视频的断点（第{state['frame']}帧），是否从断点继续？",
+                                     QMessageBox.Yes | QMessageBox.No, QMessageBox.Yes)
+        if reply == QMessageBox.Yes:
+            self.resume_state = state
+        else:
+            self.checkpoint.remove()
+
+    def create_history(self):
+        """视频输入时追踪记录写在断点旁，随断点续跑；摄像头输入写临时文件"""
+        if self.checkpoint is not None:
+            return PartialFile(self.checkpoint.path + ".history")
+        fd, path = tempfile.mkstemp(prefix="tracking_", suffix=".history")
+        os.close(fd)
+        return PartialFile(path)
+
+    def discard_history(self):
+        """删除上一次运行的追踪记录；其断点仍在（未追踪完）时保留，供续跑读回"""
+        if self.history is None:
+            return
+        if self.checkpoint is not None and os.path.exists(self.checkpoint.path):
+            self.history.close()
+        else:
+            self.history.remove()
+        self.history = None
+
     def stop_tracking(self):
         self.running = False
+        if self.pipeline is not None:
+            self.pipeline.stop()
         self.info_text.append("已停止追踪")
 
     def tracking_thread(self):
         try:
-            # 选择模型
-            if self.tracker_type == "多目标追踪":
-                model = YOLO("yolov8n.pt")  # 多目标追踪模型
-                tracker = "bytetrack.yaml"
+            # 模型只加载一次（优先由模型服务进程共享），每次开始追踪只重置追踪会话
+            # 单目标追踪可用同一模型，后处理只保留最大目标
+            if self.model is None:
+                self.model = shared_model("yolov8n.pt")
+            model = self.model
+            model.reset()
+            tracker = self.tracker_config()
+
+            recorder = self.recorder
+            checkpoint = self.checkpoint
+            state = self.resume_state
+            start_frame = 0
+            # 追踪记录逐帧追加写盘，断点只保存其偏移；续跑时截断到该偏移，保留断点之前的记录
+            history = self.history
+            if state is not None and history.open(state.get("history_offset")):
+                model.restore_tracker(state["tracker"])
+                start_frame = state["frame"]
+                self.info_signal.emit(f"从断点继续：第{start_frame}帧（结果视频从该帧开始，追踪坐标包含断点之前的记录）")
             else:
-                model = YOLO("yolov8n.pt")  # 单目标追踪可用同一模型，后处理只保留最大目标
-                tracker = "botsort.yaml"
-            cap = cv2.VideoCapture(self.input_path)
-            frame_idx = 0
-            while self.running and cap.isOpened():
-                ret, frame = cap.read()
-                if not ret:
-                    break
-                self.input_label.setPixmap(cvimg2qt(frame).scaled(self.input_label.size(), Qt.KeepAspectRatio))
-                # 推理+追踪
+                history.open()
+            self.video_start = start_frame
+            failed = []
+            reconnects = [getattr(model, "reconnects", 0)]
+
+            # 追踪器状态只能在推理线程中、与本帧结果一起取出，由渲染线程处理完本帧后保存
+            # 模型服务崩溃时RemoteModel自动重连或改为进程内加载，追踪继续、断点照常保存，只是追踪ID从头分配
+            def infer(frame):
                 results = model.track(frame, persist=True, tracker=tracker)
-                result_img = results[0].plot()
+                if getattr(model, "reconnects", 0) != reconnects[0]:
+                    reconnects[0] = model.reconnects
+                    self.info_signal.emit("模型服务连接断开，已重新连接，追踪ID重新开始")
+                return results, model.tracker_state() if checkpoint is not None and checkpoint.due() else False
+
+            # 解码、追踪、渲染三段流水线；追踪依赖帧间状态，只用单个推理线程并严格按帧序处理
+            def render(frame_idx, frame, output):
+                results, tracker_state = output
+                det = results[0]
+                result_img = self.renderer.draw(frame, det)
                 # 解析追踪信息
-                boxes = results[0].boxes
-                ids = boxes.id.cpu().numpy() if hasattr(boxes, 'id') and boxes.id is not None else []
-                xyxy = boxes.xyxy.cpu().numpy() if boxes is not None else []
-                confs = boxes.conf.cpu().numpy() if boxes is not None and hasattr(boxes, 'conf') else []
+                ids = det.track_ids.tolist() if det.track_ids is not None else []
                 info_lines = []
                 track_info = []
-                for i, box in enumerate(xyxy):
-                    tid = int(ids[i]) if i < len(ids) else -1
-                    conf = confs[i] if i < len(confs) else 0
-                    x1, y1, x2, y2 = map(int, box)
+                for i, ((x1, y1, x2, y2), conf) in enumerate(zip(det.boxes_info().tolist(), det.confs.tolist())):
+                    tid = ids[i] if i < len(ids) else -1
                     info_lines.append(f"Frame{frame_idx} ID:{tid} 坐标:({x1},{y1},{x2},{y2}) 置信度:{conf:.2f}")
-                    track_info.append({"id": tid, "bbox": [x1, y1, x2, y2], "conf": float(conf)})
-                self.result_label.setPixmap(cvimg2qt(result_img).scaled(self.result_label.size(), Qt.KeepAspectRatio))
-                self.info_text.append("\n".join(info_lines))
-                self.track_history.append((frame_idx, track_info))
-                self.save_frames.append(result_img.copy())
-                frame_idx += 1
-                cv2.waitKey(1)
-            cap.release()
-            self.info_text.append("追踪完成")
+                    track_info.append({"id": tid, "bbox": [x1, y1, x2, y2], "conf": conf})
+                self.frame_signal.emit(frame, result_img)
+                self.info_signal.emit("\n".join(info_lines))
+                recorder.write(result_img)
+                history.append((frame_idx, track_info))
+                if tracker_state is not False:
+                    checkpoint.save({"frame": frame_idx + 1, "tracker": tracker_state, "tracker_config": tracker,
+                                     "history_offset": history.flush()})
+
+            def on_error(e):
+                failed.append(e)
+                self.info_signal.emit(f"追踪异常: {e}")
+
+            self.pipeline = FramePipeline(
+                self.input_path,
+                render,
+                infer_fn=infer,
+                live=self.input_type == "摄像头",
+                on_error=on_error,
+                start_frame=start_frame,
+            )
+            self.pipeline.start()
+            self.pipeline.wait()
+            history.close()
+            if checkpoint is not None and self.running and not failed:
+                checkpoint.remove()  # 正常处理完整个视频，断点不再需要；追踪记录留待保存，下次开始或关闭窗口时删除
+            self.info_signal.emit("追踪完成")
         except Exception as e:
-            self.info_text.append(f"追踪异常: {e}")
+            self.info_signal.emit(f"追踪异常: {e}")
+
+    def show_frames(self, frame, result_img):
+        show_frame(self.input_label, frame)
+        show_frame(self.result_label, result_img)
 
     def save_results(self):
-        if not self.save_frames:
-            QMessageBox.information(self, "提示", "没有可保存的追踪结果")
-            return
         # 保存视频
         base = "tracking_result"
         ext = "mp4"
@@ -191,16 +292,16 @@ class TrackingWindow(QWidget):
         while os.path.exists(f"{base}_{idx}.{ext}"):
             idx += 1
         video_path = f"{base}_{idx}.{ext}"
-        h, w = self.save_frames[0].shape[:2]
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        out = cv2.VideoWriter(video_path, fourcc, 20, (w, h))
-        for frame in self.save_frames:
-            out.write(frame)
-        out.release()
+        if self.recorder is None or not self.recorder.save(video_path):
+            QMessageBox.information(self, "提示", "没有可保存的追踪结果")
+            return
         # 保存追踪坐标
         txt_path = f"{base}_{idx}.txt"
         with open(txt_path, "w", encoding="utf-8") as f:
-            for frame_idx, track_info in self.track_history:
+            for frame_idx, track_info in self.history.records():
                 for obj in track_info:
                     f.write(f"Frame{frame_idx} ID:{obj['id']} BBox:{obj['bbox']} Conf:{obj['conf']:.2f}\n")
-        QMessageBox.information(self, "保存成功", f"追踪视频: {video_path}\n追踪坐标: {txt_path}")
+        msg = f"追踪视频: {video_path}\n追踪坐标: {txt_path}"
+        if self.video_start:
+            msg += f"\n本次为断点续跑，追踪视频只包含第{self.video_start}帧之后的画面，追踪坐标包含全部帧"
+        QMessageBox.information(self, "保存成功", msg)
@@ -1,68 +1,81 @@
-import cv2
+import copy
 import numpy as np
-from ultralytics import YOLO
+from backend import FPSMeter
+from model_server import shared_model
+from trajectory_store import TrajectoryStore
+from renderer import TrajectoryRenderer
 
 class TrajectoryGenerator:
-    def __init__(self, weight_path='yolov8n.pt', conf=0.3):
-        self.model = YOLO(weight_path)
+    def __init__(self, weight_path='yolov8n.pt', conf=0.3, history=30, grace=15):
+        """
+        history: 每条轨迹保留的点数
+        grace: 目标连续多少帧未检测到后删除其轨迹，短暂遮挡时轨迹可接续
+        """
+        # 权重由模型服务进程共享加载，设备由服务端统一选择；连接服务可能要等服务进程启动，在load中延迟进行
+        self.weight_path = weight_path
+        self.model = None
+        self.fps_meter = FPSMeter()
         self.conf = conf
-        self.track_history = {}  # id: list of (x, y)
+        self.store = TrajectoryStore(history=history, grace=grace)
+        self.track_history = self.store.snapshot()  # 最近一帧的轨迹快照
         self.colors = self._generate_colors(50)
+        self.renderer = TrajectoryRenderer(self.colors, grace=grace)
 
     def _generate_colors(self, n):
         np.random.seed(42)
         return [tuple(np.random.randint(0, 255, 3).tolist()) for _ in range(n)]
 
+    def load(self):
+        """连接模型服务（或进程内加载），可能耗时数秒，应在后台线程中调用；未调用时首次infer会自动加载"""
+        if self.model is None:
+            self.model = shared_model(self.weight_path)
+        return self.model
+
     def reset(self):
-        self.track_history = {}
+        self.store.clear()
+        self.track_history = self.store.snapshot()
+        if self.model is not None:
+            self.model.reset()
 
     def infer(self, img):
-        # 使用YOLO的track接口，指定CUDA
-        results = self.model.track(img, persist=True, device='cuda')
-        boxes = results[0].boxes
+        """
+        使用YOLO的track接口
+        返回 centers, track_history (TrajectorySnapshot，可按 {id: [(x, y), ...]} 使用), bboxes, track_ids, results
+        """
+        model = self.load()
+        with self.fps_meter:
+            results = model.track(img, persist=True)
+        det = results[0]
         centers = []
         bboxes = []
         track_ids = []
-        current_ids = set()
-        # 修复：boxes.id 可能为 None
-        if boxes is not None and hasattr(boxes, 'xywh') and hasattr(boxes, 'id') and boxes.id is not None:
-            xywh = boxes.xywh.cpu().numpy()
-            ids = boxes.id.int().cpu().numpy()
-            for i, (box, tid) in enumerate(zip(xywh, ids)):
-                x, y, w, h = box
-                cx, cy = int(x), int(y)
-                centers.append((cx, cy))
-                x1, y1, x2, y2 = int(x-w/2), int(y-h/2), int(x+w/2), int(y+h/2)
-                bboxes.append((x1, y1, x2, y2))
-                # 轨迹追加，长度超过30则pop(0)
-                if tid not in self.track_history:
-                    self.track_history[tid] = []
-                self.track_history[tid].append((cx, cy))
-                if len(self.track_history[tid]) > 30:
-                    self.track_history[tid].pop(0)
-                track_ids.append(tid)
-                current_ids.add(tid)
-        # 移除未检测到的目标的历史轨迹
-        remove_ids = [tid for tid in self.track_history if tid not in current_ids]
-        for tid in remove_ids:
-            del self.track_history[tid]
+        # 修复：track_ids 可能为 None
+        if det.track_ids is not None and len(det.boxes):
+            boxes = det.boxes
+            xy = ((boxes[:, :2] + boxes[:, 2:]) / 2).astype(int)
+            centers = [tuple(p) for p in xy.tolist()]
+            bboxes = [tuple(b) for b in boxes.astype(int).tolist()]
+            track_ids = [int(t) for t in det.track_ids.tolist()]
+        # 写入环形缓冲区并回收超时未出现的轨迹
+        self.store.update(track_ids, np.array(centers, np.float32).reshape(-1, 2))
+        self.track_history = self.store.snapshot()
         return centers, self.track_history, bboxes, track_ids, results
 
+    def checkpoint_state(self):
+        """追踪器与轨迹存储的当前状态，须在推理线程中刚处理完一帧时调用"""
+        return {"tracker": self.model.tracker_state(), "store": copy.deepcopy(self.store)}
+
+    def restore(self, state):
+        """reset之后调用，从checkpoint_state的结果继续追踪"""
+        self.load().restore_tracker(state.get("tracker"))
+        if state.get("store") is not None:
+            self.store = state["store"]
+            self.track_history = self.store.snapshot()
+
+    def velocity(self, track_ids=None, window=5):
+        """返回 (ids, 速度 (N, 2) 像素/帧, 方向角 (N,) 度)"""
+        return self.store.velocity(track_ids, window)
+
     def draw_trajectories(self, img, track_history, bboxes, track_ids):
-        out = img.copy()
-        # 画框
-        for i, (bbox, tid) in enumerate(zip(bboxes, track_ids)):
-            color = self.colors[tid % len(self.colors)]
-            color = tuple(int(x) for x in color)
-            x1, y1, x2, y2 = bbox
-            cv2.rectangle(out, (x1, y1), (x2, y2), color, 2)
-        # 画轨迹（只画当前帧）
-        for tid, pts in track_history.items():
-            color = self.colors[tid % len(self.colors)]
-            color = tuple(int(x) for x in color)
-            if len(pts) > 1:
-                for i in range(1, len(pts)):
-                    cv2.line(out, pts[i-1], pts[i], color, 5)
-            if pts:
-                cv2.circle(out, pts[-1], 7, color, -1)
-        return out
+        """track_history: infer返回的TrajectorySnapshot；每条轨迹一次polylines，暂时丢失的目标按丢失帧数淡出"""
+        return self.renderer.draw_tracks(img, track_history, bboxes, track_ids)
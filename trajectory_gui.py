@@ -2,18 +2,24 @@ import cv2
 import threading
 import time
 import os
-from PyQt5.QtWidgets import (QWidget, QLabel, QPushButton, QVBoxLayout, QHBoxLayout, QFileDialog, QTextEdit, QMessageBox)
-from PyQt5.QtCore import Qt
+import shutil
+from PyQt5.QtWidgets import (QWidget, QLabel, QPushButton, QVBoxLayout, QHBoxLayout, QFileDialog, QTextEdit, QMessageBox,
+                             QInputDialog)
+from PyQt5.QtCore import Qt, pyqtSignal
 from PyQt5.QtGui import QPixmap, QImage
 from trajectory import TrajectoryGenerator
-
-def cvimg2qt(img):
-    rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-    h, w, ch = rgb.shape
-    bytes_per_line = ch * w
-    return QPixmap.fromImage(QImage(rgb.data, w, h, bytes_per_line, QImage.Format_RGB888))
+from pipeline import FramePipeline
+from video_writer import FrameRecorder
+from trajectory_log import TrajectoryWriter, TrajectoryIndex
+from checkpoint import Checkpoint, checkpoint_path
+from display import show_frame
 
 class TrajectoryWindow(QWidget):
+    # 轨迹线程 -> UI线程的结果投递（QPixmap和控件只能在UI线程中使用）
+    frame_signal = pyqtSignal(object, object)  # (输入帧, 轨迹图)
+    info_signal = pyqtSignal(str)
+    finished_signal = pyqtSignal()
+
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setWindowTitle("轨迹生成")
@@ -26,11 +32,18 @@ class TrajectoryWindow(QWidget):
         self.running = False
         self.paused = False
         self.trajectory_gen = TrajectoryGenerator()
-        self.video_frames = []
-        self.traj_frames = []
-        self.info_lines = []
+        self.recorder = None  # 轨迹结果录制器，后台写盘，内存占用恒定
+        self.traj_log = None  # 轨迹坐标的列式存储，可按区域和时间查询
+        self.log_dir = None
+        self.checkpoint = None  # 视频输入时定期保存断点，异常退出后可从断点继续
+        self.start_frame = 0
+        self.info_file = None  # 逐帧轨迹信息写入记录目录，内存中不保留
         self.thread = None
+        self.pipeline = None  # 轨迹生成流水线
         self.init_ui()
+        self.frame_signal.connect(self.update_display)
+        self.info_signal.connect(self.text_info.append)
+        self.finished_signal.connect(self.on_finished)
 
     def init_ui(self):
         layout = QVBoxLayout(self)
@@ -58,15 +71,19 @@ class TrajectoryWindow(QWidget):
         self.btn_reset.clicked.connect(self.reset_all)
         self.btn_save = QPushButton("保存结果")
         self.btn_save.clicked.connect(self.save_result)
+        self.btn_query = QPushButton("区域查询")
+        self.btn_query.clicked.connect(self.query_region)
         btn_layout.addWidget(self.btn_upload)
         btn_layout.addWidget(self.btn_camera)
         btn_layout.addWidget(self.btn_start)
         btn_layout.addWidget(self.btn_pause)
         btn_layout.addWidget(self.btn_reset)
         btn_layout.addWidget(self.btn_save)
+        btn_layout.addWidget(self.btn_query)
         layout.addLayout(btn_layout)
         self.text_info = QTextEdit()
         self.text_info.setReadOnly(True)
+        self.text_info.document().setMaximumBlockCount(2000)  # 只保留最近的输出，长时间运行内存不增长
         layout.addWidget(self.text_info, 2)
 
     def upload_video(self):
@@ -101,17 +118,23 @@ class TrajectoryWindow(QWidget):
         self.btn_start.setEnabled(False)
         self.btn_upload.setEnabled(False)
         self.btn_camera.setEnabled(False)
-        self.trajectory_gen.reset()
-        self.video_frames = []
-        self.traj_frames = []
-        self.info_lines = []
-        self.thread = threading.Thread(target=self.trajectory_thread, daemon=True)
+        self.discard_recorder()
+        self.recorder = FrameRecorder(fps=20)
+        state = self.prepare_checkpoint()
+        if state is not None:
+            self.open_log(state.get("log_dir"), state.get("log_chunks"))
+            self.append_info(f"从断点继续：第{self.start_frame}帧（结果视频从该帧开始，轨迹记录包含断点之前的数据）")
+        else:
+            self.open_log()
+        self.thread = threading.Thread(target=self.trajectory_thread, args=(state,), daemon=True)
         self.thread.start()
 
     def pause_trajectory(self):
         if not self.running:
             return
         self.paused = not self.paused
+        if self.pipeline is not None:
+            self.pipeline.paused = self.paused
         if self.paused:
             self.btn_pause.setText("继续")
             self.append_info("已暂停。")
@@ -119,57 +142,106 @@ class TrajectoryWindow(QWidget):
             self.btn_pause.setText("暂停")
             self.append_info("继续轨迹生成。")
 
-    def trajectory_thread(self):
-        cap = cv2.VideoCapture(self.input_path)
-        frame_idx = 0
-        while self.running and cap.isOpened():
-            if self.paused:
-                time.sleep(0.1)
-                continue
-            ret, img = cap.read()
-            if not ret:
-                break
-            self.video_frames.append(img.copy())
+    def trajectory_thread(self, state=None):
+        recorder = self.recorder
+        traj_log = self.traj_log
+        info_file = self.info_file
+        checkpoint = self.checkpoint
+        failed = []
+        # 首次运行时在此连接模型服务（可能需等待服务进程启动），不阻塞界面；追踪会话的重置和恢复同样在此进行
+        try:
+            self.trajectory_gen.load()
+            self.trajectory_gen.reset()
+            if state is not None:
+                self.trajectory_gen.restore(state)
+        except Exception as e:
+            failed.append(e)
+            self.append_info(f"模型加载失败: {e}")
+
+        # 解码、推理、渲染三段流水线；轨迹依赖帧间状态，只用单个推理线程并严格按帧序处理
+
+        def infer(img):
+            # track_history是当前帧的轨迹快照，推理线程继续更新时不受影响，可直接交给渲染线程
             centers, track_history, bboxes, track_ids, results = self.trajectory_gen.infer(img)
+            # 追踪器状态只能在推理线程中、与本帧结果一起取出，由渲染线程写完本帧记录后保存
+            state = self.trajectory_gen.checkpoint_state() if checkpoint is not None and checkpoint.due() else None
+            return centers, track_history, bboxes, track_ids, state
+
+        def render(frame_idx, img, output):
+            centers, track_history, bboxes, track_ids, state = output
             traj_img = self.trajectory_gen.draw_trajectories(img, track_history, bboxes, track_ids)
-            self.traj_frames.append(traj_img.copy())
-            self.update_display(img, traj_img)
+            recorder.write(traj_img)
+            traj_log.append(frame_idx, track_ids, centers, bboxes)
+            if state is not None:
+                traj_log.flush()
+                checkpoint.save(dict(state, frame=frame_idx + 1, log_dir=self.log_dir, log_chunks=traj_log.chunks))
+            self.frame_signal.emit(img, traj_img)
             # 展示轨迹坐标
             info_lines = [f"帧{frame_idx}: 检测目标数={len(centers)}"]
             for tid in track_ids:
                 pts = track_history.get(tid, [])
                 info_lines.append(f"目标ID {tid} 轨迹: {pts}")
             info = "\n".join(info_lines)
-            self.info_lines.append(info)
+            info_file.write(info + "\n")
             self.append_info(info)
-            frame_idx += 1
-            cv2.waitKey(1)
-        cap.release()
+
+        def on_error(e):
+            failed.append(e)
+            self.append_info(f"轨迹生成异常: {e}")
+
+        if not failed and self.running:  # 加载模型期间可能已被复位或关闭
+            self.pipeline = FramePipeline(
+                self.input_path,
+                render,
+                infer_fn=infer,
+                live=self.input_type == "摄像头",
+                on_error=on_error,
+                start_frame=self.start_frame,
+            )
+            self.pipeline.paused = self.paused
+            self.pipeline.start()
+            self.pipeline.wait()
+        traj_log.flush()
+        if checkpoint is not None and self.running and not failed:
+            checkpoint.remove()  # 正常处理完整个视频，断点不再需要
         self.running = False
+        self.finished_signal.emit()
+        self.append_info(f"轨迹生成完成！轨迹记录: {self.log_dir}")
+
+    def on_finished(self):
         self.btn_pause.setEnabled(False)
         self.btn_start.setEnabled(True)
         self.btn_upload.setEnabled(True)
         self.btn_camera.setEnabled(True)
-        self.append_info("轨迹生成完成！")
 
     def update_display(self, img, traj_img):
-        h, w = self.label_input.height(), self.label_input.width()
-        self.label_input.setPixmap(cvimg2qt(img).scaled(w, h, Qt.KeepAspectRatio))
-        h2, w2 = self.label_traj.height(), self.label_traj.width()
-        self.label_traj.setPixmap(cvimg2qt(traj_img).scaled(w2, h2, Qt.KeepAspectRatio))
+        show_frame(self.label_input, img)
+        show_frame(self.label_traj, traj_img)
 
     def append_info(self, msg):
-        self.text_info.append(msg)
+        # 可在任意线程调用，经信号在UI线程中追加
+        self.info_signal.emit(msg)
 
-    def reset_all(self):
+    def stop_thread(self):
+        """停止流水线并等待轨迹线程结束，之后才能关闭其正在写入的录制器和轨迹记录"""
         self.running = False
         self.paused = False
+        # 轨迹线程可能正在创建流水线，反复停止直到线程退出
+        while self.thread is not None and self.thread.is_alive():
+            if self.pipeline is not None:
+                self.pipeline.stop()
+            self.thread.join(0.1)
+        if self.pipeline is not None:
+            self.pipeline.stop()
+        self.thread = None
+
+    def reset_all(self):
+        # 追踪会话在下次开始时于轨迹线程中重置，不在界面线程中等待模型服务
+        self.stop_thread()
         self.input_path = None
         self.input_type = None
-        self.trajectory_gen.reset()
-        self.video_frames = []
-        self.traj_frames = []
-        self.info_lines = []
+        self.discard_recorder()
+        self.close_log()
         self.label_input.clear()
         self.label_input.setText("原始视频区")
         self.label_traj.clear()
@@ -181,30 +253,103 @@ class TrajectoryWindow(QWidget):
         self.btn_upload.setEnabled(True)
         self.btn_camera.setEnabled(True)
 
-    def save_result(self):
-        if not self.traj_frames:
-            QMessageBox.information(self, "提示", "没有可保存的轨迹生成结果！")
+    def prepare_checkpoint(self):
+        """视频输入时创建断点；存在该视频的断点且用户选择继续时返回保存的状态"""
+        self.checkpoint = None
+        self.start_frame = 0
+        if self.input_type != "视频":
+            return None
+        self.checkpoint = Checkpoint(checkpoint_path(self.input_path, tag="trajectory"), self.input_path, interval=30)
+        state = self.checkpoint.load()
+        if state is None:
+            return None
+        reply = QMessageBox.question(self, "断点续跑", f"检测到该视频的断点（第{state['frame']}帧），是否从断点继续？",
+                                     QMessageBox.Yes | QMessageBox.No, QMessageBox.Yes)
+        if reply != QMessageBox.Yes:
+            self.checkpoint.remove()
+            return None
+        self.start_frame = state["frame"]
+        return state
+
+    def open_log(self, log_dir=None, keep_chunks=None):
+        """每次运行写入 trajectory_logs 下的新目录；断点续跑时沿用原目录并丢弃断点之后写出的块"""
+        self.close_log()
+        fps = None
+        if self.input_type == "视频":
+            cap = cv2.VideoCapture(self.input_path)
+            fps = cap.get(cv2.CAP_PROP_FPS) or None
+            cap.release()
+        self.log_dir = log_dir or os.path.join("trajectory_logs", time.strftime("%Y%m%d_%H%M%S"))
+        self.traj_log = TrajectoryWriter(self.log_dir, fps=fps, source=str(self.input_path))
+        if keep_chunks is not None:
+            self.traj_log.rollback(keep_chunks)
+        # 行缓冲，随时可直接复制保存；续跑时只记录本次运行的信息
+        self.info_file = open(os.path.join(self.log_dir, "info.txt"), "w", encoding="utf-8", buffering=1)
+
+    def close_log(self):
+        if self.traj_log is not None:
+            self.traj_log.close()
+            self.traj_log = None
+        if self.info_file is not None:
+            self.info_file.close()
+            self.info_file = None
+
+    def query_region(self):
+        if self.traj_log is None:
+            QMessageBox.information(self, "提示", "没有可查询的轨迹记录！")
             return
+        unit = "秒" if self.traj_log.manifest["fps"] else "帧"
+        text, ok = QInputDialog.getText(self, "区域查询", f"区域 x1,y1,x2,y2 [,起始{unit},结束{unit}]：")
+        if not ok or not text.strip():
+            return
+        try:
+            values = [float(v) for v in text.replace("，", ",").split(",")]
+            if len(values) not in (4, 6):
+                raise ValueError("需要4个或6个数值")
+            span = tuple(values[4:]) or None
+            self.traj_log.flush()
+            index = TrajectoryIndex(self.log_dir)
+            t0 = time.perf_counter()
+            if unit == "秒":
+                ids = index.tracks_in_region(values[:4], times=span)
+            else:
+                ids = index.tracks_in_region(values[:4], frames=span)
+            cost = (time.perf_counter() - t0) * 1000
+        except Exception as e:
+            QMessageBox.warning(self, "查询失败", str(e))
+            return
+        self.append_info(f"区域{values[:4]} {unit}范围{span or '全部'}: 目标ID {ids.tolist()}（{index.rows}条记录中查询，耗时{cost:.1f} ms）")
+
+    def discard_recorder(self):
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
+
+    def save_result(self):
         base = "trajectory_result"
         ext = "mp4"
         idx = 1
         while os.path.exists(f"{base}_{idx}.{ext}"):
             idx += 1
         path = f"{base}_{idx}.{ext}"
-        h, w = self.traj_frames[0].shape[:2]
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        out = cv2.VideoWriter(path, fourcc, 20, (w, h))
-        for frame in self.traj_frames:
-            out.write(frame)
-        out.release()
+        if self.recorder is None or not self.recorder.save(path):
+            QMessageBox.information(self, "提示", "没有可保存的轨迹生成结果！")
+            return
         # 保存中间信息和轨迹坐标
         info_path = f"{base}_{idx}_info.txt"
-        with open(info_path, "w", encoding="utf-8") as f:
-            for line in self.info_lines:
-                f.write(line + "\n")
-        QMessageBox.information(self, "保存成功", f"轨迹视频保存为: {path}\n信息保存为: {info_path}")
+        if self.info_file is not None:
+            shutil.copyfile(self.info_file.name, info_path)
+        else:
+            open(info_path, "w").close()
+        msg = f"轨迹视频保存为: {path}\n信息保存为: {info_path}"
+        if self.log_dir:
+            msg += f"\n轨迹记录目录: {self.log_dir}"
+        if self.start_frame:
+            msg += f"\n本次为断点续跑，轨迹视频和信息只包含第{self.start_frame}帧之后的内容，轨迹记录包含全部帧"
+        QMessageBox.information(self, "保存成功", msg)
 
     def closeEvent(self, event):
-        self.running = False
-        self.paused = False
+        self.stop_thread()
+        self.discard_recorder()
+        self.close_log()
         event.accept()
@@ -0,0 +1,310 @@
+import concurrent.futures
+import json
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+# 轨迹持久化：每帧的 (track_id, frame, x, y, bbox) 追加到内存缓冲区，攒满一块后写成一个块目录，每列一个 .npy 文件
+# 查询时各列以内存映射方式打开，只读取实际访问到的页
+# 块内按 (网格单元, 帧号) 排序并记录每个单元的起止行号，即块内的网格索引；index.json 记录每块的帧范围和空间外接框
+# 查询"t1~t2之间经过某区域的目标"：先按帧范围和外接框筛掉无关的块，再只取区域覆盖的网格单元内的行做精确过滤
+
+COLUMNS = ("track_id", "frame", "x", "y", "bbox")
+_DTYPES = {"track_id": np.int32, "frame": np.int32, "x": np.float32, "y": np.float32, "bbox": np.int16}
+INDEX_FILE = "index.json"
+
+
+def _cell_keys(cx, cy):
+    return cy.astype(np.int64) * 65536 + cx.astype(np.int64)
+
+
+class _Chunk:
+    """一个块目录，各列在首次访问时以内存映射方式打开"""
+    def __init__(self, path):
+        self.path = path
+        self.arrays = {}
+
+    def __getitem__(self, name):
+        arr = self.arrays.get(name)
+        if arr is None:
+            arr = self.arrays[name] = np.load(os.path.join(self.path, name + ".npy"), mmap_mode="r")
+        return arr
+
+    @property
+    def rows(self):
+        return len(self["frame"])
+
+
+class TrajectoryWriter:
+    """
+    directory: 输出目录（不存在时创建），同一目录重复打开时在已有块之后继续追加
+    chunk_rows: 每块的行数，攒满后在后台线程写盘
+    cell: 网格单元边长（像素）
+    fps: 帧率，用于按秒查询；摄像头未知帧率时可不填，只按帧号查询
+    """
+    def __init__(self, directory, chunk_rows=65536, cell=64, fps=None, source=None):
+        self.directory = directory
+        self.chunk_rows = chunk_rows
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, INDEX_FILE)
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.manifest = json.load(f)
+        else:
+            self.manifest = {"cell": cell, "fps": fps, "source": source, "start_time": time.time(), "chunks": []}
+            self._save_manifest()
+        self.cell = self.manifest["cell"]
+        self.rows = sum(c["rows"] for c in self.manifest["chunks"])
+        self._buffer = {name: [] for name in COLUMNS}
+        self._buffered = 0
+        self._buffer_lock = threading.Lock()  # 渲染线程追加、界面线程查询前刷新
+        self._lock = threading.Lock()
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="trajectory-log")
+        self._pending = None
+        self._closed = False
+
+    def append(self, frame, track_ids, centers, bboxes):
+        """写入一帧的所有目标；centers: [(x, y)], bboxes: [(x1, y1, x2, y2)]，与track_ids一一对应"""
+        n = len(track_ids)
+        if not n:
+            return
+        centers = np.asarray(centers, np.float32).reshape(-1, 2)
+        with self._buffer_lock:
+            if self._closed:
+                return
+            buf = self._buffer
+            buf["track_id"].append(np.asarray(track_ids, np.int32))
+            buf["frame"].append(np.full(n, frame, np.int32))
+            buf["x"].append(centers[:, 0])
+            buf["y"].append(centers[:, 1])
+            buf["bbox"].append(np.asarray(bboxes, np.int16).reshape(-1, 4))
+            self._buffered += n
+            full = self._buffered >= self.chunk_rows
+        if full:
+            self.flush(wait=False)
+
+    def flush(self, wait=True):
+        """把缓冲区写成新的块；wait=False时在后台线程写盘"""
+        with self._buffer_lock:
+            if self._buffered:
+                columns = {name: np.concatenate(parts) for name, parts in self._buffer.items()}
+                self._buffer = {name: [] for name in COLUMNS}
+                self._buffered = 0
+                # 单个写盘线程按提交顺序写出各块
+                self._pending = self._executor.submit(self._write_chunk, columns)
+            pending = self._pending
+        if wait and pending is not None:
+            pending.result()
+
+    def _write_chunk(self, columns):
+        cx = np.floor(columns["x"] / self.cell)
+        cy = np.floor(columns["y"] / self.cell)
+        keys = _cell_keys(cx, cy)
+        order = np.lexsort((columns["frame"], keys))
+        keys = keys[order]
+        columns = {name: col[order] for name, col in columns.items()}
+        cells, starts = np.unique(keys, return_index=True)
+        name = f"chunk_{len(self.manifest['chunks']):06d}"
+        tmp = os.path.join(self.directory, name + ".tmp")
+        if os.path.exists(tmp):
+            shutil.rmtree(tmp)
+        os.makedirs(tmp)
+        columns.update(cells=cells, starts=starts.astype(np.int64))
+        for col, arr in columns.items():
+            np.save(os.path.join(tmp, col + ".npy"), arr)
+        os.replace(tmp, os.path.join(self.directory, name))
+        with self._lock:
+            self.manifest["chunks"].append({
+                "file": name,
+                "rows": int(len(keys)),
+                "frame_min": int(columns["frame"].min()),
+                "frame_max": int(columns["frame"].max()),
+                "bounds": [float(columns["x"].min()), float(columns["y"].min()),
+                           float(columns["x"].max()), float(columns["y"].max())],
+            })
+            self.rows += len(keys)
+            self._save_manifest()
+
+    def rollback(self, chunks):
+        """只保留前chunks个块，删除之后写出的块（断点续跑时丢弃断点之后的记录）"""
+        self.flush()
+        with self._lock:
+            for chunk in self.manifest["chunks"][chunks:]:
+                path = os.path.join(self.directory, chunk["file"])
+                if os.path.exists(path):
+                    shutil.rmtree(path)
+            del self.manifest["chunks"][chunks:]
+            self.rows = sum(c["rows"] for c in self.manifest["chunks"])
+            self._save_manifest()
+
+    @property
+    def chunks(self):
+        with self._lock:
+            return len(self.manifest["chunks"])
+
+    def _save_manifest(self):
+        tmp = os.path.join(self.directory, INDEX_FILE + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, ensure_ascii=False)
+        os.replace(tmp, os.path.join(self.directory, INDEX_FILE))
+
+    def close(self):
+        with self._buffer_lock:
+            if self._closed:
+                return
+            self._closed = True
+        self.flush()
+        self._executor.shutdown()
+
+
+class TrajectoryIndex:
+    """
+    只读查询 TrajectoryWriter 写出的目录；运行中的目录可调用refresh()读取新写出的块
+    cache_chunks: 保持打开（内存映射）的块数（LRU）
+    """
+    def __init__(self, directory, cache_chunks=1024):
+        self.directory = directory
+        self.cache_chunks = cache_chunks
+        self._cache = OrderedDict()
+        self.refresh()
+
+    def refresh(self):
+        with open(os.path.join(self.directory, INDEX_FILE), encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        self.cell = self.manifest["cell"]
+        self.fps = self.manifest.get("fps")
+        chunks = self.manifest["chunks"]
+        self._frame_ranges = np.array([(c["frame_min"], c["frame_max"]) for c in chunks], np.int64).reshape(-1, 2)
+        self._bounds = np.array([c["bounds"] for c in chunks], np.float32).reshape(-1, 4)
+
+    @property
+    def rows(self):
+        return sum(c["rows"] for c in self.manifest["chunks"])
+
+    def _chunk(self, i):
+        chunk = self._cache.get(i)
+        if chunk is not None:
+            self._cache.move_to_end(i)
+            return chunk
+        chunk = self._cache[i] = _Chunk(os.path.join(self.directory, self.manifest["chunks"][i]["file"]))
+        if len(self._cache) > self.cache_chunks:
+            self._cache.popitem(last=False)
+        return chunk
+
+    def frame_range(self, t1=None, t2=None):
+        """秒 -> 帧号范围，需要写入时提供了fps"""
+        if not self.fps:
+            raise ValueError("轨迹记录未保存帧率，只能按帧号查询")
+        return (None if t1 is None else int(t1 * self.fps), None if t2 is None else int(np.ceil(t2 * self.fps)))
+
+    def _candidates(self, region, f1, f2):
+        keep = np.ones(len(self._frame_ranges), bool)
+        if f1 is not None:
+            keep &= self._frame_ranges[:, 1] >= f1
+        if f2 is not None:
+            keep &= self._frame_ranges[:, 0] <= f2
+        if region is not None:
+            x1, y1, x2, y2 = region
+            b = self._bounds
+            keep &= (b[:, 2] >= x1) & (b[:, 0] <= x2) & (b[:, 3] >= y1) & (b[:, 1] <= y2)
+        return np.flatnonzero(keep).tolist()
+
+    def select(self, region=None, frames=None, times=None, columns=COLUMNS):
+        """
+        返回区域、时间范围内的记录（按列的字典）
+        region: (x1, y1, x2, y2) 像素区域，None为全画面
+        frames: (f1, f2) 帧号范围（含两端）；times: (t1, t2) 秒，二者任选其一，None为不限
+        columns: 需要返回的列，只读取用到的列
+        """
+        f1, f2 = self.frame_range(*times) if times is not None else (frames or (None, None))
+        parts = []
+        for i in self._candidates(region, f1, f2):
+            chunk = self._chunk(i)
+            rows = self._cell_rows(chunk, region) if region is not None else slice(None)
+            frame = chunk["frame"][rows]
+            mask = np.ones(len(frame), bool)
+            if region is not None:
+                x, y = chunk["x"][rows], chunk["y"][rows]
+                x1, y1, x2, y2 = region
+                mask = (x >= x1) & (x <= x2) & (y >= y1) & (y <= y2)
+            if f1 is not None:
+                mask &= frame >= f1
+            if f2 is not None:
+                mask &= frame <= f2
+            if mask.any():
+                rows = np.arange(len(chunk["frame"]))[rows][mask]
+                parts.append({name: chunk[name][rows] for name in columns})
+        if not parts:
+            return {name: np.empty((0, 4) if name == "bbox" else 0, _DTYPES[name]) for name in columns}
+        return {name: np.concatenate([p[name] for p in parts]) for name in columns}
+
+    def _cell_rows(self, chunk, region):
+        """区域覆盖的网格单元在块内对应的行号"""
+        x1, y1, x2, y2 = region
+        cx = np.arange(int(np.floor(x1 / self.cell)), int(np.floor(x2 / self.cell)) + 1)
+        cy = np.arange(int(np.floor(y1 / self.cell)), int(np.floor(y2 / self.cell)) + 1)
+        keys = _cell_keys(*[a.ravel() for a in np.meshgrid(cx, cy)])
+        cells, starts = chunk["cells"], chunk["starts"]
+        pos = np.searchsorted(cells, keys)
+        hit = pos < len(cells)
+        hit[hit] = cells[pos[hit]] == keys[hit]
+        pos = pos[hit]
+        if not len(pos):
+            return pos
+        begin = starts[pos]
+        end = np.append(starts, chunk.rows)[pos + 1]
+        # 把若干 [begin, end) 区间展开为行号
+        lengths = end - begin
+        offsets = np.repeat(begin - np.cumsum(lengths) + lengths, lengths)
+        return offsets + np.arange(lengths.sum())
+
+    def tracks_in_region(self, region, frames=None, times=None):
+        """时间范围内经过region的目标ID（升序）"""
+        return np.unique(self.select(region, frames, times, columns=("track_id",))["track_id"])
+
+    def track(self, track_id, frames=None, times=None):
+        """单个目标的轨迹记录，按帧号排序"""
+        rows = self.select(None, frames, times)
+        mask = rows["track_id"] == track_id
+        order = np.argsort(rows["frame"][mask], kind="stable")
+        return {name: col[mask][order] for name, col in rows.items()}
+
+
+if __name__ == "__main__":
+    import shutil
+    import tempfile
+
+    # 模拟1小时25fps、同时30个目标的轨迹，测试写入与区域查询耗时
+    directory = tempfile.mkdtemp(prefix="vrp_traj_")
+    rng = np.random.default_rng(0)
+    n_frames, n_tracks = 25 * 3600, 30
+    pos = rng.random((n_tracks, 2)) * (1920, 1080)
+    ids = np.arange(n_tracks)
+    writer = TrajectoryWriter(directory, fps=25)
+    t0 = time.perf_counter()
+    for frame in range(n_frames):
+        pos = np.clip(pos + rng.normal(0, 2, pos.shape), 0, (1919, 1079))
+        if frame % 500 == 0:
+            ids = ids + n_tracks  # 定期换一批目标ID
+        boxes = np.concatenate([pos - 20, pos + 20], axis=1)
+        writer.append(frame, ids, pos, boxes)
+    writer.close()
+    t_write = time.perf_counter() - t0
+    size = sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(directory) for f in files)
+    print(f"写入 {writer.rows} 行: {t_write:.1f} s, 占用 {size / 1024 / 1024:.1f} MB, {len(writer.manifest['chunks'])} 块")
+
+    index = TrajectoryIndex(directory)
+    for region, times in [((100, 100, 300, 300), (600, 1200)), ((900, 500, 1000, 600), None), ((0, 0, 1920, 1080), (10, 20))]:
+        index.tracks_in_region(region, times=times)  # 先打开相关的块
+        t0 = time.perf_counter()
+        found = index.tracks_in_region(region, times=times)
+        t_cached = time.perf_counter() - t0
+        index._cache.clear()
+        t0 = time.perf_counter()
+        index.tracks_in_region(region, times=times)
+        t_cold = time.perf_counter() - t0
+        print(f"区域{region} 时间{times}: {len(found)} 个目标, 已打开 {t_cached * 1000:.2f} ms, 重新打开 {t_cold * 1000:.2f} ms")
+    shutil.rmtree(directory)
@@ -0,0 +1,177 @@
+import numpy as np
+
+# 轨迹存储：每个追踪ID占用一个槽位，槽位内是预分配的环形缓冲区，写入新点不移动旧数据
+# ID -> 槽位通过字典索引，空闲槽位复用；目标连续grace帧未出现才回收槽位（短暂遮挡后轨迹可接续）
+# 速度、方向对所有槽位一次性向量化计算
+
+
+class TrajectorySnapshot:
+    """
+    某一帧的轨迹快照（数组已拷贝，可交给渲染线程）
+    ids: (N,) 追踪ID
+    points: (N, history, 2) 按时间从旧到新排列的轨迹点，每条轨迹只有前counts[i]个有效
+    counts: (N,) 有效点数
+    ages: (N,) 距最近一次出现的帧数，0表示当前帧出现
+    兼容旧的 {id: [(x, y), ...]} 字典用法：支持 get/items/keys/in/len
+    """
+    def __init__(self, ids, points, counts, ages):
+        self.ids = ids
+        self.points = points
+        self.counts = counts
+        self.ages = ages
+        self._rows = {int(tid): i for i, tid in enumerate(ids.tolist())}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, tid):
+        return tid in self._rows
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    def __getitem__(self, tid):
+        i = self._rows[tid]
+        return [tuple(p) for p in self.points[i, :self.counts[i]].astype(int).tolist()]
+
+    def get(self, tid, default=None):
+        return self[tid] if tid in self._rows else default
+
+    def keys(self):
+        return self._rows.keys()
+
+    def items(self):
+        return ((tid, self[tid]) for tid in self._rows)
+
+
+class TrajectoryStore:
+    """
+    history: 每条轨迹保留的点数
+    grace: 目标连续多少帧未出现后删除其轨迹（0表示一帧未出现即删除）
+    capacity: 初始槽位数，不够时自动翻倍
+    """
+    def __init__(self, history=30, grace=15, capacity=64):
+        self.history = history
+        self.grace = grace
+        self.frame = 0
+        self._alloc(capacity)
+
+    def _alloc(self, capacity):
+        self.points = np.zeros((capacity, self.history, 2), np.float32)
+        self.head = np.zeros(capacity, np.int64)       # 下一个写入位置
+        self.count = np.zeros(capacity, np.int64)      # 有效点数
+        self.last_seen = np.zeros(capacity, np.int64)  # 最近出现的帧号
+        self.ids = np.full(capacity, -1, np.int64)     # 槽位对应的追踪ID，-1为空闲
+        self.index = {}                                # 追踪ID -> 槽位
+        self.free = list(range(capacity - 1, -1, -1))
+
+    def _grow(self):
+        old = len(self.ids)
+        for name in ("points", "head", "count", "last_seen", "ids"):
+            arr = getattr(self, name)
+            grown = np.zeros((old * 2,) + arr.shape[1:], arr.dtype)
+            grown[:old] = arr
+            setattr(self, name, grown)
+        self.ids[old:] = -1
+        self.free.extend(range(old * 2 - 1, old - 1, -1))
+
+    def clear(self):
+        self.frame = 0
+        self._alloc(len(self.ids))
+
+    def __len__(self):
+        return len(self.index)
+
+    def slots(self, track_ids):
+        """返回追踪ID对应的槽位数组，新ID分配槽位"""
+        slots = np.empty(len(track_ids), np.int64)
+        for i, tid in enumerate(track_ids):
+            slot = self.index.get(tid)
+            if slot is None:
+                if not self.free:
+                    self._grow()
+                slot = self.index[tid] = self.free.pop()
+                self.ids[slot] = tid
+                self.head[slot] = 0
+                self.count[slot] = 0
+            slots[i] = slot
+        return slots
+
+    def update(self, track_ids, centers):
+        """
+        写入一帧的目标中心点，并回收超过grace帧未出现的轨迹
+        track_ids: (N,) 追踪ID; centers: (N, 2) 中心点坐标
+        """
+        self.frame += 1
+        if len(track_ids):
+            slots = self.slots(track_ids)
+            self.points[slots, self.head[slots]] = np.asarray(centers, np.float32).reshape(-1, 2)
+            self.head[slots] = (self.head[slots] + 1) % self.history
+            self.count[slots] = np.minimum(self.count[slots] + 1, self.history)
+            self.last_seen[slots] = self.frame
+        stale = np.flatnonzero((self.ids >= 0) & (self.frame - self.last_seen > self.grace))
+        for slot in stale.tolist():
+            del self.index[int(self.ids[slot])]
+            self.ids[slot] = -1
+            self.count[slot] = 0
+            self.free.append(slot)
+
+    def active(self):
+        return np.flatnonzero(self.ids >= 0)
+
+    def ordered(self, slots):
+        """按时间从旧到新取出槽位的轨迹点，返回 (points (N, history, 2), counts (N,))"""
+        counts = self.count[slots]
+        offsets = (self.head[slots] - counts)[:, None] + np.arange(self.history)
+        return self.points[slots[:, None], offsets % self.history], counts
+
+    def snapshot(self):
+        slots = self.active()
+        points, counts = self.ordered(slots)
+        return TrajectorySnapshot(self.ids[slots].copy(), points, counts, self.frame - self.last_seen[slots])
+
+    def velocity(self, track_ids=None, window=5):
+        """
+        各轨迹最近window个观测点的平均速度（像素/帧，缺帧不插值）与方向（度，图像坐标系，0为向右，90为向下）
+        返回 (ids (N,), velocity (N, 2), heading (N,))；点数不足2的轨迹速度为0
+        """
+        slots = self.active() if track_ids is None else np.array([self.index[t] for t in track_ids if t in self.index], np.int64)
+        steps = np.clip(np.minimum(self.count[slots] - 1, window), 0, None)
+        last = self.points[slots, (self.head[slots] - 1) % self.history]
+        first = self.points[slots, (self.head[slots] - 1 - steps) % self.history]
+        velocity = (last - first) / np.maximum(steps, 1)[:, None]
+        heading = np.degrees(np.arctan2(velocity[:, 1], velocity[:, 0]))
+        return self.ids[slots].copy(), velocity, heading
+
+
+if __name__ == "__main__":
+    import time
+
+    # 对比：字典+列表pop(0)的旧实现 与 环形缓冲区，500个目标、每帧随机10%目标缺失
+    rng = np.random.default_rng(0)
+    n_ids, n_frames, history = 500, 300, 30
+    frames = []
+    for f in range(n_frames):
+        ids = np.flatnonzero(rng.random(n_ids) > 0.1)
+        frames.append((ids, rng.random((len(ids), 2)) * 1000))
+
+    t0 = time.perf_counter()
+    track_history = {}
+    for ids, centers in frames:
+        for tid, (cx, cy) in zip(ids.tolist(), centers.tolist()):
+            track_history.setdefault(tid, []).append((int(cx), int(cy)))
+            if len(track_history[tid]) > history:
+                track_history[tid].pop(0)
+        current = set(ids.tolist())
+        for tid in [t for t in track_history if t not in current]:
+            del track_history[tid]
+    t_list = time.perf_counter() - t0
+
+    store = TrajectoryStore(history=history, grace=5)
+    t0 = time.perf_counter()
+    for ids, centers in frames:
+        store.update(ids.tolist(), centers)
+    t_ring = time.perf_counter() - t0
+    ids, velocity, heading = store.velocity()
+    print(f"列表实现: {t_list / n_frames * 1000:.2f} ms/帧  环形缓冲区: {t_ring / n_frames * 1000:.2f} ms/帧")
+    print(f"活动轨迹: {len(store)}  速度示例: {velocity[0]}  方向: {heading[0]:.1f}°")
@@ -1,219 +1,319 @@
 import cv2
 import time
-import requests
-import base64
-import hashlib
 import numpy as np
 import os
+import sys
+import threading
 from ultralytics import YOLO
+from backend import get_device
+from alert_dispatcher import AlertDispatcher
+from jpeg_encoder import SnapshotEncoder
+from motion_gate import MotionGate
 from collections import defaultdict
 from datetime import datetime, timedelta
 
+class StreamState:
+    """单路视频流的状态：解码线程写入最新帧，调度线程取走做批量推理；报警缓存与冷却按路独立"""
+    def __init__(self, name, source, gate=None):
+        self.name = name
+        self.source = source
+        # 摄像头/网络流只保留最新帧；本地文件逐帧处理，解码线程等待上一帧被取走
+        self.live = not isinstance(source, str) or source.startswith(("rtsp://", "rtmp://", "http://", "https://"))
+        self.cap = None
+        self.latest = None  # (frame_idx, frame)
+        self.frame_idx = 0
+        self.frames_read = 0
+        self.frames_dropped = 0
+        self.finished = False
+        self.best_detections = defaultdict(float)  # {filename: confidence}
+        self.best_images = {}  # {filename: JPEG字节}，发送警报时直接使用
+        # 快照编码器按路保存历史，同一摄像头画面的大小预测更准
+        self.encoder = SnapshotEncoder(byte_budget=2 * 1024 * 1024 - 1)
+        self.last_alert_time = datetime.min  # 上次警报时间
+        self.consumed = threading.Event()
+        self.consumed.set()
+        # 运动门控：画面静止时不送检测模型，None表示逐帧检测
+        self.gate = gate
+
 class RealTimePersonDetector:
-    def __init__(self, webhook_url):
+    def __init__(self, webhook_url, sources=None, weight_path='yolov8l.pt', max_batch=8, motion_gate=True):
+        """
+        sources: 视频源列表（摄像头编号、RTSP地址或视频文件），默认只有本机摄像头0
+        max_batch: 一次前向推理最多合并的帧数；所有视频流共享同一个模型
+        motion_gate: True使用默认参数的MotionGate，也可传入参数字典；False逐帧检测
+        """
         # 初始化YOLOv8模型
-        self.model = YOLO('yolov8l.pt')  # 使用nano版本轻量模型
-        self.cap = cv2.VideoCapture(0)
+        self.model = YOLO(weight_path)
+        self.device = get_device()
         self.webhook_url = webhook_url
+        # 警报在后台线程发送（长连接、重试、限流），检测吞吐不受Webhook延迟影响
+        self.dispatcher = AlertDispatcher(webhook_url)
+        self.max_batch = max_batch
+        gate_args = motion_gate if isinstance(motion_gate, dict) else {}
+        self.streams = [StreamState(f"cam{i}", src, MotionGate(**gate_args) if motion_gate else None)
+                        for i, src in enumerate(sources if sources is not None else [0])]
+        self._ready = threading.Condition()
+        self._stop = threading.Event()
+        self._threads = []
         
         # 人体检测相关配置
         self.class_id = 0  # YOLO模型中人的类别ID
         self.min_conf = 0.6  # 最小置信度阈值
         self.best_shots = 1  # 最多保存的置信度最高的图片数量
         
-        # 冷却机制配置
-        self.last_alert_time = datetime.min  # 上次警报时间
+        # 冷却机制配置（每路独立计时）
         self.alert_cooldown = timedelta(seconds=1)  # 警报冷却时间(5秒)
         
-        # 置信度最高的图片缓存
-        self.best_detections = defaultdict(float)  # {filename: confidence}
-        
         # 创建保存目录
         os.makedirs('detections', exist_ok=True)
-        
+
+    # ---------------- 解码 ----------------
+    def open_stream(self, stream):
+        cap = cv2.VideoCapture(stream.source)
+        if isinstance(stream.source, int):
+            # 设置视频编解码器（解决部分系统的兼容性问题）
+            cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))
+            cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
+            cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+        stream.cap = cap
+        return cap
+
+    def decode_loop(self, stream):
+        """每路一个解码线程，只做读帧，不做任何推理"""
+        cap = self.open_stream(stream)
+        try:
+            while not self._stop.is_set() and cap.isOpened():
+                if not stream.live:
+                    # 文件源不丢帧：等待调度线程取走上一帧
+                    while not stream.consumed.wait(0.1):
+                        if self._stop.is_set():
+                            return
+                success, frame = cap.read()
+                if not success:
+                    if stream.live:
+                        print(f"Warning: [{stream.name}] Failed to read frame")
+                        time.sleep(0.1)  # 短暂等待后重试
+                        continue
+                    break
+                if stream.gate is not None and not stream.gate.should_infer(frame):
+                    # 画面无变化，跳过该帧（门控在各路解码线程中并行计算）
+                    continue
+                with self._ready:
+                    if stream.latest is not None:
+                        stream.frames_dropped += 1
+                    stream.latest = (stream.frame_idx, frame)
+                    stream.frame_idx += 1
+                    stream.frames_read += 1
+                    stream.consumed.clear()
+                    self._ready.notify()
+        finally:
+            cap.release()
+            with self._ready:
+                stream.finished = True
+                self._ready.notify()
+
+    # ---------------- 推理调度 ----------------
+    def next_batch(self, timeout=0.1):
+        """取出各路当前的最新帧组成一个批次，最多max_batch帧；各路轮流优先，避免某路长期饿死"""
+        with self._ready:
+            if not any(s.latest is not None for s in self.streams):
+                self._ready.wait(timeout)
+            batch = []
+            for stream in self.streams:
+                if stream.latest is not None and len(batch) < self.max_batch:
+                    batch.append((stream, stream.latest[1]))
+                    stream.latest = None
+                    stream.consumed.set()
+            if batch and len(self.streams) > self.max_batch:
+                # 轮转顺序，下一批从未被选中的流开始
+                self.streams = self.streams[len(batch):] + self.streams[:len(batch)]
+            return batch
+
+    def parse_detections(self, result, current_time):
+        """解析单帧推理结果中的人体检测"""
+        detections = []
+        boxes = result.boxes
+        if boxes is None or not len(boxes):
+            return detections
+        xyxy = boxes.xyxy.cpu().numpy().astype(int)
+        cls = boxes.cls.cpu().numpy()
+        confs = boxes.conf.cpu().numpy()
+        for (x1, y1, x2, y2), c, conf in zip(xyxy.tolist(), cls, confs.tolist()):
+            if c == self.class_id and conf >= self.min_conf:
+                # 计算检测区域面积和中心点
+                area = (x2 - x1) * (y2 - y1)
+                center_x = (x1 + x2) // 2
+                center_y = (y1 + y2) // 2
+                
+                detections.append({
+                    'confidence': conf,
+                    'bbox': (x1, y1, x2, y2),
+                    'area': area,
+                    'center': (center_x, center_y),
+                    'timestamp': current_time
+                })
+        return detections
+
+    def detect_batch(self, frames):
+        """所有路的帧合并为一次前向推理，返回每帧的检测列表"""
+        results = self.model.predict(frames, device=self.device, verbose=False)
+        current_time = datetime.now()
+        return [self.parse_detections(result, current_time) for result in results]
+
     def process_frame(self):
-        """处理视频帧并进行人体检测"""
-        success, frame = self.cap.read()
+        """处理首路视频的一帧并进行人体检测（单路同步调用接口）"""
+        stream = self.streams[0]
+        cap = stream.cap if stream.cap is not None else self.open_stream(stream)
+        success, frame = cap.read()
         if not success:
             print("Warning: Failed to read frame")
             return [], None  # 返回空列表和None
-        
-        # 运行YOLO检测
-        results = self.model.predict(frame, verbose=False)
-        
-        detections = []
-        current_time = datetime.now()
-        
-        # 解析检测结果
-        for result in results:
-            for box in result.boxes:
-                if box.cls == self.class_id and box.conf >= self.min_conf:
-                    conf = float(box.conf)
-                    x1, y1, x2, y2 = map(int, box.xyxy[0].tolist())
-                    
-                    # 计算检测区域面积和中心点
-                    area = (x2 - x1) * (y2 - y1)
-                    center_x = (x1 + x2) // 2
-                    center_y = (y1 + y2) // 2
-                    
-                    detections.append({
-                        'confidence': conf,
-                        'bbox': (x1, y1, x2, y2),
-                        'area': area,
-                        'center': (center_x, center_y),
-                        'timestamp': current_time
-                    })
-        
+        if stream.gate is not None and not stream.gate.should_infer(frame):
+            return [], frame
+        detections = self.detect_batch([frame])[0]
+        if stream.gate is not None:
+            stream.gate.update(bool(detections))
         return detections, frame
-    
-    def save_frame(self, frame, max_confidence, timestamp):
-        """保存整个画面而非裁剪区域"""
+
+    def save_frame(self, frame, max_confidence, timestamp, stream=None):
+        """保存整个画面而非裁剪区域；stream为None时记入首路"""
+        stream = stream or self.streams[0]
         if frame.size == 0:  # 确保帧有效
             return None
             
-        # 压缩图像 (确保 < 2MB)
-        quality = 95
-        while quality >= 30:
-            _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
-            img_bytes = buffer.tobytes()
-            if len(img_bytes) < 2 * 1024 * 1024:  # 小于2MB
-                break
-            quality -= 5
+        # 压缩图像 (确保 < 2MB)，质量由小图探测预测，原图通常只编码一次
+        img_bytes = stream.encoder.encode(frame).tobytes()
         
         # 生成唯一文件名
         timestamp_str = timestamp.strftime("%Y%m%d_%H%M%S_%f")
-        filename = f"detections/person_{timestamp_str}_{max_confidence:.2f}.jpg"
+        filename = f"detections/{stream.name}_person_{timestamp_str}_{max_confidence:.2f}.jpg"
         
         # 保存图像
         with open(filename, 'wb') as f:
             f.write(img_bytes)
         
         # 更新最佳检测缓存
-        self.update_best_detections(filename, max_confidence)
+        self.update_best_detections(filename, max_confidence, stream, img_bytes)
         
         return filename, img_bytes
     
-    def update_best_detections(self, filename, confidence):
-        """更新置信度最高的图片缓存"""
+    def update_best_detections(self, filename, confidence, stream=None, img_bytes=None):
+        """更新该路置信度最高的图片缓存"""
+        stream = stream or self.streams[0]
+        best_detections = stream.best_detections
         # 如果已存在相同的置信度，增加微小偏差确保唯一性
-        while confidence in self.best_detections.values():
+        while confidence in best_detections.values():
             confidence += 0.001
         
         # 添加新检测
-        self.best_detections[filename] = confidence
+        best_detections[filename] = confidence
+        if img_bytes is not None:
+            stream.best_images[filename] = img_bytes
         
         # 如果超过最大数量，移除置信度最低的
-        if len(self.best_detections) > self.best_shots:
-            min_conf_filename = min(self.best_detections, key=self.best_detections.get)
-            self.best_detections.pop(min_conf_filename)
+        if len(best_detections) > self.best_shots:
+            min_conf_filename = min(best_detections, key=best_detections.get)
+            best_detections.pop(min_conf_filename)
+            stream.best_images.pop(min_conf_filename, None)
     
-    def send_wechat_alert(self):
-        """向企业微信发送警报"""
-        if not self.best_detections:
+    def send_wechat_alert(self, stream=None):
+        """把该路的警报交给后台发送队列，立即返回，不阻塞检测循环"""
+        stream = stream or self.streams[0]
+        if not stream.best_detections:
             return False
             
-        # 发送文本消息
+        # 文本消息
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        text_msg = {
-            "msgtype": "text",
-            "text": {
-                "content": f"⚠️ 实时检测到人员！\n时间：{timestamp}\n将发送{len(self.best_detections)}张置信度最高的图片"
-            }
-        }
-        requests.post(self.webhook_url, json=text_msg)
+        messages = [AlertDispatcher.text_message(
+            f"⚠️ 实时检测到人员！\n视频源：{stream.name} ({stream.source})\n时间：{timestamp}\n将发送{len(stream.best_detections)}张置信度最高的图片"
+        )]
         
-        # 发送置信度最高的图片
-        for filename, conf in sorted(self.best_detections.items(), key=lambda x: x[1], reverse=True):
-            try:
-                # 读取之前保存的文件
-                with open(filename, 'rb') as f:
-                    img_bytes = f.read()
-                
-                # 准备图片数据
-                md5_hash = hashlib.md5(img_bytes).hexdigest()
-                base64_data = base64.b64encode(img_bytes).decode('utf-8')
-                
-                # 构建图片消息
-                image_msg = {
-                    "msgtype": "image",
-                    "image": {
-                        "base64": base64_data,
-                        "md5": md5_hash
-                    }
-                }
-                
-                # 发送图片
-                requests.post(self.webhook_url, json=image_msg)
-                
-                # 添加置信度文本
-                conf_text = {
-                    "msgtype": "text",
-                    "text": {
-                        "content": f"置信度: {conf:.3f}"
-                    }
-                }
-                requests.post(self.webhook_url, json=conf_text)
-                
-                # 小延迟避免消息阻塞
-                time.sleep(0.2)
-            except Exception as e:
-                print(f"发送图片失败: {e}")
+        # 置信度最高的图片，直接使用保存时的内存字节，不再回读文件
+        for filename, conf in sorted(stream.best_detections.items(), key=lambda x: x[1], reverse=True):
+            img_bytes = stream.best_images.get(filename)
+            if img_bytes is None:
+                continue
+            messages.append(AlertDispatcher.image_message(img_bytes))
+            # 添加置信度文本
+            messages.append(AlertDispatcher.text_message(f"置信度: {conf:.3f}"))
+        
+        self.dispatcher.submit(messages)
         
         # 清空缓存准备下一轮检测
-        self.best_detections.clear()
+        stream.best_detections.clear()
+        stream.best_images.clear()
         return True
     
+    def handle_detections(self, stream, frame, detections, current_time):
+        """单路的报警逻辑：冷却判断、保存画面、发送警报，状态只作用于该路"""
+        if stream.gate is not None:
+            stream.gate.update(bool(detections))
+        # 检查是否在冷却期
+        in_cooldown = current_time - stream.last_alert_time < self.alert_cooldown
+        
+        # 计算当前帧的最大置信度
+        max_confidence = max([d['confidence'] for d in detections]) if detections else 0.0
+        
+        # 如果检测到人且不在冷却期，保存并发送警报
+        if detections and not in_cooldown:
+            # 保存整个画面
+            self.save_frame(frame, max_confidence, current_time, stream)
+            
+            if self.send_wechat_alert(stream):
+                stream.last_alert_time = current_time
+                print(f"[{stream.name}] 警报已发送: {stream.last_alert_time.strftime('%H:%M:%S')}")
+        return in_cooldown, max_confidence
+
+    def start(self):
+        """为每路视频源启动解码线程"""
+        self._stop.clear()
+        self._threads = [threading.Thread(target=self.decode_loop, args=(stream,), daemon=True)
+                         for stream in self.streams]
+        for t in self._threads:
+            t.start()
+
+    def stop(self):
+        self._stop.set()
+        for t in self._threads:
+            t.join(timeout=2)
+        self._threads = []
+
     def run_detection(self):
-        """运行实时检测循环"""
+        """运行实时检测循环：解码线程并行读帧，本线程把各路最新帧合批送入共享模型"""
         print("启动实时人体检测系统...")
+        print(f"视频源: {[s.source for s in self.streams]}")
         print(f"最小置信度阈值: {self.min_conf}")
         print(f"保存最佳检测数: {self.best_shots}")
         
-        # 设置视频编解码器（解决部分系统的兼容性问题）
-        self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))
-        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-        
+        self.start()
         try:
-            while self.cap.isOpened():
-                # 处理当前帧
-                detections, frame = self.process_frame()
-                
-                # 如果帧读取失败，跳过本次循环
-                if frame is None:
-                    time.sleep(0.1)  # 短暂等待后重试
-                    continue
-                
-                current_time = datetime.now()
-                
-                # 检查是否在冷却期
-                in_cooldown = current_time - self.last_alert_time < self.alert_cooldown
-                
-                # 计算当前帧的最大置信度
-                max_confidence = max([d['confidence'] for d in detections]) if detections else 0.0
-                
-                # 如果检测到人且不在冷却期，保存并发送警报
-                if detections and not in_cooldown:
-                    # 保存整个画面
-                    self.save_frame(frame, max_confidence, current_time)
-                    
-                    if self.send_wechat_alert():
-                        self.last_alert_time = current_time
-                        print(f"警报已发送: {self.last_alert_time.strftime('%H:%M:%S')}")
-                
-                # 显示状态信息
-                # self.display_status(frame, detections, in_cooldown, max_confidence)
+            while not all(s.finished and s.latest is None for s in self.streams):
+                batch = self.next_batch()
+                if batch:
+                    frames = [frame for _, frame in batch]
+                    current_time = datetime.now()
+                    for (stream, frame), detections in zip(batch, self.detect_batch(frames)):
+                        in_cooldown, max_confidence = self.handle_detections(stream, frame, detections, current_time)
+                        
+                        # 显示状态信息
+                        # self.display_status(frame, detections, in_cooldown, max_confidence, stream)
                 
                 # 按ESC退出
                 if cv2.waitKey(1) & 0xFF == 27:
                     break
         finally:
-            self.cap.release()
+            self.stop()
+            # 发送完队列中剩余的警报
+            self.dispatcher.close()
+            for stream in self.streams:
+                if stream.gate is not None:
+                    print(f"[{stream.name}] 运动门控跳过 {stream.gate.skip_ratio:.1%} 的帧")
             cv2.destroyAllWindows()
             print("系统已安全关闭")
     
-    def display_status(self, frame, detections, in_cooldown, max_confidence):
+    def display_status(self, frame, detections, in_cooldown, max_confidence, stream=None):
         """在画面上显示检测状态"""
+        stream = stream or self.streams[0]
         # 显示检测数量
         status_text = f"Detections: {len(detections)}"
         cv2.putText(frame, status_text, (10, 30), 
@@ -231,7 +331,7 @@ class RealTimePersonDetector:
                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, state_color, 2)
         
         # 显示最佳检测数量
-        best_text = f"Best shots: {len(self.best_detections)}/{self.best_shots}"
+        best_text = f"Best shots: {len(stream.best_detections)}/{self.best_shots}"
         cv2.putText(frame, best_text, (frame.shape[1]-150, 60), 
                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (200, 0, 200), 2)
         
@@ -253,12 +353,16 @@ class RealTimePersonDetector:
                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1)
         
         # 显示预览画面
-        cv2.imshow('Real-time Person Detection', frame)
+        cv2.imshow(f'Real-time Person Detection - {stream.name}', frame)
 
 if __name__ == "__main__":
     # 配置企业微信机器人Webhook URL
     WEBHOOK_URL = "https://qyapi.weixin.qq.com/cgi-bin/webhook/send?key=a7b71c9f-8b6f-4158-8249-663e2dbc12d4"
     
+    # 视频源：命令行参数给出摄像头编号、RTSP地址或视频文件，可多路，默认本机摄像头
+    # 例: python video.py 0 rtsp://192.168.1.10/stream1 test.mp4
+    sources = [int(arg) if arg.isdigit() else arg for arg in sys.argv[1:]] or [0]
+    
     # 创建并运行检测器
-    detector = RealTimePersonDetector(WEBHOOK_URL)
+    detector = RealTimePersonDetector(WEBHOOK_URL, sources=sources)
     detector.run_detection()
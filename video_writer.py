@@ -0,0 +1,125 @@
+import os
+import queue
+import shutil
+import tempfile
+import threading
+from collections import deque
+import cv2
+import numpy as np
+
+# 结果视频录制：后台线程编码，结果帧通过有界队列交给编码线程，不再把所有帧堆在内存里
+# stream模式: 帧产生即写入临时视频文件，保存时移动到目标路径，内存占用与时长无关
+# ring模式: 只保留最近N秒的帧（JPEG压缩后存放），保存时写出这段视频，适合长时间摄像头监控
+
+_END = object()
+_FLUSH = object()
+
+
+class FrameRecorder:
+    MODE_STREAM = "stream"
+    MODE_RING = "ring"
+
+    def __init__(self, mode=MODE_STREAM, fps=20, seconds=30, fourcc='mp4v', quality=90, queue_size=32):
+        if mode not in (self.MODE_STREAM, self.MODE_RING):
+            raise ValueError(f"未知录制模式: {mode}")
+        self.mode = mode
+        self.fps = fps
+        self.fourcc = fourcc
+        self.quality = quality
+        self.frames = 0  # 当前可保存的帧数
+        self.size = None  # (w, h)，以第一帧为准
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._ring = deque(maxlen=max(1, int(seconds * fps)))
+        self._writer = None
+        self._tmp_path = None
+        self._flushed = threading.Event()
+        self._closed = False
+        self._thread = threading.Thread(target=self._encode_loop, daemon=True)
+        self._thread.start()
+
+    def __len__(self):
+        return self.frames
+
+    def write(self, frame):
+        """提交一帧，队列满时阻塞等待编码线程（背压），不会丢帧"""
+        if self._closed or frame is None:
+            return
+        self._queue.put(frame)
+
+    def save(self, path):
+        """把已录制的内容写到path，返回是否有内容被保存；stream模式保存后继续录制到新的临时文件"""
+        self._flush()
+        with self._lock:
+            if self.frames == 0:
+                return False
+            if self.mode == self.MODE_STREAM:
+                self._release_writer()
+                shutil.move(self._tmp_path, path)
+                self._tmp_path = None
+                self.frames = 0
+                return True
+            encoded = list(self._ring)
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*self.fourcc), self.fps, self.size)
+        for buf in encoded:
+            writer.write(cv2.imdecode(np.frombuffer(buf, np.uint8), cv2.IMREAD_COLOR))
+        writer.release()
+        return True
+
+    def close(self):
+        """停止编码线程并删除未保存的临时文件"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_END)
+        self._thread.join()
+        with self._lock:
+            self._release_writer()
+            if self._tmp_path and os.path.exists(self._tmp_path):
+                os.remove(self._tmp_path)
+            self._tmp_path = None
+            self._ring.clear()
+            self.frames = 0
+
+    def _flush(self):
+        if self._closed:
+            return
+        self._flushed.clear()
+        self._queue.put(_FLUSH)
+        self._flushed.wait()
+
+    def _release_writer(self):
+        if self._writer is not None:
+            self._writer.release()
+            self._writer = None
+
+    def _encode_loop(self):
+        while True:
+            frame = self._queue.get()
+            if frame is _END:
+                break
+            if frame is _FLUSH:
+                self._flushed.set()
+                continue
+            with self._lock:
+                self._encode(frame)
+
+    def _encode(self, frame):
+        if frame.ndim == 2:
+            frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+        if self.size is None:
+            self.size = (frame.shape[1], frame.shape[0])
+        elif (frame.shape[1], frame.shape[0]) != self.size:
+            frame = cv2.resize(frame, self.size)
+        if self.mode == self.MODE_RING:
+            ok, buf = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+            if ok:
+                self._ring.append(buf.tobytes())
+                self.frames = len(self._ring)
+            return
+        if self._writer is None:
+            fd, self._tmp_path = tempfile.mkstemp(suffix='.mp4', prefix='vrp_record_')
+            os.close(fd)
+            self._writer = cv2.VideoWriter(self._tmp_path, cv2.VideoWriter_fourcc(*self.fourcc), self.fps, self.size)
+        self._writer.write(frame)
+        self.frames += 1
@@ -1,66 +1,158 @@
 # 通义千问2-VL-2B 图像理解API调用（支持图片、视频帧、摄像头帧）
-# 依赖: pip install requests
+# 依赖: pip install openai httpx
 import requests
-import base64
 import cv2
 import os
-from openai import OpenAI
+import queue
+import concurrent.futures
+from collections import deque
+from vlm_client import AsyncVLMClient
+from vlm_cache import VLMCache
+from frame_sampler import SceneChangeSampler
+from jpeg_encoder import UploadEncoder
 
 class QwenVL2B:
-    def __init__(self, api_key=None, model="qwen-vl-plus"):
+    DEFAULT_BASE_URL = "https://dashscope.aliyuncs.com/compatible-mode/v1"
+
+    def __init__(self, api_key=None, model="qwen-vl-plus", base_url=None, max_in_flight=4, timeout=30.0, max_retries=3,
+                 cache_path=None, max_side=1024, byte_budget=100 * 1024):
         self.api_key = api_key or os.getenv("DASHSCOPE_API_KEY")
         self.model = model
-        self.base_url = "https://dashscope.aliyuncs.com/compatible-mode/v1"
+        self.base_url = base_url or os.getenv("DASHSCOPE_BASE_URL", self.DEFAULT_BASE_URL)
         if not self.api_key:
             raise ValueError("请设置通义千问API Key，可通过环境变量DASHSCOPE_API_KEY或构造参数传入。")
-        self.client = OpenAI(api_key=self.api_key, base_url=self.base_url)
+        # 异步客户端：共享连接池、限制在途请求数、超时与退避重试
+        self.client = AsyncVLMClient(self.api_key, self.base_url, self.model, max_in_flight=max_in_flight,
+                                     timeout=timeout, max_retries=max_retries)
+        # 可选的回答缓存：近似相同的画面+相同提问直接返回历史回答，不发请求
+        self.cache = VLMCache(cache_path) if cache_path else None
+        # 上传编码：缩小分辨率并在字节预算内选择JPEG质量
+        self.encoder = UploadEncoder(max_side=max_side, byte_budget=byte_budget)
 
-    def _img_to_base64url(self, img_bgr):
-        _, buf = cv2.imencode('.jpg', img_bgr)
-        b64 = base64.b64encode(buf).decode()
-        return f"data:image/jpeg;base64,{b64}"
+    def _img_to_base64url(self, img_bgr, roi=None):
+        return self.encoder.to_data_url(img_bgr, roi)
 
-    def infer_image(self, img_bgr, prompt="请描述这张图片的内容"):
-        img_url = self._img_to_base64url(img_bgr)
-        messages = [{
+    def _build_messages(self, img_bgr, prompt, roi=None):
+        img_url = self._img_to_base64url(img_bgr, roi)
+        return [{
             "role": "user",
             "content": [
                 {"type": "text", "text": prompt},
                 {"type": "image_url", "image_url": {"url": img_url}}
             ]
         }]
-        completion = self.client.chat.completions.create(
-            model=self.model,
-            messages=messages
-        )
+
+    @property
+    def busy(self):
+        """在途请求已达上限，实时场景可据此跳过当前帧"""
+        return self.client.busy
+
+    def infer_image_async(self, img_bgr, prompt="请描述这张图片的内容", callback=None, roi=None, on_delta=None):
+        """
+        非阻塞提交，返回Future（结果为回答文本）；callback(future)在请求完成后调用，缓存命中时立即调用
+        roi: 可选的检测框(单个或Nx4)，只上传这些目标的外接区域
+        on_delta(text, elapsed): 可选，流式输出回调，首次调用时elapsed即首字延迟
+        """
+        img_bgr = self.encoder.crop(img_bgr, roi)
+        frame_hash = None
+        if self.cache is not None:
+            frame_hash = self.cache.key(img_bgr)
+            answer = self.cache.get(frame_hash, prompt, self.model)
+            if answer is not None:
+                if on_delta is not None:
+                    on_delta(answer, 0.0)
+                future = concurrent.futures.Future()
+                future.set_result(answer)
+                if callback is not None:
+                    future.add_done_callback(callback)
+                return future
+        # JPEG编码放到客户端的后台线程池中执行，调用方（如Qt主线程）只负责提交
+        future = self.client.submit(lambda: self._build_messages(img_bgr, prompt), callback, on_delta)
+        if frame_hash is not None:
+            future.add_done_callback(lambda f: self._store(f, frame_hash, prompt))
+        return future
+
+    def _store(self, future, frame_hash, prompt):
+        if future.cancelled() or future.exception() is not None:
+            return
+        self.cache.put(frame_hash, prompt, self.model, future.result())
+
+    def infer_image(self, img_bgr, prompt="请描述这张图片的内容", roi=None):
         # 返回主内容
-        return completion.choices[0].message.content
+        return self.infer_image_async(img_bgr, prompt, roi=roi).result()
 
-    def infer_video(self, video_path, prompt="请描述这段视频的内容", frame_interval=10):
+    def infer_image_stream(self, img_bgr, prompt="请描述这张图片的内容", roi=None):
+        """同步流式接口：逐段产出回答文本"""
+        chunks = queue.Queue()
+        future = self.infer_image_async(img_bgr, prompt, roi=roi, on_delta=lambda text, elapsed: chunks.put(text),
+                                        callback=lambda f: chunks.put(None))
+        while True:
+            text = chunks.get()
+            if text is None:
+                break
+            yield text
+        future.result()  # 请求失败时在此抛出异常
+
+    def infer_video(self, video_path, prompt="请描述这段视频的内容", frame_interval=10, on_result=None, sampler=None):
+        """
+        抽帧并发请求：解码与在途请求重叠，最多保留 2*max_in_flight 个待完成请求以限制内存
+        sampler: 可选的SceneChangeSampler，提供时按画面变化抽帧，忽略frame_interval
+        on_result(idx, frame, text): 可选，每帧结果按帧序回调；单帧请求失败时text为失败信息，不中断整段视频
+        返回 [(帧号, 文本), ...]
+        """
         cap = cv2.VideoCapture(video_path)
+        pending = deque()
         results = []
+
+        def collect(block):
+            while pending and (block or pending[0][2].done()):
+                idx, frame, future = pending.popleft()
+                try:
+                    text = future.result()
+                except Exception as e:
+                    text = f"推理失败: {str(e)}"
+                results.append((idx, text))
+                if on_result is not None:
+                    on_result(idx, frame, text)
+
         idx = 0
         while cap.isOpened():
             ret, frame = cap.read()
             if not ret:
                 break
-            if idx % frame_interval == 0:
-                text = self.infer_image(frame, prompt)
-                results.append((idx, text))
+            send = sampler.should_send(frame) if sampler is not None else idx % frame_interval == 0
+            if send:
+                pending.append((idx, frame, self.infer_image_async(frame, prompt)))
+                if len(pending) >= 2 * self.client.max_in_flight:
+                    concurrent.futures.wait([pending[0][2]])
+                collect(False)
             idx += 1
         cap.release()
+        collect(True)
         return results
 
+    def close(self):
+        self.client.close()
+        if self.cache is not None:
+            self.cache.close()
+
     def infer_camera(self, prompt="请描述当前画面", interval=310):
-        import time
+        """画面明显变化时立即分析，静止画面最多每interval秒分析一次；请求在后台完成，画面持续刷新"""
         cap = cv2.VideoCapture(0)
+        sampler = SceneChangeSampler(max_gap=None, max_seconds=interval)
+        future = None
+        text = ""
         while True:
             ret, frame = cap.read()
             if not ret:
                 print("无法读取摄像头画面")
                 break
-            text = self.infer_image(frame, prompt)
-            print("VLM分析结果:", text)
+            if future is not None and future.done():
+                text = future.result()
+                print("VLM分析结果:", text)
+                future = None
+            if future is None and sampler.should_send(frame):
+                future = self.infer_image_async(frame, prompt)
             display_frame = frame.copy()
             y0, dy = 30, 30
             for i, line in enumerate(text.split('\n')):
@@ -69,7 +161,6 @@ class QwenVL2B:
             cv2.imshow("QwenVL2B Camera", display_frame)
             if cv2.waitKey(1) & 0xFF == 27:
                 break
-            time.sleep(interval)
         cap.release()
         cv2.destroyAllWindows()
 
@@ -80,6 +171,7 @@ if __name__ == "__main__":
 
     # 示例：视频
     # results = qwen.infer_video("test.mp4", prompt="视频内容总结", frame_interval=60)
+    # 按画面变化抽帧: qwen.infer_video("test.mp4", prompt="视频内容总结", sampler=SceneChangeSampler(max_gap=300))
     # for idx, text in results:
     #     print(f"帧{idx}: {text}")
 
@@ -0,0 +1,118 @@
+import os
+import sqlite3
+import threading
+import time
+import cv2
+import numpy as np
+
+# VLM回答的持久化缓存：以画面感知哈希(dHash) + 提问 + 模型名为键，存放在SQLite中，按最近使用时间做LRU淘汰
+# 新画面与已缓存画面的哈希汉明距离不超过阈值时直接返回缓存回答，静止场景不再重复调用API
+# 64位哈希拆成4段16位分别建索引：汉明距离<=3的两帧至少有一段完全相同，查询只需比对少量候选
+
+_BANDS = 4
+_BAND_BITS = 64 // _BANDS
+
+
+def dhash(img):
+    """差值哈希：缩放为9x8灰度图，比较水平相邻像素明暗，得到64位整数"""
+    gray = img if img.ndim == 2 else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def _to_sql_int(h):
+    """SQLite整数为有符号64位"""
+    return h - (1 << 64) if h >= (1 << 63) else h
+
+
+def _bands(h):
+    mask = (1 << _BAND_BITS) - 1
+    return [(h >> (i * _BAND_BITS)) & mask for i in range(_BANDS)]
+
+
+class VLMCache:
+    """
+    path: SQLite文件路径
+    max_entries: 最多缓存条数，超出后淘汰最久未使用的条目
+    max_distance: 判定为同一画面的最大汉明距离（0为完全相同，建议不超过3）
+    """
+    def __init__(self, path, max_entries=5000, max_distance=3):
+        if max_distance >= _BANDS:
+            raise ValueError(f"max_distance需小于{_BANDS}")
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self.path = path
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            "id INTEGER PRIMARY KEY, model TEXT, prompt TEXT, hash INTEGER, "
+            "b0 INTEGER, b1 INTEGER, b2 INTEGER, b3 INTEGER, answer TEXT, created REAL, last_used REAL)"
+        )
+        for i in range(_BANDS):
+            self._db.execute(f"CREATE INDEX IF NOT EXISTS idx_b{i} ON answers (model, prompt, b{i})")
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_used ON answers (last_used)")
+        self._db.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+
+    def key(self, img):
+        """计算画面哈希，供get/put复用，避免重复计算"""
+        return dhash(img)
+
+    def get(self, frame_hash, prompt, model):
+        """返回汉明距离最近且不超过阈值的缓存回答，未命中返回None"""
+        bands = _bands(frame_hash)
+        where = " OR ".join(f"b{i}=?" for i in range(_BANDS))
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT id, hash, answer FROM answers WHERE model=? AND prompt=? AND ({where})",
+                [model, prompt] + bands,
+            ).fetchall()
+            best = None
+            for row_id, h, answer in rows:
+                dist = bin((h & ((1 << 64) - 1)) ^ frame_hash).count("1")
+                if dist <= self.max_distance and (best is None or dist < best[0]):
+                    best = (dist, row_id, answer)
+            if best is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._db.execute("UPDATE answers SET last_used=? WHERE id=?", (time.time(), best[1]))
+            self._db.commit()
+            return best[2]
+
+    def put(self, frame_hash, prompt, model, answer):
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO answers (model, prompt, hash, b0, b1, b2, b3, answer, created, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [model, prompt, _to_sql_int(frame_hash)] + _bands(frame_hash) + [answer, now, now],
+            )
+            count = self._db.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+            if count > self.max_entries:
+                self._db.execute(
+                    "DELETE FROM answers WHERE id IN (SELECT id FROM answers ORDER BY last_used LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+            self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM answers")
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
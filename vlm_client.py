@@ -0,0 +1,127 @@
+import asyncio
+import threading
+import time
+import httpx
+from openai import AsyncOpenAI, APIConnectionError, APITimeoutError, RateLimitError, InternalServerError
+
+# 异步并发的VLM客户端：后台线程运行asyncio事件循环，所有请求共享同一个HTTP连接池
+# 调用方在任意线程submit，立即拿到concurrent.futures.Future，结果通过Future或回调返回，不阻塞Qt主线程
+
+RETRYABLE_ERRORS = (APIConnectionError, APITimeoutError, RateLimitError, InternalServerError, asyncio.TimeoutError)
+
+
+class AsyncVLMClient:
+    """
+    base_url: OpenAI兼容接口地址，可指向本地mock服务做测试
+    max_in_flight: 同时在途的请求数上限，超出的请求在事件循环中排队
+    timeout: 单次请求超时(秒)
+    max_retries / backoff: 连接错误、超时、限流和5xx时按 backoff * 2^n 秒退避重试
+    """
+    def __init__(self, api_key, base_url, model, max_in_flight=4, timeout=30.0, max_retries=3, backoff=0.5):
+        self.model = model
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.in_flight = 0
+        self.closed = False
+        self.last_ttft = None  # 最近一次流式请求的首字延迟(秒)
+        self._lock = threading.Lock()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+        self._http = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_in_flight, max_keepalive_connections=max_in_flight),
+        )
+        # 重试由本类统一处理，关闭SDK自带重试避免叠加
+        self._client = AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=self._http, max_retries=0)
+        self._sem = self._call(self._make_semaphore())
+
+    async def _make_semaphore(self):
+        return asyncio.Semaphore(self.max_in_flight)
+
+    def _call(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    @property
+    def busy(self):
+        """在途请求已达上限"""
+        return self.in_flight >= self.max_in_flight
+
+    def submit(self, messages, callback=None, on_delta=None):
+        """
+        提交一次chat请求，立即返回Future；Future结果为完整回答文本
+        messages: 消息列表，或返回消息列表的函数（如需要编码图像），后者在后台线程池中执行，不占用调用方线程
+        callback(future): 请求完成（成功或失败）后在事件循环线程中调用
+        on_delta(text, elapsed): 提供时以流式方式请求，每收到一段文本调用一次；elapsed为距提交的秒数，首次调用即首字延迟
+        """
+        # 在锁内提交，保证close取消在途请求时不会漏掉刚提交的请求
+        with self._lock:
+            if self.closed:
+                raise RuntimeError("VLM客户端已关闭")
+            self.in_flight += 1
+            future = asyncio.run_coroutine_threadsafe(self._request(messages, on_delta, time.perf_counter()), self._loop)
+        future.add_done_callback(self._on_done)
+        if callback is not None:
+            future.add_done_callback(callback)
+        return future
+
+    def _on_done(self, future):
+        with self._lock:
+            self.in_flight -= 1
+
+    async def _request(self, messages, on_delta=None, t0=None):
+        if callable(messages):
+            messages = await self._loop.run_in_executor(None, messages)
+        async with self._sem:
+            for attempt in range(self.max_retries + 1):
+                received = False
+                try:
+                    if on_delta is None:
+                        completion = await asyncio.wait_for(
+                            self._client.chat.completions.create(model=self.model, messages=messages),
+                            self.timeout,
+                        )
+                        return completion.choices[0].message.content
+                    stream = await asyncio.wait_for(
+                        self._client.chat.completions.create(model=self.model, messages=messages, stream=True),
+                        self.timeout,
+                    )
+                    # 分块之间的停顿由连接池的读超时约束
+                    parts = []
+                    async for chunk in stream:
+                        if not chunk.choices:
+                            continue
+                        delta = chunk.choices[0].delta.content
+                        if not delta:
+                            continue
+                        elapsed = time.perf_counter() - t0
+                        if not received:
+                            received = True
+                            self.last_ttft = elapsed
+                        parts.append(delta)
+                        on_delta(delta, elapsed)
+                    return "".join(parts)
+                except RETRYABLE_ERRORS:
+                    # 已经输出过部分内容的流式请求不再重试，避免界面上出现重复文本
+                    if received or attempt == self.max_retries:
+                        raise
+                    await asyncio.sleep(self.backoff * (2 ** attempt))
+
+    async def _cancel_pending(self):
+        tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def close(self):
+        """取消未完成的请求（其Future随之取消，阻塞在result()上的调用方抛出CancelledError），关闭连接池并停止事件循环"""
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+        self._call(self._cancel_pending())
+        self._call(self._http.aclose())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
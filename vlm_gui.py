@@ -1,14 +1,29 @@
 from PyQt5.QtWidgets import (
-    QWidget, QDialog, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QLineEdit, QTextEdit, QComboBox, QFileDialog, QSpinBox, QSizePolicy, QApplication
+    QWidget, QDialog, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QLineEdit, QTextEdit, QComboBox, QFileDialog, QSpinBox, QSizePolicy, QApplication,
+    QCheckBox
 )
-from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtCore import Qt, QTimer, QObject, pyqtSignal
 from PyQt5.QtGui import QPixmap, QImage, QFont
 import cv2
 import datetime
 import os
+import threading
 from vlm import QwenVL2B
+from frame_sampler import SceneChangeSampler
+from display import show_frame
+
+# VLM请求在后台事件循环中完成，结果通过信号回到主线程更新界面
+class VLMSignals(QObject):
+    frame = pyqtSignal(object)  # 显示当前理解的帧
+    text = pyqtSignal(str)  # 覆盖理解结果
+    append = pyqtSignal(str)  # 追加理解结果
+    camera_result = pyqtSignal(int, str, str, float)  # 摄像头帧号、提问、回答、首字延迟
+    delta = pyqtSignal(str)  # 图片模式流式输出的一段文本
+    camera_delta = pyqtSignal(int, str, float)  # 摄像头帧号、一段文本、距提交的秒数
 
 class VLMWindow(QDialog):
+    MAX_GAP = 300  # 自适应抽帧时的最大间隔帧数
+
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setWindowTitle("图像理解 (通义千问2-VL-2B)")
@@ -24,6 +39,14 @@ class VLMWindow(QDialog):
         self.cap = None
         self.last_frame = None
         self.init_ui()
+        self.signals = VLMSignals()
+        self.signals.frame.connect(self.show_image)
+        self.signals.text.connect(self.result_text.setPlainText)
+        self.signals.append.connect(self.result_text.append)
+        self.signals.camera_result.connect(self.on_camera_result)
+        self.signals.delta.connect(self.on_stream_delta)
+        self.signals.camera_delta.connect(self.on_camera_delta)
+        self.camera_partial = {}  # 摄像头帧号 -> (首字延迟, 已收到的文本)
 
     def init_ui(self):
         layout = QVBoxLayout(self)
@@ -57,6 +80,10 @@ class VLMWindow(QDialog):
         self.interval_spin.setValue(1)
         self.interval_spin.setSingleStep(1)
         tool_layout.addWidget(self.interval_spin)
+        # 按画面变化抽帧：间隔作为最小间隔，静止画面最多每MAX_GAP帧分析一次
+        self.adaptive_check = QCheckBox("按画面变化抽帧")
+        self.adaptive_check.setChecked(True)
+        tool_layout.addWidget(self.adaptive_check)
         self.btn_start = QPushButton("开始理解")
         self.btn_start.clicked.connect(self.start_infer)
         tool_layout.addWidget(self.btn_start)
@@ -105,6 +132,11 @@ class VLMWindow(QDialog):
         self.result_text.setFont(QFont("Consolas", 10))
         self.result_text.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
         result_split_layout.addWidget(self.result_text)
+        # 摄像头模式下正在生成的回答（流式预览），完成后整体追加到理解结果
+        self.stream_label = QLabel()
+        self.stream_label.setWordWrap(True)
+        self.stream_label.setStyleSheet("color: #555;")
+        result_split_layout.addWidget(self.stream_label)
 
         right_layout.addLayout(result_split_layout)
         body_layout.addLayout(right_layout, 1)
@@ -119,7 +151,8 @@ class VLMWindow(QDialog):
             self.api_status.setText("<font color='red'>请输入API-Key</font>")
             return
         try:
-            self.vlm = QwenVL2B(api_key=key)
+            cache_path = os.path.join(os.getcwd(), "图像理解", "vlm_cache.sqlite")
+            self.vlm = QwenVL2B(api_key=key, cache_path=cache_path)
             self.api_key = key
             self.api_input.setEchoMode(QLineEdit.Password)
             self.api_input.setEnabled(False)
@@ -166,12 +199,7 @@ class VLMWindow(QDialog):
         # 固定显示区域大小，防止原始输入视频大小变化
         fixed_width = 480
         fixed_height = 360
-        rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        h, w, ch = rgb.shape
-        bytes_per_line = ch * w
-        qt_img = QImage(rgb.data, w, h, bytes_per_line, QImage.Format_RGB888)
-        pix = QPixmap.fromImage(qt_img)
-        self.input_label.setPixmap(pix.scaled(fixed_width, fixed_height, Qt.KeepAspectRatio, Qt.SmoothTransformation))
+        show_frame(self.input_label, img, (fixed_width, fixed_height))
 
     def set_user_prompt(self):
         prompt = self.user_prompt_input.text().strip()
@@ -203,23 +231,47 @@ class VLMWindow(QDialog):
 
     def do_image_infer(self, img):
         prompt = self.user_prompt if hasattr(self, 'user_prompt') else "请用中文描述图片"
-        try:
-            text = self.vlm.infer_image(img, prompt=prompt)
-            now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            self.result_text.setPlainText(
-                f"[用户提问]\n{prompt}\n\n[{now}]\n模型: {self.model}\n理解内容:\n[提问内容] {prompt}\n[模型回答] {text}"
-            )
-        except Exception as e:
-            now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            self.result_text.setPlainText(
-                f"[用户提问]\n{prompt}\n\n[{now}]\n模型: {self.model}\n理解内容:\n[提问内容] {prompt}\n[模型回答] 推理失败: {str(e)}"
-            )
+        now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        header = f"[用户提问]\n{prompt}\n\n[{now}]\n模型: {self.model}\n理解内容:\n[提问内容] {prompt}\n[模型回答] "
+        self.result_text.setPlainText(header)
+        ttft = []
+
+        def on_delta(text, elapsed):
+            if not ttft:
+                ttft.append(elapsed)
+            self.signals.delta.emit(text)
+
+        def on_done(future):
+            try:
+                future.result()
+            except Exception as e:
+                self.signals.text.emit(header + f"推理失败: {str(e)}")
+                return
+            if ttft:
+                self.signals.append.emit(f"\n[首字延迟] {ttft[0] * 1000:.0f} ms")
+
+        # 流式请求：回答逐段显示，不必等待完整结果
+        self.vlm.infer_image_async(img, prompt=prompt, callback=on_done, on_delta=on_delta)
+
+    def on_stream_delta(self, text):
+        cursor = self.result_text.textCursor()
+        cursor.movePosition(cursor.End)
+        cursor.insertText(text)
+        self.result_text.setTextCursor(cursor)
+        self.result_text.ensureCursorVisible()
 
     def do_video_infer(self, path):
         prompt = self.user_prompt if hasattr(self, 'user_prompt') else "请用中文描述当前帧"
-        cap = cv2.VideoCapture(path)
-        idx = 0
-        interval = self.interval
+        threading.Thread(target=self.video_infer_thread, args=(path, prompt, self.interval, self.create_sampler()),
+                         daemon=True).start()
+
+    def create_sampler(self):
+        if not self.adaptive_check.isChecked():
+            return None
+        return SceneChangeSampler(min_gap=self.interval, max_gap=max(self.MAX_GAP, self.interval))
+
+    def video_infer_thread(self, path, prompt, interval, sampler=None):
+        """后台线程：抽帧并发请求，按帧序把结果发回界面"""
         all_results = []
         save_dir = os.path.join(os.getcwd(), "图像理解")
         if not os.path.exists(save_dir):
@@ -227,29 +279,23 @@ class VLMWindow(QDialog):
         video_name = os.path.basename(path)
         now = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
         summary_txt_path = os.path.join(save_dir, f"{now}_{video_name}_all.txt")
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret:
-                break
-            if idx % interval == 0:
-                self.last_frame = frame  # 便于保存
-                self.show_image(frame)
-                try:
-                    text = self.vlm.infer_image(frame, prompt=prompt)
-                except Exception as e:
-                    text = f"推理失败: {str(e)}"
-                readable_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                result = (
-                    f"[用户提问]\n{prompt}\n\n[{readable_time}]\n视频: {path}\n第{idx}帧\n模型: {self.model}\n理解内容:\n[提问内容] {prompt}\n[模型回答] {text}\n"
-                )
-                all_results.append(result)
-                self.result_text.setPlainText(result)
-                QApplication.processEvents()
-            idx += 1
-        cap.release()
+
+        def on_result(idx, frame, text):
+            self.last_frame = frame  # 便于保存
+            self.signals.frame.emit(frame)
+            readable_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            result = (
+                f"[用户提问]\n{prompt}\n\n[{readable_time}]\n视频: {path}\n第{idx}帧\n模型: {self.model}\n理解内容:\n[提问内容] {prompt}\n[模型回答] {text}\n"
+            )
+            all_results.append(result)
+            self.signals.text.emit(result)
+
+        self.vlm.infer_video(path, prompt=prompt, frame_interval=interval, on_result=on_result, sampler=sampler)
+        if sampler is not None:
+            self.signals.append.emit(f"\n[提示] 按画面变化抽帧: 共{sampler.seen}帧，分析{sampler.sent}帧")
         with open(summary_txt_path, "w", encoding="utf-8") as f:
             f.write("\n".join(all_results))
-        self.result_text.append(f"\n[提示] 所有帧的理解内容已保存到: {summary_txt_path}")
+        self.signals.append.emit(f"\n[提示] 所有帧的理解内容已保存到: {summary_txt_path}")
 
     def do_camera_infer(self):
         prompt = self.user_prompt if hasattr(self, 'user_prompt') else "请用中文描述当前画面"
@@ -275,6 +321,7 @@ class VLMWindow(QDialog):
         self.timer.timeout.connect(lambda: self.camera_step_optimized(prompt))
         self.timer.start(33)  # 固定约30fps流畅刷新
         self._camera_infer_interval = self.interval
+        self._camera_sampler = self.create_sampler()
 
     def camera_step_optimized(self, prompt):
         if not self.cap:
@@ -289,35 +336,64 @@ class VLMWindow(QDialog):
         self.show_image(frame)
         if hasattr(self, 'camera_video_writer') and self.camera_video_writer is not None:
             self.camera_video_writer.write(frame)
-        # 只每N帧推理一次，其余帧只刷新画面
-        if self.camera_frame_idx % self._camera_infer_interval == 0:
-            # 直接在主线程推理，保证推理结果能显示出来，哪怕视频卡顿
-            try:
-                text = self.vlm.infer_image(frame, prompt=prompt)
-                if isinstance(text, bytes):
-                    text = text.decode('utf-8', errors='ignore')
-            except Exception as e:
-                text = f"推理失败: {str(e)}"
-            now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            result = (
-                f"[用户提问]\n{prompt}\n\n[{now}]\n摄像头第{self.camera_frame_idx}帧\n模型: {self.model}\n理解内容:\n[提问内容] {prompt}\n[模型回答] {text}\n"
-            )
-            self.result_text.setReadOnly(False)
-            self.result_text.append(result)
-            self.result_text.ensureCursorVisible()
-            self.result_text.repaint()
-            self.result_text.viewport().update()
-            self.result_text.setReadOnly(True)
-            if hasattr(self, 'camera_history'):
-                self.camera_history.append(result)
-            if hasattr(self, '_camera_history_file') and self._camera_history_file:
-                self._camera_history_file.write(result + "\n")
-                self._camera_history_file.flush()
+        # 只在画面变化（或每N帧）时推理，其余帧只刷新画面；请求在后台并发完成，在途请求已满时跳过本帧
+        if self._camera_sampler is not None:
+            send = not self.vlm.busy and self._camera_sampler.should_send(frame)
+        else:
+            send = self.camera_frame_idx % self._camera_infer_interval == 0 and not self.vlm.busy
+        if send:
+            frame_idx = self.camera_frame_idx
+
+            ttft = []
+
+            def on_delta(text, elapsed):
+                if not ttft:
+                    ttft.append(elapsed)
+                self.signals.camera_delta.emit(frame_idx, text, elapsed)
+
+            def on_done(future):
+                try:
+                    text = future.result()
+                    if isinstance(text, bytes):
+                        text = text.decode('utf-8', errors='ignore')
+                except Exception as e:
+                    text = f"推理失败: {str(e)}"
+                self.signals.camera_result.emit(frame_idx, prompt, text, ttft[0] if ttft else -1.0)
+
+            self.vlm.infer_image_async(frame, prompt=prompt, callback=on_done, on_delta=on_delta)
         self.camera_frame_idx += 1
-        QApplication.processEvents()
+
+    def on_camera_delta(self, frame_idx, text, elapsed):
+        ttft, partial = self.camera_partial.get(frame_idx, (elapsed, ""))
+        self.camera_partial[frame_idx] = (ttft, partial + text)
+        # 只预览最新一帧的生成进度
+        latest = max(self.camera_partial)
+        ttft, partial = self.camera_partial[latest]
+        self.stream_label.setText(f"摄像头第{latest}帧 生成中(首字{ttft * 1000:.0f} ms): {partial}")
+
+    def on_camera_result(self, frame_idx, prompt, text, ttft):
+        self.camera_partial.pop(frame_idx, None)
+        if not self.camera_partial:
+            self.stream_label.clear()
+        now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        ttft_text = f"\n[首字延迟] {ttft * 1000:.0f} ms" if ttft >= 0 else ""
+        result = (
+            f"[用户提问]\n{prompt}\n\n[{now}]\n摄像头第{frame_idx}帧\n模型: {self.model}\n理解内容:\n[提问内容] {prompt}\n[模型回答] {text}{ttft_text}\n"
+        )
+        self.result_text.append(result)
+        self.result_text.ensureCursorVisible()
+        if hasattr(self, 'camera_history'):
+            self.camera_history.append(result)
+        if hasattr(self, '_camera_history_file') and self._camera_history_file:
+            self._camera_history_file.write(result + "\n")
+            self._camera_history_file.flush()
 
     def closeEvent(self, event):
         self.stop_infer()
+        # 关闭客户端的事件循环线程、连接池和结果缓存，窗口销毁后不再有回调进来
+        if self.vlm is not None:
+            self.vlm.close()
+            self.vlm = None
         event.accept()
 
     def stop_infer(self):